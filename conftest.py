@@ -49,6 +49,12 @@ def pytest_addoption(parser: argparsing.Parser) -> None:
         default=False,
         help="Enable tcpdump per test (replaces -s)",
     )
+    group.addoption(
+        "--record-traffic",
+        action="store_true",
+        default=False,
+        help="Record traffic of deproxy clients and servers per test",
+    )
     group.addoption(
         "-S",
         "--save-secrets",
@@ -133,6 +139,9 @@ def pytest_configure(config: Config) -> None:
     if config.getoption("--save-secrets"):
         run_config.SAVE_SECRETS = True
 
+    if config.getoption("--record-traffic"):
+        run_config.RECORD_TRAFFIC = True
+
     if config.getoption("--tcp-segmentation") > 0:
         run_config.TCP_SEGMENTATION = config.getoption("--tcp-segmentation")
 
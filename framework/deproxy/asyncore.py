@@ -7,9 +7,12 @@ __license__ = "GPL2"
 
 import abc
 import errno
+import os
 import select
 import socket
 import ssl
+import time
+from typing import Optional
 
 socket_map: dict[str, "DeproxyAsyncore"] = dict()
 
@@ -26,6 +29,136 @@ disconnected = frozenset(
 )
 
 
+class DeproxyPoller:
+    """
+    Persistent epoll registry for all deproxy channels.
+
+    Interest masks are recalculated only for channels which were marked as dirty
+    (a new channel, new data to send, an event on the socket or an expired send timer),
+    so the polling cost depends on the number of active sockets, not on the total
+    number of sockets. The polling thread blocks in `epoll_wait()` and is woken up
+    through an eventfd when a channel changes its state from another thread.
+
+    All methods except `mark_dirty()`, `wakeup()` and `poll()` must be called
+    under the polling lock.
+    """
+
+    # The maximum time to block in `epoll_wait()` when there are no timers.
+    max_timeout: float = 1.0
+
+    def __init__(self):
+        self._epoll = select.epoll()
+        self._wakeup_fd: int = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+        self._epoll.register(self._wakeup_fd, select.EPOLLIN)
+        self._channels: dict[int, "DeproxyAsyncore"] = dict()
+        self._masks: dict[int, int] = dict()
+        self._timers: dict[int, float] = dict()
+        self._dirty: set[int] = set()
+        self._next_deadline: Optional[float] = None
+
+    def wakeup(self) -> None:
+        """Interrupt `epoll_wait()` in the polling thread."""
+        os.eventfd_write(self._wakeup_fd, 1)
+
+    def mark_dirty(self, fd: int) -> None:
+        """Recalculate the interest mask of the channel on the next polling iteration."""
+        self._dirty.add(fd)
+        self.wakeup()
+
+    def unregister(self, fd: int) -> None:
+        """Remove the channel from the registry. Must be called before the socket is closed."""
+        self._dirty.discard(fd)
+        self._timers.pop(fd, None)
+        self._channels.pop(fd, None)
+        if self._masks.pop(fd, None) is None:
+            return
+        try:
+            self._epoll.unregister(fd)
+        except OSError as why:
+            if why.errno not in (errno.ENOENT, errno.EBADF):
+                raise
+
+    def clear(self) -> None:
+        for fd in list(self._masks):
+            self.unregister(fd)
+        self._dirty.clear()
+        self._timers.clear()
+        self._next_deadline = None
+
+    def poll(self) -> list[tuple[int, int]]:
+        """Wait for events on the registered channels. The polling lock must NOT be held."""
+        timeout = self.max_timeout
+        if self._next_deadline is not None:
+            timeout = min(max(self._next_deadline - time.monotonic(), 0.0), timeout)
+
+        events = []
+        for fd, flags in self._epoll.poll(timeout):
+            if fd == self._wakeup_fd:
+                try:
+                    os.eventfd_read(self._wakeup_fd)
+                except BlockingIOError:
+                    pass
+                continue
+            events.append((fd, flags))
+        return events
+
+    def dispatch(self, events: list[tuple[int, int]]) -> None:
+        for fd, flags in events:
+            obj = self._channels.get(fd)
+            # the channel may be closed by another thread while we were waiting for events
+            if obj is None or socket_map.get(fd) is not obj:
+                continue
+            obj._readwrite(flags)
+            # an event may change readable/writable state of the channel
+            if obj._fileno is not None:
+                self._dirty.add(obj._fileno)
+
+    def update(self) -> None:
+        """Apply interest masks for all dirty channels and channels with expired timers."""
+        now = time.monotonic()
+        for fd, deadline in list(self._timers.items()):
+            if deadline <= now:
+                del self._timers[fd]
+                self._dirty.add(fd)
+
+        while self._dirty:
+            self._update_channel(self._dirty.pop())
+
+        self._next_deadline = min(self._timers.values()) if self._timers else None
+
+    def _update_channel(self, fd: int) -> None:
+        obj = socket_map.get(fd)
+        if obj is None or obj._fileno != fd:
+            return
+
+        flags = 0
+        deadline = None
+        if obj.readable():
+            flags |= select.EPOLLIN | select.EPOLLPRI
+        # accepting sockets should not be writable
+        if not obj._accepting:
+            if obj.writable():
+                flags |= select.EPOLLOUT
+            else:
+                deadline = obj._next_write_time()
+
+        if deadline is not None:
+            self._timers[fd] = deadline
+        else:
+            self._timers.pop(fd, None)
+
+        prev_flags = self._masks.get(fd)
+        if prev_flags is None:
+            self._epoll.register(fd, flags)
+        elif prev_flags != flags:
+            self._epoll.modify(fd, flags)
+        self._masks[fd] = flags
+        self._channels[fd] = obj
+
+
+poller = DeproxyPoller()
+
+
 class DeproxyAsyncore(abc.ABC):
     def __init__(self, is_ipv6: bool):
         self.is_ipv6: bool = is_ipv6
@@ -52,12 +185,20 @@ class DeproxyAsyncore(abc.ABC):
 
     def _add_channel(self) -> None:
         socket_map[self._fileno] = self
+        poller.mark_dirty(self._fileno)
 
     def _del_channel(self) -> None:
         if self._fileno in socket_map:
             del socket_map[self._fileno]
+        if self._fileno is not None:
+            poller.unregister(self._fileno)
         self._fileno = None
 
+    def _update_interest(self) -> None:
+        """Notify the poller that `readable()` or `writable()` may return a new value."""
+        if self._fileno is not None:
+            poller.mark_dirty(self._fileno)
+
     def _set_reuse_addr(self) -> None:
         """try to re-use a server port if possible."""
         try:
@@ -104,6 +245,27 @@ class DeproxyAsyncore(abc.ABC):
     def _send(self, data: bytes) -> int:
         try:
             result = self._socket.send(data)
+            if result:
+                self._sent((data,), result)
+            return result
+        except OSError as why:
+            if why.errno == errno.EWOULDBLOCK:
+                return 0
+            elif why.errno in disconnected:
+                self._handle_close()
+                return 0
+            else:
+                raise
+
+    def _sendmsg(self, buffers: list) -> int:
+        """Same as `_send()`, but gathers several buffers by one syscall."""
+        if isinstance(self._socket, ssl.SSLSocket):
+            # TLS records are built from a continuous buffer anyway
+            return self._send(b"".join(buffers))
+        try:
+            result = self._socket.sendmsg(buffers)
+            if result:
+                self._sent(buffers, result)
             return result
         except OSError as why:
             if why.errno == errno.EWOULDBLOCK:
@@ -123,6 +285,7 @@ class DeproxyAsyncore(abc.ABC):
                 self._handle_close()
                 return b""
             else:
+                self._received(data)
                 return data
         except OSError as why:
             # winsock sometimes raises ENOTCONN
@@ -132,6 +295,28 @@ class DeproxyAsyncore(abc.ABC):
             else:
                 raise
 
+    def _recv_into(self, buffer: memoryview) -> int:
+        """Same as `_recv()`, but fills the preallocated buffer instead of allocating a new one."""
+        try:
+            nbytes = self._socket.recv_into(buffer)
+            if not nbytes:
+                self._handle_close()
+            else:
+                self._received(buffer[:nbytes])
+            return nbytes
+        except OSError as why:
+            if why.errno in disconnected:
+                self._handle_close()
+                return 0
+            else:
+                raise
+
+    def _sent(self, buffers, nbytes: int) -> None:
+        """Called with the buffers passed to the socket and the number of bytes sent from them."""
+
+    def _received(self, data) -> None:
+        """Called with data received from the socket."""
+
     # deproxy methods
 
     def readable(self) -> bool:
@@ -140,6 +325,13 @@ class DeproxyAsyncore(abc.ABC):
     def writable(self) -> bool:
         return True
 
+    def _next_write_time(self) -> Optional[float]:
+        """
+        Timestamp (`time.monotonic()`) when a non-writable channel becomes writable
+        without any socket event, e.g. for RPS limits. None if there is no such time.
+        """
+        return None
+
     def _handle_connect_event(self):
         err = self._socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
         if err != 0:
@@ -1,11 +1,13 @@
 __author__ = "Tempesta Technologies, Inc."
-__copyright__ = "Copyright (C) 2022-2025 Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2022-2026 Tempesta Technologies, Inc."
 __license__ = "GPL2"
 
 import copy
 import logging
-import re
+import queue
 import sys
+import threading
+import time
 
 import run_config
 from framework.deproxy.deproxy_client import (
@@ -25,6 +27,24 @@ from framework.deproxy.deproxy_message import (
 from framework.services.tempesta import Config
 
 
+class _ExpectedResponse:
+    """
+    An expected response prepared from a server response and its variants for client
+    requests. The messages are shared by checks, so they must not be changed.
+    """
+
+    def __init__(self, raw: bytes, response: Response):
+        self.raw = raw
+        self.response = response
+        self.created = time.monotonic()
+        self._variants: dict[tuple, Response | H2Response] = {}
+
+    def variant(self, key: tuple, build) -> Response | H2Response:
+        if key not in self._variants:
+            self._variants[key] = build()
+        return self._variants[key]
+
+
 class DeproxyAutoParser:
     """
     This class prepares and checks HTTP responses/requests for deproxy.
@@ -35,31 +55,100 @@ class DeproxyAutoParser:
     Tempesta may damage message when forwarding.
 
     Please do not create class objects in tests!!!
+
+    Load tests may check only a part of messages and check them in a separate thread,
+    see `set_load_mode()`.
     """
 
+    # Expected responses are rebuilt after this time because they have a generated Date header.
+    TEMPLATE_TTL = 10
+    # The number of expected requests which are kept for the same client requests.
+    REQUEST_TEMPLATES = 128
+
     def __init__(self, deproxy_manager: DeproxyManager, tempesta_config: Config):
         self.__deproxy_manager: DeproxyManager = deproxy_manager
-        self.__expected_response: Response | None = None
+        self.__expected_response: _ExpectedResponse | None = None
         self.__expected_request: Request | None = None
-        self.__client_request: Request | H2Request | None = None
+        # (raw request, client class, client address) -> (expected request, client method)
+        self.__request_templates: dict[tuple, tuple[Request, str]] = {}
+        # the raw client request and its method
+        self.__client_request: bytes | None = None
+        self.__client_method: str | None = None
         self.__parsing: bool = run_config.AUTO_PARSER
         self.__exceptions: list[AssertionError] = list()
         self.__tempesta_config: Config = tempesta_config
         self.__logger = logging.LoggerAdapter(
             logging.getLogger("dap"), extra={"service": f"{self.__class__.__name__}()"}
         )
+        self.__sample_rate: float = 1.0
+        self.__nr_requests: int = 0
+        self.__checks: queue.Queue | None = None
+        self.__worker: threading.Thread | None = None
 
     def cleanup(self) -> None:
+        self.__stop_worker()
         self.__parsing = run_config.AUTO_PARSER
         self.__expected_response = None
         self.__expected_request = None
+        self.__request_templates = {}
         self.__client_request = None
+        self.__client_method = None
         self.__exceptions = list()
+        self.__sample_rate = 1.0
+        self.__nr_requests = 0
 
     def check_exceptions(self) -> None:
+        if self.__checks is not None:
+            self.__checks.join()
         for exception in self.__exceptions:
             raise exception
 
+    def set_load_mode(self, sample_rate: float = 1.0, offload: bool = False) -> None:
+        """
+        Check only `sample_rate` part of requests and responses to them, e.g. 0.01
+        to check each hundredth exchange. If `offload` is set, messages are compared
+        in a separate thread, so the deproxy manager thread isn't slowed down.
+        Errors are raised by `check_exceptions()` as usual.
+        """
+        if not 0 < sample_rate <= 1:
+            raise ValueError("The sample rate must be in (0, 1].")
+        self.__sample_rate = sample_rate
+        if offload and self.__checks is None:
+            self.__checks = queue.Queue()
+            self.__worker = threading.Thread(
+                target=self.__run_checks, name="DeproxyAutoParser", daemon=True
+            )
+            self.__worker.start()
+        elif not offload:
+            self.__stop_worker()
+
+    def __run_checks(self) -> None:
+        while True:
+            check = self.__checks.get()
+            try:
+                if check is None:
+                    return
+                check()
+            except Exception:
+                self.__logger.error("The message check failed", exc_info=True)
+            finally:
+                self.__checks.task_done()
+
+    def __stop_worker(self) -> None:
+        if self.__checks is None:
+            return
+        self.__checks.put(None)
+        self.__worker.join()
+        self.__checks = None
+        self.__worker = None
+
+    def __run(self, check, *args) -> None:
+        """Run the check in the worker thread if it's enabled."""
+        if self.__checks is not None:
+            self.__checks.put(lambda: check(*args))
+        else:
+            check(*args)
+
     @property
     def parsing(self) -> bool:
         return self.__parsing
@@ -70,29 +159,38 @@ class DeproxyAutoParser:
 
     @property
     def __cache_on_tempesta(self) -> bool:
-        matches = re.search(r"cache ([012]);", self.__tempesta_config.get_config())
-        return bool(int(matches.group(1)[0]) if matches else 0)
+        return self.__tempesta_config.cache_on
 
     def check_expected_request(self, request: Request) -> None:
         if self.__expected_request is not None:
-            self.__logger.info("Check expected request.")
-            self.__logger.debug(f"Received request:\n{request.msg}")
-            self.__logger.debug(f"Expected request:\n{self.__expected_request.msg}")
-            try:
-                assert request == self.__expected_request
-            except AssertionError:
-                self.__logger.info(
-                    f"For client request:\n{self.__client_request}\n"
-                    f"Received request:\n{request}\n"
-                    f"Expected request:\n{self.__expected_request}"
-                )
-                self.__exceptions.append(sys.exc_info()[1])
-            self.__logger.info("Received request is valid.")
+            self.__run(
+                self.__check_expected_request,
+                request,
+                self.__expected_request,
+                self.__client_request,
+            )
         else:
             self.__logger.info(
                 "Received request is not checked because the conditions were not satisfied."
             )
 
+    def __check_expected_request(
+        self, request: Request, expected_request: Request, client_request: bytes
+    ) -> None:
+        self.__logger.info("Check expected request.")
+        self.__logger.debug(f"Received request:\n{request.msg}")
+        self.__logger.debug(f"Expected request:\n{expected_request.msg}")
+        try:
+            assert request == expected_request
+        except AssertionError:
+            self.__logger.info(
+                f"For client request:\n{client_request.decode(errors='replace')}\n"
+                f"Received request:\n{request}\n"
+                f"Expected request:\n{expected_request}"
+            )
+            self.__exceptions.append(sys.exc_info()[1])
+        self.__logger.info("Received request is valid.")
+
     def check_expected_response(self, response: Response | H2Response, is_http2: bool) -> None:
         """
         This method does not check response when:
@@ -105,40 +203,104 @@ class DeproxyAutoParser:
             200 <= int(response.status) < 300
             and self.__expected_response
             and self.__client_request is not None
-            and self.__client_request.method != "PURGE"
+            and self.__client_method != "PURGE"
         ):
-            self.__logger.info("Check expected response")
-            expected_response = self.__prepare_expected_response_for_request(response, is_http2)
-
-            self.__logger.debug(f"Received response:\n{response.msg}")
-            self.__logger.debug(f"Expected response:\n{expected_response.msg}")
-
-            try:
-                assert response == expected_response
-            except AssertionError:
-                self.__logger.info(
-                    f"For client request:\n{self.__client_request}\n"
-                    f"Received response:\n{response}\n"
-                    f"Expected response:\n{expected_response}"
-                )
-                self.__exceptions.append(sys.exc_info()[1])
-            self.__logger.info("Received response is valid.")
+            self.__run(
+                self.__check_expected_response,
+                response,
+                is_http2,
+                self.__expected_response,
+                self.__client_request,
+                self.__client_method,
+            )
         else:
             self.__logger.info(
                 "Received response is not checked because the expected response was not generated."
             )
 
-    def prepare_expected_request(self, request: bytes, client: BaseDeproxyClient) -> None:
-        self.__logger.info("Prepare expected request")
-        self.__logger.debug(f"Request before preparing:\n{request.decode()}")
+    def __check_expected_response(
+        self,
+        response: Response | H2Response,
+        is_http2: bool,
+        template: "_ExpectedResponse",
+        client_request: bytes,
+        method: str,
+    ) -> None:
+        self.__logger.info("Check expected response")
+        expected_response = template.variant(
+            (is_http2, "age" in response.headers, method == "HEAD"),
+            lambda: self.__prepare_expected_response_for_request(
+                template.response, response, is_http2, method
+            ),
+        )
+
+        self.__logger.debug(f"Received response:\n{response.msg}")
+        self.__logger.debug(f"Expected response:\n{expected_response.msg}")
 
         try:
-            request = Request(request.decode(), body_parsing=True)
-        except (ParseError, ValueError):
-            self.__logger.info("Request: invalid Content-Length header. Body parsing is disabled")
-            request = Request(request.decode(), body_parsing=False)
+            assert response == expected_response
+        except AssertionError:
+            self.__logger.info(
+                f"For client request:\n{client_request.decode(errors='replace')}\n"
+                f"Received response:\n{response}\n"
+                f"Expected response:\n{expected_response}"
+            )
+            self.__exceptions.append(sys.exc_info()[1])
+        self.__logger.info("Received response is valid.")
+
+    def prepare_expected_request(
+        self, request: bytes, client: BaseDeproxyClient, message: Request | None = None
+    ) -> None:
+        """
+        `message` is the request already parsed from `request` by the client, it's changed
+        to the expected request. Clients often send the same requests, so expected requests
+        are reused for the same request bytes and clients. They are shared by checks,
+        so they must not be changed.
+        """
+        self.__nr_requests += 1
+        if int(self.__nr_requests * self.__sample_rate) == int(
+            (self.__nr_requests - 1) * self.__sample_rate
+        ):
+            # the exchange is not sampled, the request and the response are not checked
+            self.__expected_request = None
+            self.__client_request = None
+            self.__client_method = None
+            return
+
+        key = (
+            request,
+            type(client),
+            client.bind_addr or client.conn_addr,
+            self.__cache_on_tempesta,
+        )
+        template = self.__request_templates.get(key)
+        if template is None:
+            template = self.__prepare_expected_request(request, client, message)
+            if len(self.__request_templates) >= self.REQUEST_TEMPLATES:
+                # drop the oldest template
+                del self.__request_templates[next(iter(self.__request_templates))]
+            self.__request_templates[key] = template
+
+        # only the method of the client request is used for checks, so it's not copied
+        self.__client_request = request
+        self.__expected_request, self.__client_method = template
+
+    def __prepare_expected_request(
+        self, raw_request: bytes, client: BaseDeproxyClient, request: Request | None
+    ) -> tuple[Request, str]:
+        self.__logger.info("Prepare expected request")
+        self.__logger.debug(f"Request before preparing:\n{raw_request.decode()}")
 
-        self.__client_request = copy.deepcopy(request)
+        if request is None:
+            try:
+                request = Request(raw_request.decode(), body_parsing=True)
+            except (ParseError, ValueError):
+                self.__logger.info(
+                    "Request: invalid Content-Length header. Body parsing is disabled"
+                )
+                request = Request(raw_request.decode(), body_parsing=False)
+
+        method = request.method
         request.set_expected()
         request.add_tempesta_headers(x_forwarded_for=client.bind_addr or client.conn_addr)
 
@@ -148,13 +310,25 @@ class DeproxyAutoParser:
         self.__prepare_host_for_http1(request, isinstance(client, DeproxyClient))
         self.__prepare_hop_by_hop_headers(request)
         self.__prepare_method_for_expected_request(request)
-        self.__expected_request = request
+        return request, method
 
     def prepare_expected_response(self, response: bytes) -> None:
-        """Prepare expected response from deproxy server."""
+        """
+        Prepare expected response from deproxy server. Servers send the same response
+        bytes to many requests, so the expected response is reused while it's fresh.
+        """
+        expected = self.__expected_response
+        if (
+            expected is not None
+            and expected.raw == response
+            and time.monotonic() - expected.created < self.TEMPLATE_TTL
+        ):
+            return
+
         self.__logger.info("Prepare expected response")
         self.__logger.debug(f"Response before preparing:\n{response.decode()}")
 
+        response_bytes = response
         try:
             response = Response(response.decode(), body_parsing=True)
         except (ValueError, ParseError):
@@ -163,22 +337,27 @@ class DeproxyAutoParser:
         response.set_expected()
         response.add_tempesta_headers()
         response.headers.expected_time_delta = 30
-        self.__expected_response = response
+        self.__expected_response = _ExpectedResponse(raw=response_bytes, response=response)
 
     def __prepare_expected_response_for_request(
-        self, received_response: Response | H2Response, http2: bool
+        self,
+        template: Response,
+        received_response: Response | H2Response,
+        http2: bool,
+        method: str,
     ) -> Response | H2Response:
         """
         We prepare the expected response a second time when the client receives the response
         from Tempesta because deproxy server does not know about client protocol and the response
-        maybe from cache.
+        maybe from cache. The result depends on the protocol, the cache and the HEAD method only,
+        so it's built once for each of them, see `_ExpectedResponse`.
         """
         if http2:
-            expected_response = H2Response.convert_http1_to_http2(self.__expected_response)
+            expected_response = H2Response.convert_http1_to_http2(template)
         else:
-            expected_response = copy.deepcopy(self.__expected_response)
+            expected_response = copy.deepcopy(template)
 
-        self.__prepare_body_for_HEAD_request(expected_response)
+        self.__prepare_body_for_HEAD_request(expected_response, method)
 
         expected_response.headers.delete_all("trailer")
         self.__prepare_hop_by_hop_headers(expected_response)
@@ -188,16 +367,16 @@ class DeproxyAutoParser:
             # Tempesta doesn't cache "set-cookie" header
             expected_response.headers.delete_all("set-cookie")
         if http2 or is_cache:
-            self.__prepare_chunked_expected_response(expected_response, http2)
+            self.__prepare_chunked_expected_response(expected_response, http2, method)
         else:
-            if self.__client_request.method == "HEAD":
+            if method == "HEAD":
                 for name, value in expected_response.trailer.headers:
                     expected_response.trailer.delete_all(name)
 
         if not http2:
             self.__add_content_length_header_to_expected_response(expected_response)
 
-        self.__prepare_body_for_HEAD_request(expected_response)
+        self.__prepare_body_for_HEAD_request(expected_response, method)
         return expected_response
 
     def __prepare_host_for_http1(self, request: Request, is_http1: bool) -> None:
@@ -235,9 +414,9 @@ class DeproxyAutoParser:
             )
             request.method = "GET"
 
-    def __prepare_body_for_HEAD_request(self, response: Response | H2Response) -> None:
+    def __prepare_body_for_HEAD_request(self, response: Response | H2Response, method: str) -> None:
         """Tempesta doesn't return trailers for HEAD requests."""
-        if self.__client_request.method == "HEAD":
+        if method == "HEAD":
             self.__logger.info(f"Request method is 'HEAD'. Remove body from expected response")
             response.body = ""
             for name in response.trailer.keys():
@@ -272,7 +451,7 @@ class DeproxyAutoParser:
             message.body += "\r\n"
 
     def __prepare_chunked_expected_response(
-        self, expected_response: Response | H2Response, http2: bool
+        self, expected_response: Response | H2Response, http2: bool, method: str
     ) -> None:
         """
         For http2:
@@ -280,7 +459,7 @@ class DeproxyAutoParser:
         For cache response:
             - Tempesta store response with Content-Encoding and Content-length headers
         """
-        method_is_head = self.__client_request.method == "HEAD"
+        method_is_head = method == "HEAD"
         if "Transfer-Encoding" in expected_response.headers:
             self.__logger.info("Response: Transfer-Encoding header is present in http2/cache.")
 
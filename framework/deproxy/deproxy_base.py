@@ -18,6 +18,10 @@ from framework.services.stateful import Stateful
 
 
 class BaseDeproxy(asyncore.DeproxyAsyncore, Stateful, ABC):
+    # The deproxy is run by the polling thread of `DeproxyManager`, so it's started
+    # and stopped under the polling lock, see `set_lock()`.
+    _polled: bool = True
+
     def __init__(
         self,
         *,
@@ -111,11 +115,15 @@ class BaseDeproxy(asyncore.DeproxyAsyncore, Stateful, ABC):
             self.__release()
 
     def __acquire(self) -> None:
+        if not self._polled:
+            return
         self._tcp_logger.debug("Try to capture the thread Lock")
         self.__polling_lock.acquire()
         self._tcp_logger.debug("Thread Lock was successfully captured")
 
     def __release(self) -> None:
+        if not self._polled:
+            return
         self._tcp_logger.debug("Try to release the thread Lock")
         self.__polling_lock.release()
         self._tcp_logger.debug("Thread Lock has been successfully released")
@@ -0,0 +1,105 @@
+"""
+Consumers of response bodies received by HTTP/2 deproxy clients.
+
+A sink is created for each response stream and receives the body by DATA frames.
+Only `StoreBodySink` keeps the body in the response, other sinks allow to receive
+huge or a lot of responses without keeping them in memory. Responses with bodies
+which aren't stored must not be checked by the deproxy auto parser.
+"""
+
+import abc
+import hashlib
+import os
+import tempfile
+from typing import List, Optional
+
+from framework.deproxy import deproxy_message
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+
+class BodySink(abc.ABC):
+    def __init__(self):
+        # the number of received body bytes
+        self.length = 0
+
+    def write(self, data: bytes) -> None:
+        self.length += len(data)
+        self._write(data)
+
+    @abc.abstractmethod
+    def _write(self, data: bytes) -> None: ...
+
+    def finish(self, response: deproxy_message.HttpMessage) -> None:
+        """The stream is ended, attach the sink to the response."""
+        self.close()
+        response.body_sink = self
+
+    def close(self) -> None:
+        """Release resources of the sink, e.g. if the stream is reset."""
+
+
+class StoreBodySink(BodySink):
+    """Keep the body in the response, it's the default sink."""
+
+    def __init__(self):
+        super().__init__()
+        # chunks are joined once, so the cost is linear for any number of DATA frames
+        self._chunks: List[bytes] = []
+
+    def _write(self, data: bytes) -> None:
+        self._chunks.append(data)
+
+    def finish(self, response: deproxy_message.HttpMessage) -> None:
+        super().finish(response)
+        response.set_raw_body(b"".join(self._chunks), errors="surrogateescape")
+        self._chunks = []
+
+
+class CountBodySink(BodySink):
+    """Count body bytes only, see `length`."""
+
+    def _write(self, data: bytes) -> None:
+        pass
+
+
+class HashBodySink(BodySink):
+    """Calculate a digest of the body, see `digest`."""
+
+    def __init__(self, algorithm: str = "sha256"):
+        super().__init__()
+        self._hash = hashlib.new(algorithm)
+
+    def _write(self, data: bytes) -> None:
+        self._hash.update(data)
+
+    @property
+    def digest(self) -> str:
+        return self._hash.hexdigest()
+
+
+class FileBodySink(BodySink):
+    """
+    Write the body to a new file in `directory` (the system temporary directory
+    by default), see `path`. The file isn't removed by the sink.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        super().__init__()
+        self._file = tempfile.NamedTemporaryFile(
+            prefix="deproxy-body-", dir=directory, delete=False
+        )
+        self.path: str = self._file.name
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def remove(self) -> None:
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -4,14 +4,17 @@ __license__ = "GPL2"
 
 
 import abc
+import asyncio
 import dataclasses
 import errno
 import socket
 import ssl
 import sys
+import threading
 import time
-from collections import defaultdict
-from typing import Dict, List, Optional, Union
+import traceback
+from collections import deque
+from typing import Callable, Dict, List, Optional, Union
 
 import h2.connection
 from h2.connection import AllowedStreamIDs, ConnectionState
@@ -30,16 +33,41 @@ from h2.events import (
 from h2.settings import SettingCodes, Settings
 from h2.stream import StreamInputs
 from hpack import Encoder
+from hyperframe.frame import ContinuationFrame, HeadersFrame, PushPromiseFrame
 
 import run_config
-from framework.deproxy import deproxy_message
+from framework.deproxy import (
+    deproxy_body_sink,
+    deproxy_history,
+    deproxy_message,
+    deproxy_recorder,
+)
 from framework.deproxy.deproxy_base import BaseDeproxy
 from framework.deproxy.deproxy_message import ParseError
+from framework.deproxy.deproxy_schedule import ArrivalSchedule, ConstantArrivals
 from framework.helpers import error, tf_cfg, util
+from framework.helpers.histogram import RequestLatency
 from framework.services import stateful
 
+_thread_local = threading.local()
+
+
+def _recv_chunk() -> memoryview:
+    """
+    A receive buffer shared by all clients of the thread. Received data is copied to
+    the parser right away, so thousands of connections don't need own buffers.
+    """
+    chunk = getattr(_thread_local, "recv_chunk", None)
+    if chunk is None:
+        chunk = _thread_local.recv_chunk = memoryview(bytearray(deproxy_message.MAX_MESSAGE_SIZE))
+    return chunk
+
 
 class BaseDeproxyClient(BaseDeproxy, abc.ABC):
+    # Which received responses are kept, see `set_retention()`.
+    retention: str = deproxy_history.RETENTION_FULL
+    retention_size: int = 1000
+
     def __init__(
         self,
         # BaseDeproxy
@@ -78,14 +106,18 @@ class BaseDeproxyClient(BaseDeproxy, abc.ABC):
         self.server_hostname = server_hostname
 
         self.request_buffer = ""
-        self.response_buffer = ""
         self.conn_addr = conn_addr
         self.__error_codes: list[Exception | ErrorCodes] = []
         self.__is_rst_received: bool = None
 
-        self.rps = 0
+        # when requests must be sent, see `set_schedule()`
+        self.schedule: Optional[ArrivalSchedule] = None
+        # called for each received response, e.g. by a client pool to count responses
+        self.on_response: Optional[Callable[[deproxy_message.Response], None]] = None
         self.parsing = True
         self.close_connection_for_tcp_fin = True
+        # wakes up waits when responses, frames or the connection state are changed
+        self.notifier = util.Notifier(parent=util.deproxy_notifier)
 
         self.simple_get = self.create_request("GET", headers=[])
 
@@ -118,16 +150,11 @@ class BaseDeproxyClient(BaseDeproxy, abc.ABC):
         After this, 5-th request proceed, and client's IP is blocked. In this case we will have only
         3 responses despite the fact that request_rate=4.
         """
-        d = defaultdict(lambda: 0)
-        for r in self.responses:
-            d[int(r.status)] += 1
-        return dict(d)
+        return {int(status): n for status, n in self.responses.counts.items()}
 
     @property
     def last_response(self) -> Optional[deproxy_message.Response | deproxy_message.H2Response]:
-        if not self.responses:
-            return None
-        return self.responses[-1]
+        return self.responses.last
 
     @property
     def request_buffers(self) -> List[bytes]:
@@ -140,6 +167,10 @@ class BaseDeproxyClient(BaseDeproxy, abc.ABC):
     @abc.abstractmethod
     def _add_to_request_buffers(self, *args, **kwargs) -> None: ...
 
+    @property
+    def error_codes(self) -> list[Exception | ErrorCodes]:
+        return list(self.__error_codes)
+
     def _add_error_code(self, error_code: Exception | ErrorCodes) -> None:
         self.__error_codes.append(error_code)
 
@@ -163,33 +194,58 @@ class BaseDeproxyClient(BaseDeproxy, abc.ABC):
     def _has_pending_data(self):
         if self._cur_req_num >= self._nrreq:
             return False
-        if time.time() < self.next_request_time():
+        if time.monotonic() < self.next_request_time():
             return False
         if (
             self.segment_gap != 0
-            and time.time() - self._last_segment_time < self.segment_gap / 1000.0
+            and time.monotonic() - self._last_segment_time < self.segment_gap / 1000.0
         ):
             return False
         return True
 
+    def _next_write_time(self) -> Optional[float]:
+        if not self._connected or self._cur_req_num >= self._nrreq:
+            return None
+        next_time = self.next_request_time()
+        if self.segment_gap != 0:
+            next_time = max(next_time, self._last_segment_time + self.segment_gap / 1000.0)
+        return next_time
+
     def _send_data(self):
-        """Send data from `self.request_buffers` and cut them."""
-        reqs = self.request_buffers[self._cur_req_num]
+        """
+        Send data from `self.request_buffers`. A partially sent buffer isn't cut,
+        `self._send_offset` is advanced instead. Sent buffers are replaced with b"".
+        """
+        reqs = memoryview(self.request_buffers[self._cur_req_num])[self._send_offset :]
 
         sent = self._send(reqs[: self.segment_size] if self.segment_size else reqs)
         if sent < 0:
             return
-        self._last_segment_time = time.time()
-        self.request_buffers[self._cur_req_num] = reqs[sent:]
-        if len(self.request_buffers[self._cur_req_num]) == 0:
-            self._cur_req_num += 1
+        self._last_segment_time = time.monotonic()
+        self._send_offset += sent
+        if sent == len(reqs):
+            self._complete_request_buffer()
             self._http_logger.info(
                 f"A request was send. The current number of a request - {self._cur_req_num}"
             )
         elif not self.segment_size:
-            self._tcp_logger.info(
-                f"{sent} bytes sent. {len(self.request_buffers[self._cur_req_num])} bytes left."
-            )
+            self._tcp_logger.info(f"{sent} bytes sent. {len(reqs) - sent} bytes left.")
+
+    def _complete_request_buffer(self) -> None:
+        self._request_sent(self._cur_req_num, time.monotonic())
+        self.request_buffers[self._cur_req_num] = b""
+        self._send_offset = 0
+        self._cur_req_num += 1
+
+    def _request_sent(self, n: int, timestamp: float) -> None:
+        """Remember when the request buffer number `n` was sent to measure latency."""
+
+    def _record_latency(self, sent: Optional[float], first_byte: float, complete: float) -> None:
+        if sent is None:
+            # the request wasn't sent by `make_request()` or the response came before it
+            return
+        self.latency.first_byte.record(first_byte - sent)
+        self.latency.complete.record(complete - sent)
 
     def __setup_write(self):
         self.writable = self._has_pending_data
@@ -199,22 +255,64 @@ class BaseDeproxyClient(BaseDeproxy, abc.ABC):
         if self.writable():
             self._handle_write()
 
+    def _readwrite(self, flags) -> None:
+        super()._readwrite(flags)
+        self.notifier.notify()
+
     def _handle_connect(self):
         if self.ssl:
             self._socket = self._context.wrap_socket(
                 self._socket, do_handshake_on_connect=False, server_hostname=self.server_hostname
             )
-        self._start_time = time.time()
+        self._start_time = time.monotonic()
+        self._record_open()
+
+    def _record_open(self) -> None:
+        if deproxy_recorder.active is not None:
+            deproxy_recorder.record(
+                self,
+                deproxy_recorder.CLIENT_OPEN,
+                info={
+                    "id": self.id,
+                    "addr": self.conn_addr,
+                    "port": self.port,
+                    "ssl": self.ssl,
+                    "server_hostname": self.server_hostname,
+                    "h2": self._is_http2,
+                },
+            )
+
+    def _record_close(self) -> None:
+        recording = getattr(self, "_recording", None)
+        if recording is not None and recording[0] is deproxy_recorder.active:
+            deproxy_recorder.record(self, deproxy_recorder.CLIENT_CLOSE)
+        self._recording = None
+
+    def _sent(self, buffers, nbytes: int) -> None:
+        if deproxy_recorder.active is not None:
+            data = buffers[0] if len(buffers) == 1 else b"".join(buffers)
+            deproxy_recorder.record(self, deproxy_recorder.CLIENT_SEND, data[:nbytes])
+
+    def _received(self, data) -> None:
+        if deproxy_recorder.active is not None:
+            deproxy_recorder.record(self, deproxy_recorder.CLIENT_RECV, data)
+
+    def _save_close_errno(self, sock: socket.socket | None) -> None:
+        if sock is None:
+            return
+        try:
+            err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            self._tcp_logger.info(f"Close with errno={err}")
+            self.__is_rst_received = True if err == errno.EPIPE else False
+        except OSError as why:
+            if why.errno != errno.EBADF:
+                raise
 
     def _handle_close(self):
         if self.close_connection_for_tcp_fin:
-            try:
-                err = self._socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
-                self._tcp_logger.info(f"Close with errno={err}")
-                self.__is_rst_received = True if err == errno.EPIPE else False
-            except OSError as why:
-                if why.errno != errno.EBADF:
-                    raise
+            self._save_close_errno(self._socket)
+            if self._connected:
+                self._record_close()
             super()._handle_close()
             self.writable = self._in_connecting_state
             self._handle_write = self.__setup_write
@@ -246,12 +344,27 @@ class BaseDeproxyClient(BaseDeproxy, abc.ABC):
             self._handle_close()
             error.bug("\tDeproxy: Client: %s" % v)
 
+    @property
+    def rps(self) -> float:
+        """The average request rate of the schedule, 0 if requests are sent as soon as possible."""
+        return getattr(self.schedule, "rps", 0)
+
     def set_rps(self, rps):
-        self.rps = rps
+        self.set_schedule(ConstantArrivals(rps) if rps else None)
+
+    def set_schedule(self, schedule: Optional[ArrivalSchedule]) -> None:
+        """
+        Send requests by the open-loop schedule from the connection start:
+        the request number N is sent at its time, even if responses to previous
+        requests are not received yet. None - send requests as soon as possible.
+        """
+        self.schedule = schedule
+        self._update_interest()
 
     def _stop_deproxy(self):
         self.close_connection_for_tcp_fin = True
         self._handle_close()
+        self.notifier.notify()
 
     def _run_deproxy(self):
         self._create_socket()
@@ -268,10 +381,11 @@ class BaseDeproxyClient(BaseDeproxy, abc.ABC):
     @abc.abstractmethod
     def _handle_read(self): ...
 
-    def next_request_time(self):
-        if self.rps == 0:
+    def next_request_time(self) -> float:
+        """Time (`time.monotonic()`) when the current request must be sent."""
+        if self.schedule is None:
             return self._start_time
-        return self._start_time + float(self._cur_req_num) / self.rps
+        return self._start_time + self.schedule.send_time(self._cur_req_num)
 
     @abc.abstractmethod
     def make_requests(self, requests): ...
@@ -305,6 +419,7 @@ class BaseDeproxyClient(BaseDeproxy, abc.ABC):
         self._nrreq += 1
         if expect_response:
             self._valid_req_num += 1
+        self._update_interest()
 
     async def wait_for_connection_open(
         self, timeout: float = 5, adjust_timeout: bool = True, msg: Optional[str] = None
@@ -318,6 +433,7 @@ class BaseDeproxyClient(BaseDeproxy, abc.ABC):
             timeout,
             abort_cond=lambda: not self._connecting,
             adjust_timeout=adjust_timeout,
+            notifier=self.notifier,
         )
         assert timeout_not_exceeded, f"{timeout_not_exceeded} is not True." + (
             msg or f"Timeout exceeded while waiting connection open: {timeout}"
@@ -338,6 +454,7 @@ class BaseDeproxyClient(BaseDeproxy, abc.ABC):
             timeout,
             abort_cond=lambda: self.state == stateful.STATE_ERROR,
             adjust_timeout=adjust_timeout,
+            notifier=self.notifier,
         )
         assert timeout_not_exceeded, f"{timeout_not_exceeded} is not True." + (
             msg or f"Timeout exceeded while waiting connection close: {timeout}"
@@ -352,6 +469,7 @@ class BaseDeproxyClient(BaseDeproxy, abc.ABC):
             lambda: self._cur_req_num < valid_req_num,
             timeout,
             abort_cond=lambda: self.state != stateful.STATE_STARTED,
+            notifier=self.notifier,
         )
 
         assert timeout_not_exceeded, (
@@ -374,6 +492,7 @@ class BaseDeproxyClient(BaseDeproxy, abc.ABC):
             timeout,
             abort_cond=lambda: self.connection_is_closed and not self._connecting,
             adjust_timeout=adjust_timeout,
+            notifier=self.notifier,
         )
         assert timeout_not_exceeded, f"{timeout_not_exceeded} is not True." + (
             msg or f"Timeout exceeded while waiting response: {timeout}"
@@ -381,6 +500,8 @@ class BaseDeproxyClient(BaseDeproxy, abc.ABC):
 
     def receive_response(self, response: deproxy_message.Response) -> None:
         self.responses.append(response)
+        if self.on_response is not None:
+            self.on_response(response)
         self._clear_last_response_buffer = True
         self._http_logger.info(
             f"A response was receive. The response status={response.status}. "
@@ -406,11 +527,29 @@ class BaseDeproxyClient(BaseDeproxy, abc.ABC):
         self._cur_req_num = 0
         # This state variable contains a timestamp of the last segment sent
         self._last_segment_time = 0
-        self.responses: List[deproxy_message.Response] = list()
+        # number of sent bytes of the current request buffer
+        self._send_offset = 0
+        # latencies of requests sent after the last `clear_stats()`
+        self.latency = RequestLatency()
+        self.responses = self._create_history()
         self._ack_cnt = 0
         self._src_ip = None
         self._src_port = None
 
+    def _create_history(self) -> deproxy_history.MessageHistory:
+        return deproxy_history.MessageHistory(
+            self.retention, self.retention_size, count_by=lambda response: response.status
+        )
+
+    def set_retention(self, retention: str, size: int = 1000) -> None:
+        """
+        Keep all responses, the last `size` responses or counters and a digest of bodies only,
+        see `deproxy_history`. Already received responses are dropped.
+        """
+        self.retention = retention
+        self.retention_size = size
+        self.responses = self._create_history()
+
     @property
     def connection_is_closed(self) -> bool:
         return not self._connected
@@ -447,6 +586,13 @@ class BaseDeproxyClient(BaseDeproxy, abc.ABC):
 
 
 class DeproxyClient(BaseDeproxyClient):
+    # Send all request buffers which are ready by one `sendmsg()` per writable event
+    # instead of one buffer per event. `rps` is honored. Requests are sent one by one
+    # if `segment_size` is set, so a TCP segment never contains several requests.
+    batch_send: bool = False
+    # The maximum number of buffers for one `sendmsg()`, see IOV_MAX.
+    max_batch_buffers: int = 1024
+
     def make_requests(self, requests: list[deproxy_message.Request | str], pipelined=False) -> None:
         """
         if pipelined is True:
@@ -467,6 +613,7 @@ class DeproxyClient(BaseDeproxyClient):
             self._valid_req_num += len(requests)
 
             self._nrreq += len(self.request_buffers) - req_buf_len
+            self._update_interest()
         else:
             for request in requests:
                 self.make_request(request)
@@ -478,8 +625,11 @@ class DeproxyClient(BaseDeproxyClient):
         self._valid_req_num += 1
         self._add_to_request_buffers(request if isinstance(request, str) else request.msg)
         self._nrreq += 1
+        self._update_interest()
 
     def __check_request(self, request: str | deproxy_message.Request) -> None:
+        # the request parsed from a string is not used anymore, so the auto parser may change it
+        req = None
         if self.parsing and isinstance(request, str):
             self._http_logger.info("Request parsing is running.")
             req = deproxy_message.Request(request)
@@ -501,7 +651,9 @@ class DeproxyClient(BaseDeproxyClient):
             expected_request = request.encode()
 
         if self._deproxy_auto_parser.parsing:
-            self._deproxy_auto_parser.prepare_expected_request(expected_request, client=self)
+            self._deproxy_auto_parser.prepare_expected_request(
+                expected_request, client=self, message=req
+            )
 
     @staticmethod
     def create_request(
@@ -525,25 +677,86 @@ class DeproxyClient(BaseDeproxyClient):
             body=body,
         )
 
+    def clear_stats(self):
+        super().clear_stats()
+        # The HTTP1 client must be informed about a request method to parse body.
+        self._parser = deproxy_message.HttpStreamParser(
+            deproxy_message.Response, method=lambda n: self.methods[n]
+        )
+        # the number of expected responses when each request buffer was added
+        self._buffer_nrresp: List[int] = []
+        # send times of requests waiting for responses, responses come in the same order
+        self._send_times: deque[float] = deque()
+        self._nrsent_resp = 0
+        # time when the first byte of the current response was received
+        self._first_byte_time: Optional[float] = None
+
+    @property
+    def response_buffer(self) -> bytearray:
+        """Received data which is not parsed to responses yet."""
+        return self._parser.buffer
+
     def _handle_read(self):
-        self.response_buffer += self._recv(deproxy_message.MAX_MESSAGE_SIZE).decode()
-        if not self.response_buffer:
+        recv_chunk = _recv_chunk()
+        nbytes = self._recv_into(recv_chunk)
+        if not nbytes:
             return
-        while len(self.response_buffer) > 0:
-            try:
-                method = self.methods[self._nrresp]
-                response = deproxy_message.Response(self.response_buffer, method=method)
-                self.response_buffer = self.response_buffer[response.original_length :]
-            except deproxy_message.IncompleteMessage:
-                self._http_logger.debug(f"Receive IncompleteMessage")
-                return
-            except deproxy_message.ParseError:
-                self._http_logger.error(
-                    f"Can't parse message\n<<<<\n{self.response_buffer}\n>>>>", exc_info=True
+        now = time.monotonic()
+        if self._first_byte_time is None:
+            self._first_byte_time = now
+        self._parser.append(recv_chunk[:nbytes])
+        try:
+            for response in self._parser.messages():
+                self._nrresp += 1
+                self._record_latency(
+                    self._send_times.popleft() if self._send_times else None,
+                    self._first_byte_time,
+                    now,
                 )
-                raise
-            self._nrresp += 1
-            self.receive_response(response)
+                # the rest of the data belongs to the next response
+                self._first_byte_time = now if self._parser.buffer else None
+                self.receive_response(response)
+        except deproxy_message.ParseError:
+            self._http_logger.error(
+                f"Can't parse message\n<<<<\n{bytes(self.response_buffer)}\n>>>>", exc_info=True
+            )
+            raise
+
+    def _send_data(self):
+        if not self.batch_send or self.segment_size:
+            return super()._send_data()
+
+        last = self._nrreq
+        last = min(last, self._cur_req_num + self.max_batch_buffers)
+        if self.schedule is not None:
+            # requests which time has come, see `next_request_time()`
+            elapsed = time.monotonic() - self._start_time
+            due = self._cur_req_num + 1
+            while due < last and self.schedule.send_time(due) <= elapsed:
+                due += 1
+            last = due
+
+        views = [memoryview(self.request_buffers[self._cur_req_num])[self._send_offset :]]
+        for i in range(self._cur_req_num + 1, last):
+            views.append(memoryview(self.request_buffers[i]))
+
+        sent = self._sendmsg(views)
+        if sent < 0:
+            return
+        self._last_segment_time = time.monotonic()
+        nrreq = self._cur_req_num
+        for view in views:
+            if sent < len(view):
+                # the buffer is sent partially
+                self._send_offset += sent
+                break
+            sent -= len(view)
+            self._complete_request_buffer()
+        if self._cur_req_num != nrreq:
+            self._http_logger.info(
+                f"{self._cur_req_num - nrreq} requests were sent. "
+                f"The current number of a request - {self._cur_req_num}"
+            )
 
     def _add_to_request_buffers(self, data, *_, **__) -> None:
         data = data if isinstance(data, list) else [data]
@@ -551,6 +764,13 @@ class DeproxyClient(BaseDeproxyClient):
             self._request_buffers.append(
                 request if isinstance(request, bytes) else request.encode()
             )
+            # `self.methods` has a method for each expected response
+            self._buffer_nrresp.append(len(self.methods))
+
+    def _request_sent(self, n: int, timestamp: float) -> None:
+        nrresp = self._buffer_nrresp[n]
+        self._send_times.extend([timestamp] * (nrresp - self._nrsent_resp))
+        self._nrsent_resp = max(self._nrsent_resp, nrresp)
 
 
 class HuffmanEncoder(Encoder):
@@ -562,6 +782,13 @@ class HuffmanEncoder(Encoder):
         return super().encode(headers=headers, huffman=self.huffman)
 
 
+# HTTP/2 frame header, RFC 9113 4.1
+_FRAME_HEADER_LEN = 9
+_FLAG_END_HEADERS = 0x4
+_FLAG_PADDED = 0x8
+_FLAG_PRIORITY = 0x20
+
+
 @dataclasses.dataclass
 class ReqBodyBuffer:
     body: bytes | None
@@ -570,6 +797,20 @@ class ReqBodyBuffer:
 
 
 class DeproxyClientH2(BaseDeproxyClient):
+    # Creates a body consumer for each response stream, e.g. `deproxy_body_sink.HashBodySink`
+    # doesn't keep bodies of huge responses in memory.
+    body_sink_factory: Callable[[], deproxy_body_sink.BodySink] = deproxy_body_sink.StoreBodySink
+
+    @property
+    def batch_send(self) -> bool:
+        return False
+
+    @batch_send.setter
+    def batch_send(self, batch_send: bool) -> None:
+        """Frames are already sent by one buffer, see `DeproxyClient.batch_send`."""
+        if batch_send:
+            raise ValueError("HTTP/2 deproxy clients don't support `batch_send`.")
+
     async def run_start(self):
         await super(DeproxyClientH2, self).run_start()
         self.update_initial_settings()
@@ -622,6 +863,7 @@ class DeproxyClientH2(BaseDeproxyClient):
         if end_stream:
             self.stream_id += 2
             self._valid_req_num += 1
+        self._update_interest()
 
     def send_ping(self, data: bytes = b"\x00\x01\x02\x03\x04\x05\x06\x07") -> None:
         self.h2_connection.ping(opaque_data=data)
@@ -717,6 +959,7 @@ class DeproxyClientH2(BaseDeproxyClient):
             lambda: not self._ack_settings,
             timeout,
             abort_cond=lambda: self.connection_is_closed and not self._connecting,
+            notifier=self.notifier,
         )
 
         assert timeout_not_exceeded, f"{timeout_not_exceeded} is not True." + (
@@ -731,6 +974,7 @@ class DeproxyClientH2(BaseDeproxyClient):
             lambda: not self.h2_connection._stream_is_closed_by_reset(stream_id=stream_id),
             timeout,
             abort_cond=lambda: self.connection_is_closed and not self._connecting,
+            notifier=self.notifier,
         )
 
         assert timeout_not_exceeded, f"{timeout_not_exceeded} is not True." + (
@@ -747,6 +991,7 @@ class DeproxyClientH2(BaseDeproxyClient):
             lambda: not stream.state_machine.headers_received,
             timeout,
             abort_cond=lambda: self.connection_is_closed and not self._connecting,
+            notifier=self.notifier,
         )
 
         assert timeout_not_exceeded, f"{timeout_not_exceeded} is not True." + (
@@ -761,6 +1006,7 @@ class DeproxyClientH2(BaseDeproxyClient):
             lambda: self._ping_received < ping_count,
             timeout,
             abort_cond=lambda: self.connection_is_closed and not self._connecting,
+            notifier=self.notifier,
         )
 
         assert timeout_not_exceeded, f"{timeout_not_exceeded} is not True." + (
@@ -797,7 +1043,13 @@ class DeproxyClientH2(BaseDeproxyClient):
 
     @property
     def last_response_buffer(self) -> bytes:
-        return self._last_response_buffer
+        """
+        Frames received since the last response. DATA frame payloads are kept only if
+        bodies are stored, i.e. `body_sink_factory` is `deproxy_body_sink.StoreBodySink`.
+        """
+        if self._last_response_bytes is None:
+            self._last_response_bytes = bytes(self._last_response_buffer)
+        return self._last_response_bytes
 
     def increment_flow_control_window(self, stream_id, flow_controlled_length):
         if self.h2_connection.state_machine.state != ConnectionState.CLOSED:
@@ -822,9 +1074,17 @@ class DeproxyClientH2(BaseDeproxyClient):
 
         if self._clear_last_response_buffer:
             self._clear_last_response_buffer = False
-            self._last_response_buffer = bytes()
-
-        self._last_response_buffer += self.response_buffer
+            self._last_response_buffer = bytearray()
+            # a header block which isn't ended yet belongs to the next response
+            self._header_blocks = self._header_blocks[-1:] if self._header_block_open else []
+
+        self._last_response_bytes = None
+        if self.body_sink_factory is deproxy_body_sink.StoreBodySink:
+            self._last_response_buffer += self.response_buffer
+            self._index_frames(self.response_buffer)
+        else:
+            self._index_frames(self.response_buffer, raw=self._last_response_buffer)
+        now = time.monotonic()
         try:
             events = self.h2_connection.receive_data(self.response_buffer)
 
@@ -841,11 +1101,11 @@ class DeproxyClientH2(BaseDeproxyClient):
                     )
 
                     self._active_responses[event.stream_id] = response
+                    self._body_sinks[event.stream_id] = self.body_sink_factory()
+                    self._first_byte_times[event.stream_id] = now
 
                 elif isinstance(event, DataReceived):
-                    body = event.data.decode()
-                    response = self._active_responses.get(event.stream_id)
-                    response.body += body
+                    self._body_sinks[event.stream_id].write(event.data)
                     if self.auto_flow_control:
                         self.increment_flow_control_window(
                             event.stream_id, event.flow_controlled_length
@@ -858,12 +1118,23 @@ class DeproxyClientH2(BaseDeproxyClient):
                     response = self._active_responses.pop(event.stream_id, None)
                     if response is None:
                         return
+                    self._body_sinks.pop(event.stream_id).finish(response)
                     self._response_sequence.append(event.stream_id)
+                    self._record_latency(
+                        self._send_times.pop(event.stream_id, None),
+                        self._first_byte_times.pop(event.stream_id, now),
+                        now,
+                    )
                     self.receive_response(response)
                     self._nrresp += 1
                 elif isinstance(event, StreamReset):
                     # the client don't receive a response for RST_STREAM, so we should decrease a counter
                     self._valid_req_num -= 1
+                    sink = self._body_sinks.pop(event.stream_id, None)
+                    if sink is not None:
+                        sink.close()
+                    self._send_times.pop(event.stream_id, None)
+                    self._first_byte_times.pop(event.stream_id, None)
                     self._add_error_code(event.error_code)
                 elif isinstance(event, ConnectionTerminated):
                     self._add_error_code(event.error_code)
@@ -904,7 +1175,7 @@ class DeproxyClientH2(BaseDeproxyClient):
         Move data from `self.req_body_buffers` to `self.request_buffers`
             when `self.request_buffers` is empty for current request.
         Increase `self.cur_req_num` when two buffers are empty for current request.
-        Does not send data when flow_control_window is 0.
+        Does not send data when flow_control_window is 0 and returns False in this case.
         """
         cur_req_num = self._cur_req_num
 
@@ -927,7 +1198,8 @@ class DeproxyClientH2(BaseDeproxyClient):
             # For example: make_request(request=b""). In this case size is 0, but data_to_send is
             # empty DATA frame
             if not data_to_send:
-                return None
+                # the flow control window is exhausted, wait for WINDOW_UPDATE
+                return False
             self._request_buffers[cur_req_num] = data_to_send
             body = self._req_body_buffers[cur_req_num].body
             self._req_body_buffers[cur_req_num].body = None if len(body) == size else body[size:]
@@ -1025,6 +1297,7 @@ class DeproxyClientH2(BaseDeproxyClient):
                 priority_exclusive,
             )
             self._request_buffers.append(self.h2_connection.data_to_send())
+            self._buffer_streams[len(self._request_buffers) - 1] = self.stream_id
             self._add_to_body_buffers(
                 body=data[1].encode(), stream_id=self.stream_id, end_stream=end_stream
             )
@@ -1039,6 +1312,7 @@ class DeproxyClientH2(BaseDeproxyClient):
                 priority_exclusive,
             )
             self._request_buffers.append(self.h2_connection.data_to_send())
+            self._buffer_streams[len(self._request_buffers) - 1] = self.stream_id
             self._add_to_body_buffers(body=None, stream_id=None, end_stream=None)
 
         if self._deproxy_auto_parser.parsing and end_stream and isinstance(data, (tuple, list)):
@@ -1046,63 +1320,103 @@ class DeproxyClientH2(BaseDeproxyClient):
                 self._deproxy_auto_parser.create_request_from_list_or_tuple(data), client=self
             )
 
-    def __calculate_frame_length(self, pos):
-        #: The type byte defined for CONTINUATION frames.
-        continuation_type = 0x09
-
-        frame_type = self._last_response_buffer[pos + 3]
-        if frame_type != continuation_type:
-            return -1
-        # TCP/IP use big endian
-        return int.from_bytes(self._last_response_buffer[pos : pos + 3], "big")
+    def _index_frames(self, data: bytes, raw: Optional[bytearray] = None) -> None:
+        """
+        Split received data to frames and collect header block fragments of HEADERS,
+        PUSH_PROMISE and CONTINUATION frames. Payloads of other frames aren't copied.
+        Frame headers and header block fragments are also appended to `raw` if it's set.
+        """
+        data = memoryview(data)
+        if self._frame_skip:
+            skip = min(self._frame_skip, len(data))
+            self._frame_skip -= skip
+            data = data[skip:]
+        buf = self._frame_buffer
+        buf += data
+        pos = 0
+        while len(buf) - pos >= _FRAME_HEADER_LEN:
+            start = pos + _FRAME_HEADER_LEN
+            end = start + int.from_bytes(buf[pos : pos + 3], "big")
+            frame_type, flags = buf[pos + 3], buf[pos + 4]
+            is_header_frame = frame_type in (
+                HeadersFrame.type,
+                PushPromiseFrame.type,
+                ContinuationFrame.type,
+            )
+            if end > len(buf):
+                if not is_header_frame:
+                    # don't buffer DATA frames, only skip them
+                    if raw is not None:
+                        raw += buf[pos:start]
+                    self._frame_skip = end - len(buf)
+                    pos = len(buf)
+                break
+            if raw is not None:
+                raw += buf[pos:end] if is_header_frame else buf[pos:start]
+            pos = end
+            if not is_header_frame:
+                continue
+
+            if frame_type == ContinuationFrame.type:
+                if self._header_block_open:
+                    self._header_blocks[-1] += buf[start:end]
+            else:
+                pad_len = 0
+                if flags & _FLAG_PADDED:
+                    pad_len = buf[start]
+                    start += 1
+                if frame_type == PushPromiseFrame.type:
+                    # promised stream id
+                    start += 4
+                elif flags & _FLAG_PRIORITY:
+                    # stream dependency and weight
+                    start += 5
+                self._header_blocks.append(bytearray(buf[start : end - pad_len]))
+            self._header_block_open = not flags & _FLAG_END_HEADERS
+        del buf[:pos]
 
     def clear_stats(self):
         super().clear_stats()
         self.h2_connection: Optional[h2.connection.H2Connection] = None
         self.stream_id: int = 1
         self._active_responses = {}
+        self._body_sinks: Dict[int, deproxy_body_sink.BodySink] = {}
         self._ack_settings: bool = False
         self._last_stream_id: Optional[int] = None
-        self._last_response_buffer = bytes()
+        self._last_response_buffer = bytearray()
+        self._last_response_bytes: Optional[bytes] = None
         self._clear_last_response_buffer: bool = False
+        # header block fragments received since the last response
+        self._header_blocks: List[bytearray] = []
+        self._header_block_open: bool = False
+        # a received part of the current frame and the remaining size of a skipped frame
+        self._frame_buffer = bytearray()
+        self._frame_skip = 0
         self._response_sequence = []
         self._req_body_buffers: List[ReqBodyBuffer] = list()
         self._auto_flow_control = True
         self._ping_received = 0
+        # request buffers with HEADERS frames and their streams
+        self._buffer_streams: Dict[int, int] = {}
+        # send times of requests and first byte times of responses by streams
+        self._send_times: Dict[int, float] = {}
+        self._first_byte_times: Dict[int, float] = {}
+
+    def _request_sent(self, n: int, timestamp: float) -> None:
+        # a request is sent when its HEADERS frame is sent
+        stream_id = self._buffer_streams.pop(n, None)
+        if stream_id is not None:
+            self._send_times[stream_id] = timestamp
 
     def check_header_presence_in_last_response_buffer(self, header: bytes) -> bool:
+        """
+        Check that the encoded `header` is in one of header blocks received since the last
+        response. A header block may be split by CONTINUATION frames, so header blocks are
+        joined from frame payloads and the header is searched in a continuous block.
+        """
         if len(header) == 0:
             return True
-        if len(header) > len(self._last_response_buffer):
-            return False
-        for bpos in range(0, len(self._last_response_buffer) - len(header) + 1):
-            if self._last_response_buffer[bpos] == header[0]:
-                equal = True
-                hpos = 0
-                skip = 0
-                while hpos < len(header):
-                    if self._last_response_buffer[bpos + hpos + skip] != header[hpos]:
-                        part_len = self.__calculate_frame_length(bpos + hpos + skip)
-                        if part_len < 0:
-                            equal = False
-                            break
-                        if part_len > len(header) - hpos:
-                            part_len = len(header) - hpos
-                        # Skip frame size
-                        skip += 9
-                        for t in range(0, part_len):
-                            if self._last_response_buffer[bpos + hpos + skip] != header[hpos]:
-                                equal = False
-                                break
-                            hpos += 1
-                        if not equal:
-                            break
-                        else:
-                            continue
-                    hpos += 1
-                if equal:
-                    return True
-        return False
+        return any(header in block for block in self._header_blocks)
 
     def init_stream_for_send(self, stream_id: int):
         """
@@ -1114,3 +1428,212 @@ class DeproxyClientH2(BaseDeproxyClient):
         )
         stream.state_machine.process_input(StreamInputs.SEND_HEADERS)
         return stream
+
+
+class _DeproxyClientProtocol(asyncio.Protocol):
+    """Forward asyncio transport events to the deproxy client."""
+
+    def __init__(self, client: "AsyncioTransportMixin"):
+        self._client = client
+        self._transport: Optional[asyncio.Transport] = None
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        self._transport = transport
+        self._client._connection_made(transport)
+
+    def data_received(self, data: bytes) -> None:
+        self._client._data_received(data)
+
+    def eof_received(self) -> bool:
+        # keep the transport half-open if the client must not close the connection on TCP FIN
+        return not self._client.close_connection_for_tcp_fin
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._client._connection_lost(self._transport, exc)
+
+    def pause_writing(self) -> None:
+        self._client._write_paused = True
+
+    def resume_writing(self) -> None:
+        self._client._write_paused = False
+        self._client._update_interest()
+
+
+class AsyncioTransportMixin:
+    """
+    Run a deproxy client on the asyncio event loop of the test instead of the polling thread.
+
+    The mixin replaces the socket layer only: requests are still prepared by
+    `make_request()`/`send_bytes()` and responses are parsed by `_handle_read()`
+    of the client class, so the public API is the same. Sending is scheduled
+    on the event loop when new data is added and the client doesn't wait for
+    the polling lock and the polling thread.
+    """
+
+    _polled = False
+
+    def _run_deproxy(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._write_paused = False
+        self._flush_handle: Optional[asyncio.Handle] = None
+        self._rx_data = b""
+
+        sock = socket.socket(
+            socket.AF_INET6 if self.is_ipv6 else socket.AF_INET, socket.SOCK_STREAM
+        )
+        sock.setblocking(False)
+        self._socket = sock
+        self._set_recv_buffer_size(sock)
+        if self.bind_addr:
+            self._bind((self.bind_addr, 0))
+            self._src_ip, self._src_port, *_ = sock.getsockname()
+
+        self._tcp_logger.info(f"Trying to connect to {self.conn_addr}:{self.port}.")
+        self._connected = False
+        self._connecting = True
+        self.addr = (self.conn_addr, self.port)
+        self._connect_task = self._loop.create_task(self.__open_connection(sock))
+
+    async def __open_connection(self, sock: socket.socket) -> None:
+        try:
+            await self._loop.sock_connect(sock, (self.conn_addr, self.port))
+            await self._loop.create_connection(
+                lambda: _DeproxyClientProtocol(self),
+                sock=sock,
+                ssl=self._context if self.ssl else None,
+                server_hostname=self.server_hostname if self.ssl else None,
+            )
+        except asyncio.CancelledError:
+            sock.close()
+            raise
+        except (OSError, ssl.SSLError) as e:
+            self._add_error_code(type(e))
+            self._tcp_logger.warning(f"Receive error - {type(e)} with message - {e}")
+            self._connecting = False
+            sock.close()
+
+    def _connection_made(self, transport: asyncio.Transport) -> None:
+        self._transport = transport
+        self._connected = True
+        self._connecting = False
+        self._start_time = time.monotonic()
+        self._record_open()
+        self._flush()
+        self.notifier.notify()
+
+    def _data_received(self, data: bytes) -> None:
+        self._received(data)
+        self._rx_data = memoryview(data)
+        try:
+            while self._rx_data:
+                self._handle_read()
+        except Exception:
+            try:
+                self._handle_error()
+            except Exception:
+                self.append_exception(traceback.format_exc())
+        self._flush()
+        self.notifier.notify()
+
+    def _connection_lost(self, transport: asyncio.Transport, exc: Optional[Exception]) -> None:
+        if transport is not self._transport:
+            # the client was stopped or restarted before the old transport was closed
+            return
+        self._tcp_logger.info(f"Connection lost: {exc}")
+        self._save_close_errno(transport.get_extra_info("socket"))
+        self._record_close()
+        self._connected = False
+        self._connecting = False
+        self._cancel_flush()
+        self.notifier.notify()
+
+    def _recv(self, buffer_size: int) -> bytes:
+        """Return data passed to the protocol by the transport."""
+        data, self._rx_data = self._rx_data[:buffer_size], self._rx_data[buffer_size:]
+        return bytes(data)
+
+    def _recv_into(self, buffer: memoryview) -> int:
+        nbytes = min(len(buffer), len(self._rx_data))
+        buffer[:nbytes] = self._rx_data[:nbytes]
+        self._rx_data = self._rx_data[nbytes:]
+        return nbytes
+
+    def _send(self, data: bytes) -> int:
+        if self._transport is None or self._transport.is_closing():
+            return 0
+        self._transport.write(data)
+        self._sent((data,), len(data))
+        return len(data)
+
+    def _sendmsg(self, buffers: list) -> int:
+        if self._transport is None or self._transport.is_closing():
+            return 0
+        self._transport.writelines(buffers)
+        nbytes = sum(len(buf) for buf in buffers)
+        self._sent(buffers, nbytes)
+        return nbytes
+
+    def _update_interest(self) -> None:
+        if self._loop is None or not self._connected or self._flush_handle is not None:
+            return
+        self._flush_handle = self._loop.call_soon(self._flush)
+
+    def _cancel_flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+    def _flush(self) -> None:
+        """Send all pending data which may be sent now and schedule the next sending by time."""
+        self._cancel_flush()
+        while self._connected and not self._write_paused and self._has_pending_data():
+            if self._transport is None or self._transport.is_closing():
+                # `connection_lost()` is called later, but nothing can be sent anymore
+                self._tcp_logger.info("The transport is closing, stop sending.")
+                self._connected = False
+                break
+            if self._send_data() is False:
+                # wait for new data from the remote side (e.g. WINDOW_UPDATE)
+                return
+
+        next_time = self._next_write_time()
+        if next_time is not None and self._connected and not self._write_paused:
+            self._flush_handle = self._loop.call_later(
+                max(next_time - time.monotonic(), 0.0), self._flush
+            )
+        self.notifier.notify()
+
+    def _handle_close(self) -> None:
+        if not self.close_connection_for_tcp_fin:
+            return
+        self._cancel_flush()
+        if self._connect_task is not None and not self._connect_task.done():
+            self._connect_task.cancel()
+        if self._transport is not None and not self._transport.is_closing():
+            self._save_close_errno(self._transport.get_extra_info("socket"))
+            self._record_close()
+            self._transport.close()
+        self._connected = False
+        self._connecting = False
+        self.notifier.notify()
+
+    def clear_stats(self) -> None:
+        super().clear_stats()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._transport: Optional[asyncio.Transport] = None
+        self._connect_task: Optional[asyncio.Task] = None
+
+    @property
+    def selected_alpn_protocol(self):
+        if self._transport is None:
+            return None
+        ssl_object = self._transport.get_extra_info("ssl_object")
+        return ssl_object.selected_alpn_protocol() if ssl_object is not None else None
+
+
+class AsyncDeproxyClient(AsyncioTransportMixin, DeproxyClient):
+    """HTTP/1 deproxy client running on the asyncio event loop."""
+
+
+class AsyncDeproxyClientH2(AsyncioTransportMixin, DeproxyClientH2):
+    """HTTP/2 deproxy client running on the asyncio event loop."""
@@ -0,0 +1,115 @@
+"""
+History of messages received by deproxy clients and servers.
+
+Stress tests receive millions of messages, so keeping all of them grows the test
+process by gigabytes. A retention policy defines which messages are kept:
+- RETENTION_FULL - all messages, the default;
+- RETENTION_RING - the last `size` messages;
+- RETENTION_DIGEST - the last message only, counters and a rolling digest of bodies.
+The number of messages and counters are kept for all messages in all modes.
+"""
+
+import hashlib
+import typing
+from collections import Counter, abc, deque
+from typing import Callable, Iterator, Optional
+
+from framework.deproxy import deproxy_message
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+RETENTION_FULL = "full"
+RETENTION_RING = "ring"
+RETENTION_DIGEST = "digest"
+
+
+class MessageHistory(abc.Sequence):
+    """
+    A list-like history of messages. `len()` is the number of all appended messages,
+    but only kept messages may be got by index or iterated. Indexes are the same as
+    in the full history, e.g. `history[-1]` is the last message in all modes.
+    """
+
+    def __init__(
+        self,
+        retention: str = RETENTION_FULL,
+        size: int = 1000,
+        count_by: Optional[Callable[[deproxy_message.HttpMessage], typing.Hashable]] = None,
+    ):
+        if retention not in (RETENTION_FULL, RETENTION_RING, RETENTION_DIGEST):
+            raise ValueError(f"Unknown retention policy: {retention}")
+        if retention == RETENTION_RING and size <= 0:
+            raise ValueError("The size of the history must be positive.")
+        self.retention = retention
+        self._count_by = count_by
+        if retention == RETENTION_FULL:
+            self._messages = []
+        else:
+            self._messages = deque(maxlen=size if retention == RETENTION_RING else 1)
+        self._count = 0
+        # the number of messages by `count_by` key
+        self.counts: typing.Counter = Counter()
+        self._digest = hashlib.sha256() if retention == RETENTION_DIGEST else None
+
+    def append(self, message: deproxy_message.HttpMessage) -> None:
+        self._messages.append(message)
+        self._count += 1
+        if self._count_by is not None:
+            self.counts[self._count_by(message)] += 1
+        if self._digest is not None:
+            body = message.raw_body
+            self._digest.update(len(body).to_bytes(8, "big"))
+            self._digest.update(body)
+
+    def skip(self, n: int = 1) -> None:
+        """
+        Count `n` messages which are not built, e.g. by a framing only parser.
+        Kept messages are dropped because they are not the last messages anymore.
+        """
+        self._messages.clear()
+        self._count += n
+
+    @property
+    def last(self) -> Optional[deproxy_message.HttpMessage]:
+        """The last appended message, None if there are no messages or it's skipped."""
+        return self._messages[-1] if self._messages else None
+
+    @property
+    def body_digest(self) -> Optional[str]:
+        """SHA-256 of bodies of all messages in order for RETENTION_DIGEST, None otherwise."""
+        return None if self._digest is None else self._digest.hexdigest()
+
+    @property
+    def first_kept(self) -> int:
+        """The index of the first message which is kept."""
+        return self._count - len(self._messages)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[deproxy_message.HttpMessage]:
+        return iter(self._messages)
+
+    def __reversed__(self) -> Iterator[deproxy_message.HttpMessage]:
+        return reversed(self._messages)
+
+    def __getitem__(self, index):
+        if isinstance(self._messages, list) and not self.first_kept:
+            return self._messages[index]
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count)) if i >= self.first_kept]
+        if index < 0:
+            index += self._count
+        if not self.first_kept <= index < self._count:
+            raise IndexError(
+                f"The message {index} is not kept by '{self.retention}' history, "
+                f"the kept messages are {self.first_kept}-{self._count - 1}."
+            )
+        return self._messages[index - self.first_kept]
+
+    def __repr__(self) -> str:
+        if self.retention == RETENTION_FULL:
+            return repr(self._messages)
+        return f"{self.__class__.__name__}({self.retention}, {self._count} messages)"
@@ -2,7 +2,6 @@ __author__ = "Tempesta Technologies, Inc."
 __copyright__ = "Copyright (C) 2018-2026 Tempesta Technologies, Inc."
 __license__ = "GPL2"
 
-import select
 import threading
 import time
 import traceback
@@ -65,31 +64,14 @@ class DeproxyManager(stateful.Stateful):
 
     def __stop(self):
         self._exit_event.set()
+        asyncore.poller.wakeup()
         self._proc.join()
 
     @staticmethod
-    def _poll() -> None:
-        pollster = select.poll()
-
-        if not asyncore.socket_map:
-            return None
-
-        for fd, obj in list(asyncore.socket_map.items()):
-            flags = 0
-            if obj.readable():
-                flags |= select.POLLIN | select.POLLPRI
-            # accepting sockets should not be writable
-            if obj.writable() and not obj._accepting:
-                flags |= select.POLLOUT
-            if flags:
-                pollster.register(fd, flags)
-
-        r = pollster.poll(0.0)
-        for fd, flags in r:
-            obj = asyncore.socket_map.get(fd)
-            if obj is None:
-                continue
-            obj._readwrite(flags)
+    def _poll(events: list[tuple[int, int]]) -> None:
+        """Handle events received from the poller and update interest masks of channels."""
+        asyncore.poller.dispatch(events)
+        asyncore.poller.update()
 
     @staticmethod
     def finish_all_deproxy():
@@ -100,24 +82,25 @@ class DeproxyManager(stateful.Stateful):
                 # we should ignore all exceptions during the closing socket
                 ...
         asyncore.socket_map.clear()
+        asyncore.poller.clear()
 
     def __run_deproxy_manager(
         self,
         exit_event: threading.Event,
         polling_lock: threading.Lock,
     ):
+        events = []
         try:
             while not exit_event.is_set():
-                polling_lock.acquire()
-                t1 = time.monotonic()
-                self._poll()
-                d_t = time.monotonic() - t1
-                if d_t > 1:
-                    self._logger.warning(f"freeze while polling - {d_t}")
-                polling_lock.release()
-                # some system has freeze without timeout when try to acquire the Lock in other threads
-                time.sleep(0.000001)
+                with polling_lock:
+                    t1 = time.monotonic()
+                    self._poll(events)
+                    d_t = time.monotonic() - t1
+                    if d_t > 1:
+                        self._logger.warning(f"freeze while polling - {d_t}")
+                # wait for events without the lock, so other threads may create
+                # new connections or add data to send in the meantime.
+                events = asyncore.poller.poll()
         except Exception as e:
-            polling_lock.release()
             self._logger.critical("Error while polling: %s", e, exc_info=True)
             self.append_exception(traceback.format_exc())
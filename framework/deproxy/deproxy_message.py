@@ -11,7 +11,7 @@ import re
 import time
 from http.server import BaseHTTPRequestHandler
 from io import StringIO
-from typing import List, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 from framework.helpers import error, tf_cfg
 from framework.services import tempesta
@@ -33,6 +33,41 @@ class IncompleteMessage(ParseError):
     pass
 
 
+class _HeaderList(list):
+    """A list of headers which is marked as changed by any mutation."""
+
+    __slots__ = ("changed",)
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.changed = False
+
+
+def _changing(method: Callable) -> Callable:
+    def mutate(self, *args, **kwargs):
+        self.changed = True
+        return method(self, *args, **kwargs)
+
+    return mutate
+
+
+for _name in (
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+    "append",
+    "extend",
+    "insert",
+    "pop",
+    "remove",
+    "clear",
+    "sort",
+    "reverse",
+):
+    setattr(_HeaderList, _name, _changing(getattr(list, _name)))
+
+
 class HeaderCollection(object):
     """
     A collection class for HTTP Headers. This class combines aspects of a list
@@ -40,6 +75,8 @@ class HeaderCollection(object):
     times with different values, and all of those values will be kept.
     """
 
+    __slots__ = ("_headers", "_index", "is_expected", "expected_time_delta")
+
     def __init__(self, mapping=None, **kwargs):
         self.headers = []
         self.is_expected = False
@@ -51,32 +88,60 @@ class HeaderCollection(object):
             for k, v in kwargs.items():
                 self.add(k, v)
 
+    @property
+    def headers(self) -> list:
+        return self._headers
+
+    @headers.setter
+    def headers(self, headers: list) -> None:
+        self._headers = _HeaderList(headers)
+        self._reindex()
+
+    def _reindex(self) -> None:
+        # lower case name -> positions of the headers in insertion order
+        self._index = {}
+        for pos, header in enumerate(self._headers):
+            self._index.setdefault(header[0].lower(), []).append(pos)
+        self._headers.changed = False
+
+    def _get_index(self) -> dict:
+        """
+        The index of headers. The list of headers is public, so the index is rebuilt
+        if the list was changed bypassing the collection.
+        """
+        if self._headers.changed:
+            self._reindex()
+        return self._index
+
+    def _positions(self, name: str) -> list:
+        """Positions of the headers with the lower case `name`."""
+        return self._get_index().get(name, [])
+
+    def _values(self, name: str) -> list:
+        return [self._headers[pos][1] for pos in self._positions(name)]
+
     def set_expected(self, expected_time_delta=0):
         self.is_expected = True
         self.expected_time_delta = expected_time_delta
 
     def __contains__(self, item):
-        item = item.lower()
-        for header in self.headers:
-            if header[0].lower() == item:
-                return True
-        return False
+        return bool(self._positions(item.lower()))
 
     def __len__(self):
         return self.headers.__len__()
 
     def __getitem__(self, key):
-        key = key.lower()
-        for header in self.headers:
-            if header[0].lower() == key:
-                return header[1]
+        positions = self._positions(key.lower())
+        if positions:
+            return self._headers[positions[0]][1]
 
     def __setitem__(self, key, value):
-        lower = key.lower()
-        for i, header in enumerate(self.headers):
-            if header[0].lower() == lower:
-                self.headers[i] = (header[0], value)
-                return
+        positions = self._positions(key.lower())
+        if positions:
+            name = self._headers[positions[0]][0]
+            # the name isn't changed, so the index is still valid
+            list.__setitem__(self._headers, positions[0], (name, value))
+            return
         self.add(key.lower(), value)
 
     def __delitem__(self, key):
@@ -86,22 +151,23 @@ class HeaderCollection(object):
         return self.iterkeys()
 
     def add(self, name, value):
-        self.headers.append(
+        self._get_index().setdefault(name.lower(), []).append(len(self._headers))
+        list.append(
+            self._headers,
             (
                 name,
                 value,
-            )
+            ),
         )
 
     def find_all(self, name):
-        name = name.lower()
-        for header in self.headers:
-            if header[0].lower() == name:
-                yield header[1]
+        for pos in self._positions(name.lower()):
+            yield self._headers[pos][1]
 
     def delete_all(self, name):
-        lower = name.lower()
-        self.headers = [header for header in self.headers if header[0].lower() != lower]
+        if self._positions(name.lower()):
+            lower = name.lower()
+            self.headers = [header for header in self._headers if header[0].lower() != lower]
 
     def iterkeys(self):
         for header in self.headers:
@@ -125,8 +191,9 @@ class HeaderCollection(object):
         return self.headers
 
     def get(self, key, default=None):
-        if key in self:
-            return self[key]
+        positions = self._positions(key.lower())
+        if positions:
+            return self._headers[positions[0]][1]
         return default
 
     @staticmethod
@@ -160,12 +227,6 @@ class HeaderCollection(object):
             headers.add(name, value)
         return headers
 
-    def _as_dict_lower(self):
-        ret = {}
-        for hed, val in self.items():
-            ret.setdefault(hed.lower(), []).append(val)
-        return ret
-
     _disable_report_wrong_is_expected = False
 
     def _report_wrong_is_expected(self, other):
@@ -176,34 +237,37 @@ class HeaderCollection(object):
             )
 
     def __eq__(self, other: "HeaderCollection"):
-        h_self = self._as_dict_lower()
-        h_other = other._as_dict_lower()
-
         if self.is_expected == other.is_expected:
             self._report_wrong_is_expected(other)
         else:
             if self.is_expected:
-                h_expected, h_received = h_self, h_other
+                h_expected, h_received = self, other
                 expected_time_delta = self.expected_time_delta
             else:
-                h_expected, h_received = h_other, h_self
+                h_expected, h_received = other, self
                 expected_time_delta = other.expected_time_delta
 
-            self.__check_date_header(h_expected, h_received, expected_time_delta)
+            # headers which are checked specially
+            checked = {"age", "connection", "warning", "expect"}
+            if self.__check_date_header(h_expected, h_received, expected_time_delta):
+                checked.add("date")
             self.__check_age_header(h_expected, h_received)
             self.__check_connection_header(h_expected, h_received)
             self.__check_warning_header(h_expected, h_received)
-            self.__check_other_headers(h_expected, h_received)
+            self.__check_other_headers(h_expected, h_received, checked)
             return True
 
     @staticmethod
-    def __check_date_header(h_expected: dict, h_received: dict, expected_time_delta: int) -> None:
+    def __check_date_header(
+        h_expected: "HeaderCollection", h_received: "HeaderCollection", expected_time_delta: int
+    ) -> bool:
         """
         Special-case "Date:" header if both headers have it and it looks OK (i. e. not duplicated)
         """
-        if len(h_expected.get("date", [])) == 1 and len(h_received.get("date", [])) == 1:
-            date_expected = h_expected.pop("date")[0]
-            date_received = h_received.pop("date")[0]
+        date_expected = h_expected._values("date")
+        date_received = h_received._values("date")
+        if len(date_expected) == 1 and len(date_received) == 1:
+            date_expected, date_received = date_expected[0], date_received[0]
             ts_expected = HttpMessage.parse_date_time_string(date_expected)
             ts_received = HttpMessage.parse_date_time_string(date_received)
 
@@ -215,16 +279,18 @@ class HeaderCollection(object):
                 f"\nReceived: {date_received}."
                 f"\nExpected: {date_expected}."
             )
+            return True
+        return False
 
     @staticmethod
-    def __check_age_header(h_expected: dict, h_received: dict) -> None:
+    def __check_age_header(h_expected: "HeaderCollection", h_received: "HeaderCollection") -> None:
         """
         Special-case "Age:". Expected message MAY not contain this header
             - compare values if 'age' header is present in expected message or;
             - check value in received message. Value MUST be integer and greater than 0.
         """
-        r_age = h_received.pop("age", [])
-        e_age = h_expected.pop("age", [])
+        r_age = h_received._values("age")
+        e_age = h_expected._values("age")
 
         if len(r_age) == 1 and len(e_age) == 1:
             assert int(r_age[0]) >= int(
@@ -237,14 +303,16 @@ class HeaderCollection(object):
             assert age >= 0, f"Header 'age' is invalid.\nReceived: {age}."
 
     @staticmethod
-    def __check_connection_header(h_expected: dict, h_received: dict) -> None:
+    def __check_connection_header(
+        h_expected: "HeaderCollection", h_received: "HeaderCollection"
+    ) -> None:
         """
         Special-case "Connection:" it is hop-by-hop header and Tempesta MAY remove it
             - compare values if 'connection' header is present in expected message or;
             - check value in received message. Value MUST be 'keep-alive' or 'close'.
         """
-        r_connections = h_received.pop("connection", [])
-        e_connections = h_expected.pop("connection", [])
+        r_connections = h_received._values("connection")
+        e_connections = h_expected._values("connection")
 
         if r_connections and e_connections:
             assert r_connections == e_connections, "Invalid 'Connection' header."
@@ -259,10 +327,12 @@ class HeaderCollection(object):
                 )
 
     @staticmethod
-    def __check_warning_header(h_expected: dict, h_received: dict) -> None:
+    def __check_warning_header(
+        h_expected: "HeaderCollection", h_received: "HeaderCollection"
+    ) -> None:
         """Special-case "Warning:". Tempesta MAY add it in some cases."""
-        r_warnings = h_received.pop("warning", [])
-        e_warnings = h_expected.pop("warning", [])
+        r_warnings = h_received._values("warning")
+        e_warnings = h_expected._values("warning")
 
         if r_warnings and e_warnings:
             assert (
@@ -281,17 +351,15 @@ class HeaderCollection(object):
                 ], f"Tempesta add a invalid 'Warning' header - {r_warning}"
 
     @staticmethod
-    def __is_header_expect(header: str) -> bool:
-        return header.lower() == "expect"
-
-    def __check_other_headers(self, h_expected: dict, h_received: dict) -> None:
-        headers = h_expected if len(h_expected) > len(h_received) else h_received
-        for header_name in headers.keys():
-            if self.__is_header_expect(header_name):
-                continue
-
-            received_header_value = h_received.get(header_name, None)
-            expected_header_value = h_expected.get(header_name, None)
+    def __check_other_headers(
+        h_expected: "HeaderCollection", h_received: "HeaderCollection", checked: set
+    ) -> None:
+        e_index, r_index = h_expected._get_index(), h_received._get_index()
+        e_names = [name for name in e_index if name not in checked]
+        r_names = [name for name in r_index if name not in checked]
+        for header_name in e_names if len(e_names) > len(r_names) else r_names:
+            received_header_value = h_received._values(header_name) or None
+            expected_header_value = h_expected._values(header_name) or None
             assert received_header_value == expected_header_value, (
                 f'Invalid header in headers or trailers.\nHeader name: "{header_name}"'
                 f"\nReceived: {received_header_value}\nExpected: {expected_header_value}"
@@ -320,6 +388,7 @@ class HttpMessage(object, metaclass=abc.ABCMeta):
         self.headers = HeaderCollection()
         self.trailer = HeaderCollection()
         self.body = ""
+        self._body_errors = "strict"
         self.keep_original_data = keep_original_data
         self.original_data = ""
         self.version = "HTTP/0.9"  # default version.
@@ -330,6 +399,36 @@ class HttpMessage(object, metaclass=abc.ABCMeta):
     def msg(self) -> str:
         return self.__str__()
 
+    @property
+    def body(self) -> str:
+        if self._body is None:
+            # the body is received as bytes and decoded on first access only
+            self._body = self._raw_body.decode(errors=self._body_errors)
+        return self._body
+
+    @body.setter
+    def body(self, body: str) -> None:
+        self._body = body
+        self._raw_body = None
+
+    @property
+    def raw_body(self) -> bytes:
+        """The body as it was received, it doesn't require decoding."""
+        if self._raw_body is None:
+            return self._body.encode(errors="surrogateescape")
+        return self._raw_body
+
+    def set_raw_body(self, body: Union[bytes, memoryview], errors: str = "strict") -> None:
+        """Set the body bytes, `errors` is used for `bytes.decode()` if `body` is accessed."""
+        self._raw_body = body if type(body) is bytes else bytes(body)
+        self._body = None
+        self._body_errors = errors
+
+    def encode(self) -> bytes:
+        """Same as `msg.encode()`, but the body is copied without decoding."""
+        head = "".join([self.get_firstline(), "\r\n", str(self.headers), "\r\n"])
+        return b"".join([head.encode(), self.raw_body, str(self.trailer).encode()])
+
     def parse_text(self, message_text, body_parsing=True):
         self.body_parsing = body_parsing
         stream = StringIO(message_text)
@@ -802,6 +901,8 @@ class H2Response(Response):
     def __init__(self, *args, **kwargs):
         Response.__init__(self, *args, **kwargs)
         self.version = "HTTP/2"
+        # the consumer of the received body, see `deproxy_body_sink`
+        self.body_sink = None
         self._via_header = f"2.0 tempesta_fw (Tempesta FW {tempesta.version()})"
         self._server_header = f"Tempesta FW/{tempesta.version()}"
 
@@ -858,3 +959,287 @@ class H2Response(Response):
 
 
 MAX_MESSAGE_SIZE = 65536
+
+
+# -------------------------------------------------------------------------------
+# Incremental parsing
+# -------------------------------------------------------------------------------
+
+
+class HttpStreamParser(object):
+    """
+    Push-style HTTP/1 parser for a byte stream of pipelined messages.
+
+    Received data is passed by `feed()` (or `append()` and `messages()`) and only new bytes
+    are scanned on each call: the parser keeps the state of the first line, headers, chunked
+    body and trailer between calls. Complete messages are built as the same `Request` or
+    `Response` objects as `HttpMessage.parse_text()` does and the same `ParseError` is raised
+    for invalid data. The differences are that Content-Length and `original_length` are
+    counted in bytes and the body is kept as bytes until it is accessed.
+
+    If `framing_only` is set, only message boundaries are found: headers which define
+    the body length are extracted from raw bytes and the length of each message in bytes
+    is yielded instead of a message object.
+    """
+
+    # headers which are required to find the end of a message in `framing_only` mode
+    _FRAMING_HEADERS = re.compile(
+        rb"^(content-length|transfer-encoding|expect)[ \t]*:[ \t]*(.*?)[ \t]*\r?$",
+        re.IGNORECASE | re.MULTILINE,
+    )
+
+    # parsing states
+    _FIRSTLINE = 0
+    _HEADERS = 1
+    _SIZED_BODY = 2
+    _CHUNK_SIZE = 3
+    _CHUNK_DATA = 4
+    _LAST_CRLF = 5
+    _TRAILER = 6
+
+    def __init__(
+        self,
+        message_cls: type = Response,
+        method: Callable[[int], str] = None,
+        body_parsing: bool = True,
+        keep_original_data: bool = None,
+        errors: str = "surrogateescape",
+        framing_only: bool = False,
+    ):
+        """
+        `method` returns the request method by the number of the message, it's required
+        by responses to find out whether a body is expected. `errors` is passed to
+        `bytes.decode()`.
+        """
+        self.message_cls = message_cls
+        self.method = method
+        self.body_parsing = body_parsing
+        self.keep_original_data = keep_original_data
+        self.errors = errors
+        self.framing_only = framing_only
+        self.nr_messages = 0  # the number of parsed messages
+        self._buf = bytearray()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._state = self._FIRSTLINE
+        self._pos = 0  # the first byte which is not parsed yet
+        self._scan_pos = 0  # the first byte which is not scanned for the end of line yet
+        self._head_start = 0  # the first line, optional empty lines before it are skipped
+        self._body_start = 0
+        self._body_end = 0
+        self._chunk_size = 0
+        self._msg: Optional[HttpMessage] = None
+        # the status code and framing headers in `framing_only` mode
+        self._status: Optional[str] = None
+        self._framing_headers: Dict[str, str] = {}
+
+    @property
+    def buffer(self) -> bytearray:
+        """Received data which is not parsed to messages yet."""
+        return self._buf
+
+    def append(self, data: bytes) -> None:
+        self._buf += data
+
+    def feed(self, data: bytes) -> List[Union[HttpMessage, int]]:
+        self.append(data)
+        return list(self.messages())
+
+    def messages(self) -> Iterator[Union[HttpMessage, int]]:
+        """Yield messages completed by the appended data one by one."""
+        while self._buf:
+            msg = self._parse()
+            if msg is None:
+                return
+            yield msg
+
+    def _decode(self, start: int, end: int) -> str:
+        return self._buf[start:end].decode(errors=self.errors)
+
+    def _readline(self) -> Optional[int]:
+        """
+        Return the start of the next complete line or None, the line ends at `self._pos`.
+        Only new data is scanned if the line is incomplete yet.
+        """
+        eol = self._buf.find(b"\n", self._scan_pos)
+        if eol < 0:
+            self._scan_pos = len(self._buf)
+            return None
+        line_start, self._pos = self._pos, eol + 1
+        self._scan_pos = self._pos
+        return line_start
+
+    def _parse(self) -> Optional[Union[HttpMessage, int]]:
+        while True:
+            if self._state == self._FIRSTLINE:
+                line_start = self._readline()
+                if line_start is None:
+                    return None
+                line = self._buf[line_start : self._pos]
+                if line in (b"\r\n", b"\n") and issubclass(self.message_cls, Request):
+                    # optional empty lines before a request line
+                    continue
+                self._head_start = line_start
+                if self.framing_only:
+                    if issubclass(self.message_cls, Response):
+                        words = line.split(None, 2)
+                        if len(words) < 2:
+                            raise ParseError("Invalid status line!")
+                        self._status = words[1].decode()
+                    self._state = self._HEADERS
+                    continue
+                method = self.method(self.nr_messages) if self.method else "GET"
+                msg = self.message_cls(method=method, keep_original_data=self.keep_original_data)
+                msg.body_parsing = self.body_parsing
+                msg.parse_firstline(StringIO(self._decode(line_start, self._pos)))
+                # the state is changed only for a valid first line
+                self._msg = msg
+                self._state = self._HEADERS
+
+            elif self._state == self._HEADERS:
+                line_start = self._readline()
+                if line_start is None:
+                    return None
+                if self._buf[line_start : self._pos] not in (b"\r\n", b"\n"):
+                    continue
+                if self.framing_only:
+                    self._framing_headers = {}
+                    head = self._buf[self._head_start : self._pos]
+                    for name, value in self._FRAMING_HEADERS.findall(head):
+                        self._framing_headers.setdefault(name.decode().lower(), value.decode())
+                else:
+                    head = StringIO(self._decode(self._head_start, self._pos))
+                    head.readline()  # the first line is already parsed
+                    self._msg.parse_headers(head)
+                self._body_start = self._pos
+                if not self._start_body():
+                    return self._complete(self._body_start, self._body_start)
+
+            elif self._state == self._SIZED_BODY:
+                if len(self._buf) < self._body_end:
+                    return None
+                return self._complete(self._body_end, self._body_end)
+
+            elif self._state == self._CHUNK_SIZE:
+                line_start = self._readline()
+                if line_start is None:
+                    return None
+                try:
+                    line = self._buf[line_start : self._pos].decode()
+                    size = int(line.rstrip("\r\n").split(";")[0], 16)
+                    assert size >= 0
+                except Exception:
+                    raise ParseError("Error in chunked body")
+                if size == 0:
+                    self._state = self._LAST_CRLF
+                else:
+                    self._chunk_size = size
+                    self._state = self._CHUNK_DATA
+
+            elif self._state == self._CHUNK_DATA:
+                end = self._pos + self._chunk_size
+                if self._buf[end : end + 1] == b"\n":
+                    self._pos = end + 1
+                elif self._buf[end : end + 2] == b"\r\n":
+                    self._pos = end + 2
+                elif len(self._buf) < end + 2:
+                    return None
+                else:
+                    raise ParseError("Error in chunked body")
+                self._scan_pos = self._pos
+                self._state = self._CHUNK_SIZE
+
+            elif self._state == self._LAST_CRLF:
+                if self._buf[self._pos : self._pos + 1] == b"\n":
+                    return self._complete(self._pos + 1, self._pos + 1)
+                if self._buf[self._pos : self._pos + 2] == b"\r\n":
+                    return self._complete(self._pos + 2, self._pos + 2)
+                if len(self._buf) < self._pos + 2:
+                    return None
+                self._body_end = self._pos
+                self._state = self._TRAILER
+
+            elif self._state == self._TRAILER:
+                line_start = self._readline()
+                if line_start is None:
+                    return None
+                if self._buf[line_start : self._pos] in (b"\r\n", b"\n"):
+                    return self._complete(self._body_end, self._pos)
+
+    def _start_body(self) -> bool:
+        """Choose the body framing, RFC 7230 3.3.3. Return False for a message without body."""
+        if not self.body_parsing:
+            self._state = self._SIZED_BODY
+            self._body_end = len(self._buf)
+            return True
+
+        is_response = issubclass(self.message_cls, Response)
+        if self.framing_only:
+            headers, status = self._framing_headers, self._status
+        else:
+            headers, status = self._msg.headers, getattr(self._msg, "status", None)
+        if is_response:
+            method = self.method(self.nr_messages) if self.method else "GET"
+            if method == "HEAD":
+                return False
+            code = int(status)
+            if code >= 100 and code <= 199 or code == 204 or code == 304:
+                return False
+            if method == "CONNECT" and code >= 200 and code <= 299:
+                error.bug("Not implemented!")
+                return False
+
+        if "transfer-encoding" in headers:
+            option = headers["transfer-encoding"].split(",")[-1]
+            if option.strip().lower() == "chunked":
+                self._state = self._CHUNK_SIZE
+                return True
+            if not is_response:
+                raise ParseError("Unlimited body not allowed for requests")
+            # the rest of the received data, as `read_rest_body()` does
+            self._state = self._SIZED_BODY
+            self._body_end = len(self._buf)
+            return True
+
+        if "content-length" in headers:
+            try:
+                size = int(headers["content-length"])
+                assert size >= 0
+            except (ValueError, AssertionError):
+                raise ParseError("Invalid Content-Length header")
+            self._body_end = self._body_start + size
+            if len(self._buf) < self._body_end and headers.get("expect") == "100-continue":
+                self._body_end = len(self._buf)
+            self._state = self._SIZED_BODY
+            return True
+
+        if is_response:
+            self._state = self._SIZED_BODY
+            self._body_end = len(self._buf)
+            return True
+
+        return False
+
+    def _complete(self, body_end: int, msg_end: int) -> Union[HttpMessage, int]:
+        if self.framing_only:
+            del self._buf[:msg_end]
+            self._reset()
+            self.nr_messages += 1
+            return msg_end
+
+        msg = self._msg
+        with memoryview(self._buf) as view:
+            # the body is copied once from the buffer
+            msg.set_raw_body(view[self._body_start : body_end], self.errors)
+        if body_end < msg_end:
+            msg.parse_trailer(StringIO(self._decode(body_end, msg_end)))
+        # the message is always at the beginning of the buffer
+        msg.original_length = msg_end
+        if msg.keep_original_data:
+            msg.original_data = self._decode(0, msg_end)
+
+        del self._buf[:msg_end]
+        self._reset()
+        self.nr_messages += 1
+        return msg
@@ -0,0 +1,180 @@
+"""A pool of deproxy client connections which is driven as one client."""
+
+import asyncio
+import itertools
+import typing
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional
+
+from framework.deproxy import deproxy_history, deproxy_message
+from framework.deproxy.deproxy_client import BaseDeproxyClient
+from framework.helpers import util
+from framework.helpers.histogram import RequestLatency
+from framework.services import stateful
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+BALANCE_ROUND_ROBIN = "round_robin"
+BALANCE_BY_KEY = "by_key"
+
+
+class DeproxyClientPool(stateful.Stateful):
+    """
+    Several deproxy client connections started, stopped and used as one client.
+
+    Requests are spread over the connections round-robin or by a key: all requests with
+    the same key are sent through the same connection. Responses are not aggregated in
+    lists, the pool only counts them by status, so the pool doesn't depend on the number
+    of connections. Connections keep only the last response by default, see `retention`.
+    Use `clients` to get a single connection.
+    """
+
+    def __init__(
+        self,
+        *,
+        id_: str,
+        clients: List[BaseDeproxyClient],
+        balance: str,
+        retention: str = deproxy_history.RETENTION_DIGEST,
+        retention_size: int = 1000,
+    ):
+        if balance not in (BALANCE_ROUND_ROBIN, BALANCE_BY_KEY):
+            raise ValueError(f"Unknown balance method for the client pool: {balance}")
+        self.clients = clients
+        self.balance = balance
+        super().__init__(id_=id_)
+        # notified by all connections of the pool
+        self.notifier = util.Notifier(parent=util.deproxy_notifier)
+        for client in self.clients:
+            client.on_response = self._count_response
+            client.notifier.parent = self.notifier
+        self.set_retention(retention, retention_size)
+
+    def set_retention(self, retention: str, size: int = 1000) -> None:
+        """Set the retention of responses for each connection, see `deproxy_history`."""
+        for client in self.clients:
+            client.set_retention(retention, size)
+
+    def clear_stats(self) -> None:
+        self._statuses: typing.Counter[int] = Counter()
+        self._nrresp = 0
+        self._next_client = itertools.cycle(self.clients)
+
+    async def run_start(self):
+        self.clear_stats()
+        await asyncio.gather(*[client.start() for client in self.clients])
+
+    async def __stop(self) -> None:
+        await asyncio.gather(*[client.stop() for client in self.clients])
+
+    def _stop_procedures(self) -> list[typing.Callable]:
+        return [self.__stop]
+
+    @property
+    def exceptions(self) -> typing.List[str]:
+        return self._exceptions + [e for client in self.clients for e in client.exceptions]
+
+    def _count_response(self, response: deproxy_message.Response) -> None:
+        # called from the polling thread, `Counter` updates are atomic enough under the GIL
+        self._statuses[int(response.status)] += 1
+        self._nrresp += 1
+
+    @property
+    def conns_n(self) -> int:
+        return len(self.clients)
+
+    @property
+    def active_conns_n(self) -> int:
+        return sum(1 for client in self.clients if client.conn_is_active)
+
+    @property
+    def statuses(self) -> Dict[int, int]:
+        """The number of responses by status for all connections."""
+        return dict(self._statuses)
+
+    @property
+    def nrresp(self) -> int:
+        """The number of responses received by all connections."""
+        return self._nrresp
+
+    @property
+    def error_codes(self) -> typing.Counter:
+        """Error codes of all connections and the number of connections with them."""
+        return Counter(code for client in self.clients for code in set(client.error_codes))
+
+    @property
+    def latency(self) -> RequestLatency:
+        """Latencies of requests of all connections."""
+        latency = RequestLatency()
+        for client in self.clients:
+            latency.merge(client.latency)
+        return latency
+
+    def get_client(self, key: Optional[typing.Hashable] = None) -> BaseDeproxyClient:
+        """The next client for round-robin balancing or the client for `key`."""
+        if self.balance == BALANCE_BY_KEY:
+            if key is None:
+                raise ValueError("The client pool requires a key for each request.")
+            # `hash()` isn't stable between runs for strings
+            return self.clients[zlib.crc32(str(key).encode()) % len(self.clients)]
+        return next(self._next_client)
+
+    def create_request(self, *args, **kwargs) -> deproxy_message.Request:
+        return self.clients[0].create_request(*args, **kwargs)
+
+    def set_rps(self, rps: int) -> None:
+        """Set request rate for each connection."""
+        for client in self.clients:
+            client.set_rps(rps)
+
+    def make_request(self, request, key: Optional[typing.Hashable] = None, **kwargs) -> None:
+        self.get_client(key).make_request(request, **kwargs)
+
+    def make_requests(self, requests: list, keys: Optional[list] = None) -> None:
+        keys = keys or [None] * len(requests)
+        for request, key in zip(requests, keys):
+            self.make_request(request, key)
+
+    async def wait_for_connection_open(self, timeout: float = 5, msg: Optional[str] = None):
+        timeout_not_exceeded = await util.wait_until(
+            lambda: self.active_conns_n < len(self.clients), timeout, notifier=self.notifier
+        )
+        assert timeout_not_exceeded, msg or (
+            f"Only {self.active_conns_n} of {len(self.clients)} connections are opened "
+            f"in {timeout} seconds."
+        )
+
+    async def wait_for_connection_close(self, timeout: float = 5, msg: Optional[str] = None):
+        timeout_not_exceeded = await util.wait_until(
+            lambda: self.active_conns_n > 0, timeout, notifier=self.notifier
+        )
+        assert timeout_not_exceeded, msg or (
+            f"{self.active_conns_n} of {len(self.clients)} connections are not closed "
+            f"in {timeout} seconds."
+        )
+
+    async def wait_for_response(
+        self, timeout: float = 5, n: Optional[int] = None, msg: Optional[str] = None
+    ) -> None:
+        """
+        Wait for `n` responses for all connections or for responses to all requests.
+        Closed connections don't wait for responses.
+        """
+
+        def waiting() -> bool:
+            if n is not None:
+                return self._nrresp < n
+            return any(
+                len(client.responses) < client._valid_req_num
+                for client in self.clients
+                if client.conn_is_active
+            )
+
+        timeout_not_exceeded = await util.wait_until(waiting, timeout, notifier=self.notifier)
+        assert timeout_not_exceeded, msg or (
+            f"Timeout exceeded while waiting responses: {timeout}. "
+            f"{self._nrresp} responses are received."
+        )
@@ -0,0 +1,307 @@
+"""
+Recording of deproxy traffic and replaying of recorded client connections.
+
+The recorder appends all bytes sent and received by deproxy clients and servers
+to a memory-mapped file, so recording is cheap enough for stress tests. Each record
+has a monotonic time from the start of the recording, a connection id and a type.
+Recording is enabled for all deproxy clients and servers by `start()` or
+by the `--record-traffic` option of the test runner.
+
+The replayer sends the recorded client side of connections to the same
+(or another) address, it doesn't need deproxy servers, test classes or Tempesta
+configuration, so a stress failure can be reproduced quickly and many times.
+"""
+
+import asyncio
+import json
+import mmap
+import ssl
+import struct
+import threading
+import time
+from typing import Iterator, List, NamedTuple, Optional
+
+from framework.helpers import tf_cfg
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+# record types, data of OPEN records is a JSON object with the connection parameters
+CLIENT_OPEN = 0
+CLIENT_SEND = 1
+CLIENT_RECV = 2
+CLIENT_CLOSE = 3
+SERVER_OPEN = 4
+SERVER_RECV = 5
+SERVER_SEND = 6
+SERVER_CLOSE = 7
+
+_MAGIC = b"DPXREC01"
+# time, connection id, type, length of data
+_RECORD = struct.Struct("<dIBI")
+
+
+class Record(NamedTuple):
+    time: float
+    connection: int
+    type: int
+    data: bytes
+
+
+class TrafficRecorder:
+    """
+    An append-only recording in a memory-mapped file. The file grows twice when it's full
+    and it's truncated to the recorded data on `close()`, but a recording which wasn't
+    closed may also be read. Records may be written from the deproxy manager thread
+    and the test event loop.
+    """
+
+    def __init__(self, path: str, capacity: int = 1 << 20):
+        self.path = path
+        self._file = open(path, "w+b")
+        self._file.truncate(max(capacity, len(_MAGIC) + _RECORD.size))
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._map[: len(_MAGIC)] = _MAGIC
+        self._offset = len(_MAGIC)
+        self._lock = threading.Lock()
+        self._connections = 0
+        self.start_time = time.monotonic()
+
+    def open_connection(self, type_: int, info: dict) -> int:
+        """Record a new connection and return its id."""
+        with self._lock:
+            self._connections += 1
+            connection = self._connections
+        self.record(connection, type_, json.dumps(info).encode())
+        return connection
+
+    def record(self, connection: int, type_: int, data: bytes = b"") -> None:
+        with self._lock:
+            if self._map is None:
+                return
+            end = self._offset + _RECORD.size + len(data)
+            if end > len(self._map):
+                self._map.resize(max(2 * len(self._map), end))
+            timestamp = time.monotonic() - self.start_time
+            _RECORD.pack_into(self._map, self._offset, timestamp, connection, type_, len(data))
+            self._map[self._offset + _RECORD.size : end] = data
+            self._offset = end
+
+    @property
+    def size(self) -> int:
+        return self._offset
+
+    def close(self) -> None:
+        with self._lock:
+            if self._map is None:
+                return
+            self._map.flush()
+            self._map.close()
+            self._map = None
+            self._file.truncate(self._offset)
+            self._file.close()
+
+
+# the recorder used by all deproxy clients and servers
+active: Optional[TrafficRecorder] = None
+
+
+def start(path: str) -> TrafficRecorder:
+    global active
+    stop()
+    active = TrafficRecorder(path)
+    tf_cfg.test_logger.info(f"Record deproxy traffic to {path}")
+    return active
+
+
+def stop() -> None:
+    global active
+    if active is not None:
+        active.close()
+        active = None
+
+
+def connection_id(obj, type_: int, info: Optional[dict] = None) -> Optional[int]:
+    """
+    The id of the connection of a deproxy client or server connection in the active
+    recording. A new id is created for OPEN records and for connections which were
+    opened before the recording started.
+    """
+    recorder = active
+    if recorder is None:
+        return None
+    recording = getattr(obj, "_recording", None)
+    if type_ in (CLIENT_OPEN, SERVER_OPEN) or recording is None or recording[0] is not recorder:
+        open_type = SERVER_OPEN if type_ >= SERVER_OPEN else CLIENT_OPEN
+        recording = (recorder, recorder.open_connection(open_type, info or {}))
+        obj._recording = recording
+    return recording[1]
+
+
+def record(obj, type_: int, data=b"", info: Optional[dict] = None) -> None:
+    """Record data or an event of a deproxy connection if the recording is active."""
+    recorder = active
+    if recorder is None:
+        return
+    connection = connection_id(obj, type_, info)
+    if type_ not in (CLIENT_OPEN, SERVER_OPEN):
+        recorder.record(connection, type_, bytes(data))
+
+
+def read(path: str) -> Iterator[Record]:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data[: len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"{path} is not a deproxy traffic recording.")
+        offset = len(_MAGIC)
+        while offset + _RECORD.size <= len(data):
+            timestamp, connection, type_, length = _RECORD.unpack_from(data, offset)
+            if connection == 0:
+                # connection ids start from 1, the rest of the file is zeros preallocated
+                # by a recorder which wasn't closed, e.g. a test process was killed
+                break
+            offset += _RECORD.size
+            yield Record(timestamp, connection, type_, data[offset : offset + length])
+            offset += length
+
+
+class ReplayedConnection(NamedTuple):
+    connection: int
+    sent: int
+    received: int
+    # the number of bytes received by the connection in the recording
+    recorded_received: int
+    error: Optional[str]
+
+
+class _ReplayState:
+    """Responses received by a replayed connection."""
+
+    def __init__(self):
+        self.received = 0
+        self.eof = False
+        self.changed = asyncio.Event()
+
+    async def read(self, reader: asyncio.StreamReader) -> None:
+        while data := await reader.read(1 << 16):
+            self.received += len(data)
+            self.changed.set()
+        self.eof = True
+        self.changed.set()
+
+    async def wait_received(self, expected: int, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        while self.received < expected and not self.eof:
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                return
+
+
+class TrafficReplayer:
+    """
+    Send the client side of recorded connections again.
+
+    Data is sent with the recorded intervals divided by `speed`, `speed=0` sends data
+    as fast as possible. If `causal` is set, each chunk is sent only after the connection
+    received as many bytes as it had received before the chunk in the recording, or after
+    `wait_timeout` seconds if a response is shorter than the recorded one. So requests
+    and responses of each connection follow each other in the recorded order at any speed.
+    Connections are sent to `addr` and `port` if they are set instead of recorded ones.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        speed: float = 1.0,
+        causal: bool = True,
+        addr: Optional[str] = None,
+        port: Optional[int] = None,
+        wait_timeout: float = 1.0,
+    ):
+        if speed < 0:
+            raise ValueError("The replay speed must not be negative.")
+        self.speed = speed
+        self.causal = causal
+        self.addr = addr
+        self.port = port
+        self.wait_timeout = wait_timeout
+        self._connections: dict[int, List[Record]] = {}
+        for rec in read(path):
+            if CLIENT_OPEN <= rec.type <= CLIENT_CLOSE:
+                self._connections.setdefault(rec.connection, []).append(rec)
+
+    @property
+    def connections(self) -> List[int]:
+        return list(self._connections)
+
+    async def run(self) -> List[ReplayedConnection]:
+        start = time.monotonic()
+        return await asyncio.gather(
+            *(
+                self._replay(connection, records, start)
+                for connection, records in self._connections.items()
+            )
+        )
+
+    async def _sleep_until(self, start: float, recorded_time: float) -> None:
+        if self.speed:
+            delay = start + recorded_time / self.speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def _replay(
+        self, connection: int, records: List[Record], start: float
+    ) -> ReplayedConnection:
+        info = json.loads(records[0].data) if records[0].type == CLIENT_OPEN else {}
+        state = _ReplayState()
+        recorded_received = 0
+        sent = 0
+        reader_task = None
+        writer = None
+        try:
+            await self._sleep_until(start, records[0].time)
+            reader, writer = await asyncio.open_connection(
+                self.addr or info.get("addr"),
+                self.port or info.get("port"),
+                ssl=self._ssl_context(info) if info.get("ssl") else None,
+                server_hostname=info.get("server_hostname") if info.get("ssl") else None,
+            )
+            reader_task = asyncio.create_task(state.read(reader))
+
+            for rec in records:
+                if rec.type == CLIENT_RECV:
+                    recorded_received += len(rec.data)
+                    continue
+                if rec.type not in (CLIENT_SEND, CLIENT_CLOSE):
+                    continue
+                await self._sleep_until(start, rec.time)
+                if self.causal:
+                    await state.wait_received(recorded_received, self.wait_timeout)
+                if rec.type == CLIENT_CLOSE:
+                    break
+                writer.write(rec.data)
+                await writer.drain()
+                sent += len(rec.data)
+            else:
+                # the connection wasn't closed in the recording, wait for the last responses
+                await state.wait_received(recorded_received, self.wait_timeout)
+            error = None
+        except (OSError, ssl.SSLError) as e:
+            error = repr(e)
+        finally:
+            if writer is not None:
+                writer.close()
+            if reader_task is not None:
+                reader_task.cancel()
+        return ReplayedConnection(connection, sent, state.received, recorded_received, error)
+
+    @staticmethod
+    def _ssl_context(info: dict) -> ssl.SSLContext:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        context.set_alpn_protocols(["h2"] if info.get("h2") else ["http/1.1"])
+        return context
@@ -0,0 +1,127 @@
+"""
+Routing of requests to responses for deproxy servers.
+
+A route matches requests by URI, method and headers and has its own response,
+so one lightweight backend can serve a lot of different resources. Exact URIs are
+found by a dict lookup, URI patterns are precompiled regular expressions which are
+checked in the order of addition after exact URIs.
+"""
+
+import re
+from typing import Dict, List, Optional, Pattern, Union
+
+from framework.deproxy import deproxy_message
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+
+class Route:
+    """
+    `headers` is a dict of header values or compiled regular expressions which requests
+    must have. The response is serialized once, if it's not set a response with `status`
+    and an empty body is sent. The response is sent after `delay` seconds and
+    the connection is closed after it if `close` is set.
+    """
+
+    def __init__(
+        self,
+        uri: str,
+        response: Union[str, bytes, deproxy_message.Response, None] = None,
+        *,
+        status: str = "200",
+        method: Optional[str] = None,
+        regex: bool = False,
+        headers: Optional[Dict[str, Union[str, Pattern]]] = None,
+        delay: float = 0.0,
+        close: bool = False,
+        name: Optional[str] = None,
+    ):
+        self.uri = uri
+        self.method = method
+        self.pattern: Optional[Pattern] = re.compile(uri) if regex else None
+        self.headers = headers or {}
+        self.delay = delay
+        self.close = close
+        self.name = name or f"{method or '*'} {uri}"
+        if response is None:
+            response = deproxy_message.Response.create_simple_response(
+                status, [("Content-Length", "0")]
+            )
+        if isinstance(response, str):
+            response = response.encode()
+        elif isinstance(response, deproxy_message.Response):
+            response = response.encode()
+        # bytes or a response object with the `encode()` method, e.g. `FileResponse`
+        self.response = response
+        self.hits = 0
+
+    def match(self, request: deproxy_message.Request) -> bool:
+        """Check all conditions except the exact URI, which is checked by the table."""
+        if self.method is not None and request.method != self.method:
+            return False
+        if self.pattern is not None and not self.pattern.fullmatch(request.uri):
+            return False
+        for name, value in self.headers.items():
+            actual = request.headers.get(name)
+            if actual is None:
+                return False
+            if isinstance(value, str):
+                if actual != value:
+                    return False
+            elif not value.search(actual):
+                return False
+        return True
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.name}, hits={self.hits})"
+
+
+class RouteTable:
+    def __init__(self):
+        self._exact: Dict[str, List[Route]] = {}
+        self._patterns: List[Route] = []
+
+    def add(self, uri: str, response=None, **kwargs) -> Route:
+        """Add a new route, see `Route` for arguments."""
+        route = Route(uri, response, **kwargs)
+        if route.pattern is None:
+            self._exact.setdefault(uri, []).append(route)
+        else:
+            self._patterns.append(route)
+        return route
+
+    def find(self, request: deproxy_message.Request) -> Optional[Route]:
+        """The first matched route, None if there is no route for the request."""
+        for route in self._exact.get(request.uri, ()):
+            if route.match(request):
+                return route
+        for route in self._patterns:
+            if route.match(request):
+                return route
+        return None
+
+    def clear(self) -> None:
+        self._exact.clear()
+        self._patterns.clear()
+
+    def clear_hits(self) -> None:
+        for route in self:
+            route.hits = 0
+
+    @property
+    def hits(self) -> Dict[str, int]:
+        """The number of requests matched by each route by its name."""
+        return {route.name: route.hits for route in self}
+
+    def __iter__(self):
+        for routes in self._exact.values():
+            yield from routes
+        yield from self._patterns
+
+    def __len__(self) -> int:
+        return sum(len(routes) for routes in self._exact.values()) + len(self._patterns)
+
+    def __bool__(self) -> bool:
+        return bool(self._exact or self._patterns)
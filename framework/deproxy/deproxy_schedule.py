@@ -0,0 +1,74 @@
+"""
+Open-loop arrival schedules for deproxy clients.
+
+A schedule defines when each request must be sent relative to the start of
+the connection. Requests are sent at their time regardless of responses,
+so a slow server doesn't slow down the load.
+"""
+
+import abc
+import random
+from typing import List, Optional
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+
+class ArrivalSchedule(abc.ABC):
+    @abc.abstractmethod
+    def send_time(self, n: int) -> float:
+        """Time in seconds from the start when the request number `n` must be sent."""
+
+
+class ConstantArrivals(ArrivalSchedule):
+    """Requests are sent with the same interval: `rps` requests per second."""
+
+    def __init__(self, rps: float):
+        if rps <= 0:
+            raise ValueError("RPS must be positive.")
+        self.rps = rps
+
+    def send_time(self, n: int) -> float:
+        return n / self.rps
+
+
+class PoissonArrivals(ArrivalSchedule):
+    """
+    Requests arrive as a Poisson process with `rps` requests per second on average,
+    i.e. intervals between requests are exponentially distributed. Use `seed` to
+    get the same arrivals in each run.
+    """
+
+    def __init__(self, rps: float, seed: Optional[int] = None):
+        if rps <= 0:
+            raise ValueError("RPS must be positive.")
+        self.rps = rps
+        self._random = random.Random(seed)
+        # the first request is sent at the start
+        self._times: List[float] = [0.0]
+
+    def send_time(self, n: int) -> float:
+        while len(self._times) <= n:
+            self._times.append(self._times[-1] + self._random.expovariate(self.rps))
+        return self._times[n]
+
+
+class BurstArrivals(ArrivalSchedule):
+    """
+    Requests are sent by bursts of `burst_size` requests each `interval` seconds.
+    Requests of a burst are sent at once or with `burst_rps` requests per second.
+    """
+
+    def __init__(self, burst_size: int, interval: float, burst_rps: float = 0):
+        if burst_size <= 0 or interval <= 0:
+            raise ValueError("Burst size and interval must be positive.")
+        if burst_rps and burst_size / burst_rps > interval:
+            raise ValueError("A burst must be shorter than the interval between bursts.")
+        self.burst_size = burst_size
+        self.interval = interval
+        self.burst_rps = burst_rps
+
+    def send_time(self, n: int) -> float:
+        burst, i = divmod(n, self.burst_size)
+        return burst * self.interval + (i / self.burst_rps if self.burst_rps else 0.0)
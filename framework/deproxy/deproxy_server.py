@@ -4,17 +4,53 @@ __license__ = "GPL2"
 
 import asyncio
 import logging
+import multiprocessing
+import os
 import socket
 import typing
 from typing import Awaitable, Callable, Optional
 
 import run_config
-from framework.deproxy import deproxy_message
+from framework.deproxy import (
+    deproxy_history,
+    deproxy_message,
+    deproxy_recorder,
+    deproxy_routes,
+)
 from framework.helpers import tf_cfg, util
 from framework.helpers.util import fill_template
 from framework.services import base_server, stateful
 
 
+class FileResponse:
+    """
+    A static response which body is sent from a file by `loop.sendfile()`, so big bodies
+    are not copied to the test process. Headers are a list of (name, value) tuples,
+    Content-Length is added by the file size.
+
+    The file is read only if the whole response is required, e.g. by the deproxy auto
+    parser or TCP segmentation, and it's read once for the response object.
+    """
+
+    def __init__(self, path: str, status: str = "200", headers: list = ()):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.head: bytes = deproxy_message.Response.create_simple_response(
+            status, list(headers) + [("Content-Length", str(self.size))]
+        ).encode()
+        self._data: Optional[bytes] = None
+
+    def read_body(self) -> memoryview:
+        return memoryview(self.encode())[len(self.head) :]
+
+    def encode(self) -> bytes:
+        """The same bytes object is returned for each call."""
+        if self._data is None:
+            with open(self.path, "rb") as f:
+                self._data = self.head + f.read()
+        return self._data
+
+
 class ServerConnection:
 
     def __init__(
@@ -40,8 +76,8 @@ class ServerConnection:
         self._write_task: asyncio.Task = asyncio.create_task(self._write_loop())
         self._readwrite = asyncio.Event()
         self._readwrite.set()
-        self._queue: asyncio.Queue[tuple[bytes, int] | None] = asyncio.Queue()
-        self._write_func: Callable[[bytes], Awaitable[None]] = None
+        self._queue: asyncio.Queue[tuple[list, int, float, bool] | None] = asyncio.Queue()
+        self._write_func: Callable[[list], Awaitable[None]] = None
 
         self._responses_done: int = 0
         self.update_segment_size()
@@ -49,6 +85,15 @@ class ServerConnection:
         self.nrreq = 0
         self._cur_pipelined = 0
         self._cur_responses_list = []
+        self._cur_delay = 0.0
+        self._cur_close = False
+
+        if deproxy_recorder.active is not None:
+            deproxy_recorder.record(
+                self,
+                deproxy_recorder.SERVER_OPEN,
+                info={"id": self._server.id, "addr": self.addr[0], "port": self.addr[1]},
+            )
 
         if self._server.send_after_conn_established:
             self._add_response_to_sending_buffer(self._server.response)
@@ -56,13 +101,33 @@ class ServerConnection:
 
         self._tcp_logger.debug("New server connection")
 
-    def _add_response_to_sending_buffer(self, response: bytes) -> None:
+    def _record_sent(self, buffers: list) -> None:
+        """Record sent responses, file responses are read only for the recording."""
+        if deproxy_recorder.active is not None:
+            data = b"".join(
+                buf.read_body() if isinstance(buf, FileResponse) else buf for buf in buffers
+            )
+            deproxy_recorder.record(self, deproxy_recorder.SERVER_SEND, data)
+
+    def _add_response_to_sending_buffer(self, response: bytes | FileResponse) -> None:
         self._tcp_logger.debug("Receive request")
         self._tcp_logger.debug(response)
 
+        if isinstance(response, FileResponse):
+            # the response is the body marker after the head, see `_send_bytes()`
+            self._cur_responses_list.append(response.head)
+        # the same response object is added for each request, it's not copied
         self._cur_responses_list.append(response)
         self._cur_pipelined += 1
 
+    def set_response_delay(self, delay: float) -> None:
+        """Delay the current batch of pipelined responses, e.g. by a route."""
+        self._cur_delay = max(self._cur_delay, delay)
+
+    def close_after_response(self) -> None:
+        """Close the connection after the current batch of responses is sent."""
+        self._cur_close = True
+
     async def disable_readable(self) -> None:
         if not self._read_task.done():
             self._read_task.cancel()
@@ -87,6 +152,8 @@ class ServerConnection:
         if not self._readwrite.is_set():
             return
         self._readwrite.clear()
+        if deproxy_recorder.active is not None:
+            deproxy_recorder.record(self, deproxy_recorder.SERVER_CLOSE)
 
         self._queue.put_nowait(None)
         try:
@@ -99,14 +166,27 @@ class ServerConnection:
                 self._server.remove_connection(connection=self)
 
     def flush(self):
-        self._queue.put_nowait((b"".join(self._cur_responses_list), self._cur_pipelined))
+        self._queue.put_nowait(
+            (self._cur_responses_list, self._cur_pipelined, self._cur_delay, self._cur_close)
+        )
         self._cur_pipelined = 0
         self._cur_responses_list = []
-
-    async def _send_bytes_with_tcp_segmentation(self, data: bytes) -> None:
+        self._cur_delay = 0.0
+        self._cur_close = False
+
+    async def _send_bytes_with_tcp_segmentation(self, buffers: list) -> None:
+        if len(buffers) == 2 and isinstance(buffers[1], FileResponse):
+            # a single file response, its head is the first buffer
+            data = buffers[1].encode()
+        else:
+            data = b"".join(
+                buf.read_body() if isinstance(buf, FileResponse) else buf for buf in buffers
+            )
         initial_len = len(data)
         if initial_len == 0:
             return
+        if deproxy_recorder.active is not None:
+            deproxy_recorder.record(self, deproxy_recorder.SERVER_SEND, data)
 
         seg_size = self._server.segment_size
         seg_gap = self._server.segment_gap
@@ -126,10 +206,25 @@ class ServerConnection:
 
         self._tcp_logger.info(f"Segmented transfer finished. Total size: {initial_len} bytes.")
 
-    async def _send_bytes(self, data: bytes) -> None:
-        if len(data) == 0:
+    async def _send_bytes(self, buffers: list) -> None:
+        """
+        Send responses by one vectored write. Bodies of file responses are sent
+        by `sendfile()` between the writes.
+        """
+        if not buffers:
             return
-        self._writer.write(data)
+        self._record_sent(buffers)
+        chunk = []
+        for buf in buffers:
+            if not isinstance(buf, FileResponse):
+                chunk.append(buf)
+                continue
+            self._writer.writelines(chunk)
+            chunk = []
+            await self._writer.drain()
+            with open(buf.path, "rb") as f:
+                await asyncio.get_running_loop().sendfile(self._writer.transport, f)
+        self._writer.writelines(chunk)
         await self._writer.drain()
         self._http_logger.info(
             f"A response was sent. The current number of responses - {self._responses_done}"
@@ -148,25 +243,36 @@ class ServerConnection:
 
     @__safe_readwrite
     async def _read_loop(self):
-        req_buffer = bytearray()
+        # only new data is parsed on each read, see `HttpStreamParser`
+        parser = deproxy_message.HttpStreamParser(
+            deproxy_message.Request, errors="ignore", framing_only=self._server.framing_only
+        )
         while self._readwrite.is_set():
             data = await self._reader.read(deproxy_message.MAX_MESSAGE_SIZE)
             if not data:
                 await self.close()
                 return
-            req_buffer.extend(data)
+            if deproxy_recorder.active is not None:
+                deproxy_recorder.record(self, deproxy_recorder.SERVER_RECV, data)
+            parser.append(data)
 
-            while req_buffer:
+            requests = parser.messages()
+            while True:
                 try:
-                    request = deproxy_message.Request(req_buffer.decode("utf-8", errors="ignore"))
-                    self.nrreq += 1
-                except deproxy_message.IncompleteMessage:
-                    break
+                    request = next(requests, None)
                 except deproxy_message.ParseError:
                     self._http_logger.error(
-                        f"Can't parse message\n<<<<<\n{req_buffer}>>>>>", exc_info=True
+                        f"Can't parse message\n<<<<<\n{parser.buffer}>>>>>", exc_info=True
                     )
+                    # the parser state is undefined after an error, the stream can't be parsed
+                    await self.close()
+                    return
+                if request is None:
                     break
+                self.nrreq += 1
+                if parser.framing_only:
+                    # the request is not built, only its length is known
+                    request = None
 
                 self._http_logger.info("Receive request")
                 self._http_logger.debug(request)
@@ -188,8 +294,6 @@ class ServerConnection:
                     await self.close()
                     break
 
-                del req_buffer[: request.original_length]
-
     @__safe_readwrite
     async def _write_loop(self) -> None:
         while self._readwrite.is_set():
@@ -199,21 +303,30 @@ class ServerConnection:
                 self._queue.task_done()
                 break
 
-            if self._server.delay_before_sending_response:
-                await asyncio.sleep(self._server.delay_before_sending_response)
+            buffers, count, delay, close = item
+            delay = delay or self._server.delay_before_sending_response
+            if delay:
+                await asyncio.sleep(delay)
 
-            data, count = item
-            await self._write_func(data)
+            await self._write_func(buffers)
             self._responses_done += count
             self._queue.task_done()
 
-            if self._server.keep_alive and self._responses_done >= self._server.keep_alive:
+            if close or (
+                self._server.keep_alive and self._responses_done >= self._server.keep_alive
+            ):
                 await self.close()
                 break
 
 
 class StaticDeproxyServer(base_server.BaseServer):
     _connection_factory = ServerConnection
+    # Which received requests are kept, see `set_retention()`.
+    retention: str = deproxy_history.RETENTION_FULL
+    retention_size: int = 1000
+    # Find request boundaries only and don't build requests, `requests` are only counted.
+    # It's for tests which don't inspect requests, the deproxy auto parser checks responses only.
+    framing_only: bool = False
 
     def __init__(
         self,
@@ -225,7 +338,7 @@ class StaticDeproxyServer(base_server.BaseServer):
         segment_size: int,
         segment_gap: int,
         is_ipv6: bool,
-        response: str | bytes | deproxy_message.Response,
+        response: str | bytes | deproxy_message.Response | FileResponse,
         keep_alive: int,
         drop_conn_when_request_received: bool,
         send_after_conn_established: bool,
@@ -236,9 +349,11 @@ class StaticDeproxyServer(base_server.BaseServer):
     ):
         # this variable is needed for tests with common response for all tests in one class.
         self._default_response = response
+        # responses for requests matched by routes, the default response is sent otherwise
+        self.routes = deproxy_routes.RouteTable()
 
-        self.__request_event = asyncio.Event()
-        self.__connection_event = asyncio.Event()
+        self._request_event = asyncio.Event()
+        self._connection_event = asyncio.Event()
 
         self.port = port
         self.bind_addr = bind_addr
@@ -268,11 +383,12 @@ class StaticDeproxyServer(base_server.BaseServer):
     def clear_stats(self):
         super().clear_stats()
         self._connections: list[ServerConnection] = list()
-        self._requests: list[deproxy_message.Request] = list()
+        self._requests = deproxy_history.MessageHistory(self.retention, self.retention_size)
         self.response = self._default_response
+        self.routes.clear_hits()
 
-        self.__request_event.clear()
-        self.__connection_event.clear()
+        self._request_event.clear()
+        self._connection_event.clear()
 
     async def _accept_connection(
         self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
@@ -283,7 +399,8 @@ class StaticDeproxyServer(base_server.BaseServer):
             )
         conn = self._connection_factory(self, reader, writer)
         self._connections.append(conn)
-        self.__connection_event.set()
+        self._connection_event.set()
+        util.deproxy_notifier.notify()
 
     def reset_new_connections(self) -> None:
         """
@@ -297,14 +414,21 @@ class StaticDeproxyServer(base_server.BaseServer):
         return [self._stop_deproxy]
 
     async def run_start(self) -> None:
-        self._server = await asyncio.start_server(
+        self._server = await self._start_server()
+
+    async def _start_server(self, reuse_port: bool = False) -> asyncio.Server:
+        return await asyncio.start_server(
             client_connected_cb=self._accept_connection,
             host=self.bind_addr,
             port=self.port,
             family=socket.AF_INET6 if self.is_ipv6 else socket.AF_INET,
             reuse_address=True,
+            reuse_port=reuse_port,
         )
 
+    def is_serving(self) -> bool:
+        return self._server.is_serving()
+
     async def _stop_deproxy(self) -> None:
         self._server.close()
         await asyncio.gather(*(conn.close() for conn in self._connections[:]))
@@ -321,7 +445,7 @@ class StaticDeproxyServer(base_server.BaseServer):
             raise AssertionError(f"The {self} server is not started.")
         timeout_not_exceeded = await util.wait_until_event(
             lambda: len(self._connections) != 0,
-            event=self.__connection_event,
+            event=self._connection_event,
             timeout=timeout,
             abort_cond=lambda: self.state != stateful.STATE_STARTED,
         )
@@ -348,47 +472,69 @@ class StaticDeproxyServer(base_server.BaseServer):
             conn.update_segment_size()
 
     @property
-    def response(self) -> bytes:
+    def response(self) -> bytes | FileResponse:
         return self.__response
 
     @response.setter
-    def response(self, response: str | bytes | deproxy_message.Response) -> None:
+    def response(self, response: str | bytes | deproxy_message.Response | FileResponse) -> None:
         self.set_response(response)
 
-    def set_response(self, response: str | bytes | deproxy_message.Response) -> None:
+    def set_response(
+        self, response: str | bytes | deproxy_message.Response | FileResponse
+    ) -> None:
+        """
+        The response is serialized once and the same bytes are sent for all requests.
+        """
         if isinstance(response, str):
             self.__response = response.encode()
         elif isinstance(response, bytes):
             self.__response = response
         elif isinstance(response, deproxy_message.Response):
-            self.__response = response.msg.encode()
+            self.__response = response.encode()
+        elif isinstance(response, FileResponse):
+            self.__response = response
+            self._http_logger.info(f"Set response from file {response.path}")
+            return
 
-        if self.__response and len(self.__response.decode(errors="ignore")) < 1024:
+        if self.__response and len(self.__response) < 1024:
             self._http_logger.info(f"Set response:\n{self.__response.decode(errors='ignore')}")
 
     @property
     def last_request(self) -> Optional[deproxy_message.Request]:
-        if not self.requests:
-            return None
-        return self.requests[-1]
+        return self._requests.last
 
     @property
-    def requests(self) -> list[deproxy_message.Request]:
+    def requests(self) -> deproxy_history.MessageHistory:
         return self._requests
 
+    def set_retention(self, retention: str, size: int = 1000) -> None:
+        """
+        Keep all requests, the last `size` requests or counters and a digest of bodies only,
+        see `deproxy_history`. Already received requests are dropped.
+        """
+        self.retention = retention
+        self.retention_size = size
+        self._requests = deproxy_history.MessageHistory(retention, size)
+
     @property
     def connections(self) -> list[ServerConnection]:
         return self._connections
 
     def remove_connection(self, connection: ServerConnection) -> None:
         self._connections.remove(connection)
-        self.__connection_event.set()
+        self._connection_event.set()
+        util.deproxy_notifier.notify()
 
     def _receive_request(
-        self, request: deproxy_message.Request, connection: ServerConnection
-    ) -> tuple[bytes, bool]:
-        self._requests.append(request)
-        self.__request_event.set()
+        self, request: Optional[deproxy_message.Request], connection: ServerConnection
+    ) -> tuple[bytes | FileResponse, bool]:
+        """`request` is None if requests are not built, see `framing_only`."""
+        if request is None:
+            self._requests.skip()
+        else:
+            self._requests.append(request)
+        self._request_event.set()
+        util.deproxy_notifier.notify()
         req_num = len(self.requests)
         self._http_logger.info(f"A request was receive. The current number of requests - {req_num}")
 
@@ -396,12 +542,25 @@ class StaticDeproxyServer(base_server.BaseServer):
         if 0 < self.hang_on_req_num <= req_num:
             return "", True
 
+        response = self.__response
+        route = self.routes.find(request) if self.routes and request is not None else None
+        if route is not None:
+            route.hits += 1
+            response = route.response
+            if route.delay:
+                connection.set_response_delay(route.delay)
+            if route.close:
+                connection.close_after_response()
+
         if self._deproxy_auto_parser.parsing:
-            self._deproxy_auto_parser.check_expected_request(self.last_request)
+            if request is not None:
+                self._deproxy_auto_parser.check_expected_request(request)
             # Server sets expected response after receiving a request
-            self._deproxy_auto_parser.prepare_expected_response(self.__response)
+            self._deproxy_auto_parser.prepare_expected_response(
+                response.encode() if isinstance(response, FileResponse) else response
+            )
 
-        return self.__response, False
+        return response, False
 
     async def wait_for_requests(
         self, n: int, timeout: float = 5.0, adjust_timeout: bool = False, msg: Optional[str] = None
@@ -409,9 +568,9 @@ class StaticDeproxyServer(base_server.BaseServer):
         """wait for the `n` number of responses to be received"""
         timeout_not_exceeded = await util.wait_until_event(
             lambda: len(self.requests) < n,
-            event=self.__request_event,
+            event=self._request_event,
             timeout=timeout,
-            abort_cond=lambda: not self._server.is_serving(),
+            abort_cond=lambda: not self.is_serving(),
             adjust_timeout=adjust_timeout,
         )
 
@@ -420,11 +579,243 @@ class StaticDeproxyServer(base_server.BaseServer):
         )
 
 
+class WorkerConnection:
+    """A connection of a worker process, the parent process knows only the worker."""
+
+    def __init__(self, worker: int):
+        self.worker = worker
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.worker})"
+
+
+class MultiProcessDeproxyServer(StaticDeproxyServer):
+    """
+    The server forks `workers` processes which accept connections on the same port
+    with SO_REUSEPORT, so the backend isn't limited by one CPU core.
+
+    Workers count requests and connections in shared memory and the parent process
+    syncs the counters to `requests` and `connections`, so `wait_for_requests()` and
+    `wait_for_connections()` work as usual, but requests themselves are available
+    in workers only. Workers with RETENTION_DIGEST report digests of request bodies
+    on stop, see `worker_digests`. The server is copied to workers on start, so
+    settings must not be changed while the server is running. `hang_on_req_num` works
+    per worker. Responses can't be checked by the deproxy auto parser, because they are
+    received in the parent process, so the server isn't started if the parser is on.
+    `flush()` and `reset_new_connections()` are run by all workers, they return a task
+    which waits until the workers are done.
+    """
+
+    def __init__(self, *, workers: int, **kwargs):
+        if workers <= 0:
+            raise ValueError("The number of workers must be positive.")
+        self.workers = workers
+        super().__init__(**kwargs)
+        self._processes: list[multiprocessing.Process] = []
+        self._pipes: list = []
+        self._sync_task: Optional[asyncio.Task] = None
+        # the index of the worker in a worker process, None in the parent process
+        self._worker: Optional[int] = None
+        # the number of requests and connections of each worker
+        self._counters = None
+        # the last command sent to workers, see `_command()`
+        self._command_task: Optional[asyncio.Task] = None
+
+    def clear_stats(self):
+        super().clear_stats()
+        self._connection_counts = [0] * self.workers
+        # digests of request bodies received by each worker, see RETENTION_DIGEST
+        self.worker_digests: list[Optional[str]] = []
+
+    async def run_start(self) -> None:
+        if self._deproxy_auto_parser.parsing:
+            raise ValueError(
+                f"{self} with workers doesn't support the deproxy auto parser, "
+                "call `disable_deproxy_auto_parser()`."
+            )
+        context = multiprocessing.get_context("fork")
+        self._counters = context.RawArray("q", 2 * self.workers)
+        for worker in range(self.workers):
+            pipe, worker_pipe = context.Pipe()
+            process = context.Process(
+                target=self._run_worker, args=(worker, worker_pipe), name=f"{self}-{worker}"
+            )
+            process.start()
+            worker_pipe.close()
+            self._processes.append(process)
+            self._pipes.append(pipe)
+        for pipe in self._pipes:
+            error = await self._recv(pipe)
+            if error:
+                raise RuntimeError(f"The {self} worker is not started: {error}")
+        self._sync_task = asyncio.create_task(self._sync_stats())
+
+    @staticmethod
+    async def _recv(pipe, timeout: float = 5.0):
+        if not await asyncio.to_thread(pipe.poll, timeout):
+            raise TimeoutError("The worker doesn't respond.")
+        return pipe.recv()
+
+    def _run_worker(self, worker: int, pipe) -> None:
+        self._worker = worker
+        # pipes of other workers are inherited from the parent process
+        for parent_pipe in self._pipes:
+            parent_pipe.close()
+        asyncio.run(self._serve(pipe))
+
+    async def _serve(self, pipe) -> None:
+        try:
+            self._server = await self._start_server(reuse_port=True)
+        except OSError as e:
+            pipe.send(str(e))
+            return
+        pipe.send(None)
+
+        # the parent process sends commands and None to stop the worker, see `_command()`
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+
+        def run_command() -> None:
+            try:
+                command = pipe.recv()
+            except EOFError:
+                command = None
+            if command is None:
+                loop.remove_reader(pipe.fileno())
+                stop.set()
+                return
+            try:
+                getattr(self, command)()
+            except Exception as e:
+                try:
+                    pipe.send(e)
+                except Exception:
+                    # the exception can't be pickled
+                    pipe.send(RuntimeError(repr(e)))
+            else:
+                pipe.send(None)
+
+        loop.add_reader(pipe.fileno(), run_command)
+        await stop.wait()
+
+        self._server.close()
+        await asyncio.gather(*(conn.close() for conn in self._connections[:]))
+        await self._server.wait_closed()
+        pipe.send(self._requests.body_digest)
+
+    async def _sync_stats(self) -> None:
+        while True:
+            requests = sum(self._counters[2 * w] for w in range(self.workers))
+            if requests > len(self._requests):
+                self._requests.skip(requests - len(self._requests))
+                self._request_event.set()
+                util.deproxy_notifier.notify()
+
+            counts = [self._counters[2 * w + 1] for w in range(self.workers)]
+            if counts != self._connection_counts:
+                self._connection_counts = counts
+                self._connections = [
+                    WorkerConnection(w) for w, n in enumerate(counts) for _ in range(n)
+                ]
+                self._connection_event.set()
+                util.deproxy_notifier.notify()
+
+            await asyncio.sleep(run_config.asyncio_freq)
+
+    async def _accept_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        await super()._accept_connection(reader, writer)
+        self._counters[2 * self._worker + 1] = len(self._connections)
+
+    def remove_connection(self, connection: ServerConnection) -> None:
+        super().remove_connection(connection)
+        self._counters[2 * self._worker + 1] = len(self._connections)
+
+    def _receive_request(
+        self, request: Optional[deproxy_message.Request], connection: ServerConnection
+    ) -> tuple[bytes | FileResponse, bool]:
+        response = super()._receive_request(request, connection)
+        self._counters[2 * self._worker] = len(self._requests)
+        return response
+
+    def is_serving(self) -> bool:
+        return bool(self._processes) and all(p.is_alive() for p in self._processes)
+
+    def _command(self, command: str, timeout: float = 5.0) -> asyncio.Task:
+        """
+        Call the method `command` in all workers. The returned task waits until it's done
+        and raises an exception of a worker.
+        """
+        for pipe in self._pipes:
+            pipe.send(command)
+        self._command_task = asyncio.create_task(
+            self._wait_command(self._command_task, timeout)
+        )
+        return self._command_task
+
+    async def _wait_command(self, previous: Optional[asyncio.Task], timeout: float) -> None:
+        if previous is not None:
+            # replies of workers are received in the order of commands
+            await asyncio.gather(previous, return_exceptions=True)
+        errors = []
+        for pipe, process in zip(self._pipes, self._processes):
+            try:
+                error = await self._recv(pipe, timeout)
+            except TimeoutError:
+                raise TimeoutError(f"The worker {process.name} doesn't respond.")
+            if error is not None:
+                errors.append(error)
+        if errors:
+            raise errors[0]
+
+    def reset_new_connections(self) -> Optional[asyncio.Task]:
+        if self._worker is None:
+            return self._command("reset_new_connections")
+        return super().reset_new_connections()
+
+    def flush(self) -> Optional[asyncio.Task]:
+        if self._worker is None:
+            return self._command("flush")
+        return super().flush()
+
+    async def _stop_deproxy(self) -> None:
+        if self._sync_task:
+            self._sync_task.cancel()
+            self._sync_task = None
+        if self._command_task is not None:
+            try:
+                await self._command_task
+            except Exception as e:
+                self._tcp_logger.error(f"A command of workers failed: {e!r}")
+            self._command_task = None
+        digests = []
+        for pipe, process in zip(self._pipes, self._processes):
+            try:
+                pipe.send(None)
+                digests.append(await self._recv(pipe))
+            except (OSError, EOFError, TimeoutError):
+                self._tcp_logger.error(f"The worker {process.name} is not stopped gracefully.")
+                digests.append(None)
+            await asyncio.to_thread(process.join, 5)
+            if process.is_alive():
+                process.kill()
+            pipe.close()
+        self._processes, self._pipes = [], []
+        self.clear_stats()
+        self.worker_digests = digests
+
+
 def deproxy_srv_initializer(
     server: dict, name: str, tester, default_server_class=StaticDeproxyServer
 ):
     is_ipv6 = server.get("is_ipv6", False)
+    kwargs = {}
+    if server.get("workers"):
+        default_server_class = MultiProcessDeproxyServer
+        kwargs["workers"] = server["workers"]
     srv = default_server_class(
+        **kwargs,
         id_=name,
         deproxy_auto_parser=tester._deproxy_auto_parser,
         port=int(server["port"]),
@@ -432,7 +823,11 @@ def deproxy_srv_initializer(
         segment_size=server.get("segment_size", 0),
         segment_gap=server.get("segment_gap", 0),
         is_ipv6=is_ipv6,
-        response=fill_template(server.get("response_content", ""), server),
+        response=(
+            FileResponse(server["response_file"])
+            if "response_file" in server
+            else fill_template(server.get("response_content", ""), server)
+        ),
         keep_alive=server.get("keep_alive", 0),
         drop_conn_when_request_received=server.get("drop_conn_when_request_received", False),
         send_after_conn_established=server.get("send_after_conn_established", False),
@@ -441,6 +836,11 @@ def deproxy_srv_initializer(
         pipelined=server.get("pipelined", 0),
         rcv_buf_size=server.get("rcv_buf_size", -1),
     )
+    srv.framing_only = server.get("framing_only", False)
+    for route in server.get("routes", ()):
+        srv.routes.add(**route)
+    if "retention" in server:
+        srv.set_retention(server["retention"], server.get("retention_size", 1000))
     return srv
 
 
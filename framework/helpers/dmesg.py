@@ -1,17 +1,23 @@
 """Helper for Tempesta system log operations."""
 
 import abc
+import atexit
+import collections
+import itertools
+import json
 import re
+import threading
 import typing
 from contextlib import asynccontextmanager
 from typing import Callable, List
 
+import run_config
 from framework.helpers.tf_cfg import test_logger
 
 from . import error, remote, util
 
 __author__ = "Tempesta Technologies, Inc."
-__copyright__ = "Copyright (C) 2018-2025 Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2018-2026 Tempesta Technologies, Inc."
 __license__ = "GPL2"
 
 from .access_log import AccessLogLine
@@ -104,8 +110,145 @@ class BaseTempestaLogger:
         """
 
 
+class KernelLogRecord(typing.NamedTuple):
+    # realtime of the record in seconds
+    timestamp: float
+    cursor: str
+    message: str
+
+
+class KernelLogFollower:
+    """
+    Follows the kernel log of a node by one `journalctl -kf -o json` command for the whole
+    session. Records are kept in a ring buffer of `capacity` records, waiters of `notifier`
+    are woken up as soon as new records are received.
+    """
+
+    def __init__(self, node: remote.ANode, since: float, capacity: int = 100000):
+        self.node = node
+        # records older than this realtime aren't received
+        self.since = since
+        self.notifier = util.Notifier()
+        # the number of all received records, including dropped from the buffer
+        self.seq = 0
+        self.last_timestamp = 0.0
+        self._records: typing.Deque[KernelLogRecord] = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._stream, self._stop = node.stream_cmd(
+            f"exec journalctl -k -f -q -o json --since=@{since:.6f}"
+        )
+        self._thread = threading.Thread(target=self._run, name="KernelLogFollower", daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    @staticmethod
+    def _parse(line: bytes) -> typing.Optional[KernelLogRecord]:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        message = entry.get("MESSAGE") or ""
+        if isinstance(message, list):
+            # journald exports messages with non-printable characters as byte arrays
+            message = bytes(message).decode(errors="ignore")
+        return KernelLogRecord(
+            int(entry["__REALTIME_TIMESTAMP"]) / 1e6, entry["__CURSOR"], message
+        )
+
+    def _run(self) -> None:
+        try:
+            for line in self._stream:
+                record = self._parse(line)
+                if record is None:
+                    continue
+                with self._lock:
+                    self._records.append(record)
+                    self.seq += 1
+                    self.last_timestamp = record.timestamp
+                self.notifier.notify()
+        except Exception as e:
+            test_logger.warning(f"The kernel log follower is stopped: {e}")
+        finally:
+            self._stream.close()
+            self.notifier.notify()
+
+    def records(self, seq: int) -> tuple[list[KernelLogRecord], bool]:
+        """
+        Records after the first `seq` records and False if some of them were already dropped
+        from the buffer.
+        """
+        with self._lock:
+            first = self.seq - len(self._records)
+            if seq < first:
+                return list(self._records), False
+            return list(itertools.islice(self._records, seq - first, None)), True
+
+    async def sync(self, timeout: float = 2) -> bool:
+        """Wait until all records which are in the journal now are received."""
+        # older records are never received, so only records since the follower start are waited
+        out, _ = await self.node.arun_cmd(
+            f"journalctl -k -n 1 -q -o json --since=@{self.since:.6f}"
+        )
+        if not out.strip():
+            return True
+        last = self._parse(out.strip().splitlines()[-1])
+        return await util.wait_until(
+            lambda: self.running and self.last_timestamp < last.timestamp,
+            timeout=timeout,
+            notifier=self.notifier,
+        )
+
+    def stop(self) -> None:
+        self._stop()
+        self._thread.join(timeout=1)
+
+
+_follower: typing.Optional[KernelLogFollower] = None
+
+
+def get_follower(since: float) -> typing.Optional[KernelLogFollower]:
+    """
+    The kernel log follower of Tempesta node. It's started by the first call, or again
+    if it was stopped, with records since `since`.
+    """
+    global _follower
+    if not run_config.FOLLOW_KERNEL_LOG:
+        return None
+    if _follower is None or not _follower.running:
+        try:
+            _follower = KernelLogFollower(remote.tempesta, since)
+        except Exception as e:
+            test_logger.warning(f"Can't follow the kernel log: {e}")
+            _follower = None
+    return _follower
+
+
+@atexit.register
+def _stop_follower() -> None:
+    if _follower is not None:
+        _follower.stop()
+
+
 class DmesgFinder(BaseTempestaLogger):
-    """dmesg helper class."""
+    """
+    dmesg helper class.
+
+    The kernel log is read incrementally: `update()` fetches only records after
+    the journal cursor of the previous read and appends them to the in-memory log.
+    Patterns of `log_findall()` are compiled once and each pattern scans only
+    the records appended after its previous search and the last records of the previous
+    search, so a match may span two updates.
+
+    If the session kernel log follower is running, records are taken from it without
+    remote commands, and `find()` is woken up as soon as new records are received.
+    The finder falls back to `journalctl` reads if the follower is stopped or has
+    dropped records which the finder hasn't read yet.
+    """
+
+    _cursor_re = re.compile(rb"(?:^|\n)-- cursor: (\S+)\n?$")
 
     def __init__(self, disable_ratelimit=False):
         """
@@ -115,18 +258,36 @@ class DmesgFinder(BaseTempestaLogger):
         or exception.
         """
         self.node = remote.tempesta
-        self.log = ""
-        self.start_time = float(self.node.run_cmd("date +%s.%N")[0])
+        self._cursor: typing.Optional[str] = None
+        # records by `update()` calls, bytes and decoded
+        self._chunks: list[bytes] = []
+        self._texts: list[str] = []
+        self._log: typing.Optional[bytes] = b""
+        # pattern -> (compiled pattern, final matches, matches in the last text,
+        # the number of scanned texts, the offset in the last text to continue from)
+        self._matches: dict[str, tuple[typing.Pattern, list, list, int, int]] = {}
+        self._access_log: list[AccessLogLine] = []
+        self._access_log_texts = 0
         self.prev_message_cost = None
-
-        # Suppress net ratelimiter to have all the messages in dmesg.
-        if disable_ratelimit:
-            self.prev_message_cost = int(
-                self.node.run_cmd("sysctl --values net.core.message_cost")[0]
+        # records received by a running follower before the start time may be skipped
+        follower = _follower if _follower is not None and _follower.running else None
+        seq = follower.seq if follower is not None else 0
+        if not disable_ratelimit:
+            self.start_time = float(self.node.run_cmd("date +%s.%N")[0])
+        else:
+            # Suppress net ratelimiter to have all the messages in dmesg.
+            (start_time, _), (message_cost, _) = self.node.run_cmds(
+                ["date +%s.%N", "sysctl --values net.core.message_cost"]
             )
+            self.start_time = float(start_time)
+            self.prev_message_cost = int(message_cost)
             if self.prev_message_cost != 0:
                 self.node.run_cmd("sysctl -w net.core.message_cost=0")
 
+        self._follower = get_follower(self.start_time)
+        self._follower_seq = seq if self._follower is follower else 0
+        self._last_cursor: typing.Optional[str] = None
+
     def __del__(self):
         """
         Restore net.core.message_cost to not to flood the log on
@@ -137,20 +298,95 @@ class DmesgFinder(BaseTempestaLogger):
         if self.prev_message_cost is not None:
             self.node.run_cmd(f"sysctl -w net.core.message_cost={self.prev_message_cost}")
 
+    @property
+    def log(self) -> bytes:
+        """The log from the start of the finder."""
+        if self._log is None:
+            self._log = b"".join(self._chunks)
+        return self._log
+
     def update(self):
-        """Get log from the last run."""
-        cmd = "journalctl -k -o cat --since=@{:.6f}".format(self.start_time)
-        self.log, _ = self.node.run_cmd(cmd)
+        """Get new log records from the last update."""
+        if self._follower is not None and self.__update_from_follower():
+            return
+        if self._cursor is None:
+            since = "--since=@{:.6f}".format(self.start_time)
+        else:
+            since = f"--after-cursor='{self._cursor}'"
+        out, _ = self.node.run_cmd(f"journalctl -k -q -o cat --show-cursor {since}")
+
+        # the cursor isn't printed if there are no new records
+        match = self._cursor_re.search(out)
+        if match is None:
+            return
+        self._cursor = match.group(1).decode()
+        out = out[: match.start()]
+        if not out:
+            return
+        if not out.endswith(b"\n"):
+            out += b"\n"
+        self.__append(out)
+
+    def __update_from_follower(self) -> bool:
+        """False if the follower can't be used anymore, records are read by a cursor then."""
+        follower = self._follower
+        records, complete = follower.records(self._follower_seq)
+        if not complete:
+            test_logger.warning("The kernel log follower dropped records, read them again.")
+        else:
+            self._follower_seq += len(records)
+            lines = [r.message for r in records if r.timestamp >= self.start_time]
+            if records:
+                self._last_cursor = records[-1].cursor
+            if lines:
+                self.__append(("\n".join(lines) + "\n").encode())
+            if follower.running:
+                return True
+
+        # continue from the last read record
+        self._follower = None
+        self._cursor = self._last_cursor
+        return False
+
+    async def sync(self) -> None:
+        """Wait until records which are in the journal now may be read by `update()`."""
+        if self._follower is not None:
+            await self._follower.sync()
+
+    def __append(self, out: bytes) -> None:
+        self._chunks.append(out)
+        self._texts.append(out.decode(errors="ignore"))
+        self._log = None
 
     def show(self):
         """Show tempesta system log."""
         print(self.log)
 
     def log_findall(self, pattern: str) -> list[str]:
-        if isinstance(self.log, bytes):
-            return re.findall(pattern, self.log.decode(errors="ignore"))
-
-        return re.findall(pattern, self.log)
+        """Same as `re.findall()` for the whole log, but only new records are scanned."""
+        state = self._matches.get(pattern) or (re.compile(pattern), [], [], 0, 0)
+        compiled, matches, tail, scanned, offset = state
+        if scanned == len(self._texts):
+            return matches + tail
+
+        # matches in the last scanned text are searched again, they may continue in new texts
+        first = max(scanned - 1, 0)
+        # the previous character is kept for `\b` and `^`, it's always a new line
+        prefix = self._texts[first - 1][-1:] if first else ""
+        text = prefix + "".join(self._texts[first:])
+        last = len(text) - len(self._texts[-1])
+        tail = []
+        end = 0
+        for match in compiled.finditer(text, len(prefix) + offset):
+            groups = match.groups("")
+            value = groups if len(groups) > 1 else groups[0] if groups else match.group()
+            if match.start() < last:
+                matches.append(value)
+                end = match.end()
+            else:
+                tail.append(value)
+        self._matches[pattern] = (compiled, matches, tail, len(self._texts), max(end - last, 0))
+        return matches + tail
 
     async def find(self, pattern: str, cond=amount_one) -> bool:
         """
@@ -166,15 +402,19 @@ class DmesgFinder(BaseTempestaLogger):
             matches = self.log_findall(pattern)
             return not cond(matches)
 
-        return await util.wait_until(wait_cond, timeout=2)
+        return await util.wait_until(
+            wait_cond,
+            timeout=2,
+            notifier=self._follower.notifier if self._follower is not None else None,
+        )
 
     def access_log_records_all(self) -> typing.List[AccessLogLine]:
         self.update()
 
-        if isinstance(self.log, bytes):
-            return AccessLogLine.parse_all(self.log.decode())
-
-        return AccessLogLine.parse_all(self.log)
+        for text in self._texts[self._access_log_texts :]:
+            self._access_log.extend(AccessLogLine.parse_all(text))
+        self._access_log_texts = len(self._texts)
+        return list(self._access_log)
 
     def access_log_records_count(self) -> int:
         return len(self.access_log_records_all())
@@ -0,0 +1,131 @@
+"""
+HDR-style (High Dynamic Range) histogram of latencies.
+"""
+
+import math
+from typing import List, Optional
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies with a fixed relative error and a small fixed size.
+
+    Values are recorded in microseconds into log-linear buckets: each power of two
+    is split into `2 ** precision` sub-buckets, so the relative error of percentiles
+    is less than `2 ** -precision` for any value, from microseconds to hours.
+    Recording is O(1) and doesn't depend on the number of recorded values.
+    The public API works with seconds, as `time.monotonic()` does.
+    """
+
+    def __init__(self, precision: int = 7):
+        self.precision = precision
+        self._sub_buckets = 1 << precision
+        self._counts: List[int] = []
+        self.count = 0
+        self._total = 0
+        self._min: Optional[int] = None
+        self._max: Optional[int] = None
+
+    def _index(self, value: int) -> int:
+        # values less than `2 * sub_buckets` are stored as is, larger values lose low bits
+        shift = max(value.bit_length() - self.precision - 1, 0)
+        return (shift << self.precision) + (value >> shift)
+
+    def _highest_value(self, index: int) -> int:
+        """The highest value of the bucket."""
+        shift = max(index // self._sub_buckets - 1, 0)
+        sub_bucket = index - (shift << self.precision)
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, seconds: float, count: int = 1) -> None:
+        value = max(int(seconds * 1_000_000), 0)
+        index = self._index(value)
+        if index >= len(self._counts):
+            self._counts.extend([0] * (index + 1 - len(self._counts)))
+        self._counts[index] += count
+        self.count += count
+        self._total += value * count
+        if self._min is None or value < self._min:
+            self._min = value
+        if self._max is None or value > self._max:
+            self._max = value
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """Add all values of `other` histogram to this one."""
+        if other.precision != self.precision:
+            raise ValueError("Histograms with different precision can't be merged.")
+        if len(other._counts) > len(self._counts):
+            self._counts.extend([0] * (len(other._counts) - len(self._counts)))
+        for index, count in enumerate(other._counts):
+            self._counts[index] += count
+        self.count += other.count
+        self._total += other._total
+        for value in (other._min, other._max):
+            if value is not None:
+                self._min = value if self._min is None else min(self._min, value)
+                self._max = value if self._max is None else max(self._max, value)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """The value in seconds which `percentile` percents of recorded values don't exceed."""
+        if not self.count:
+            return None
+        rank = max(math.ceil(self.count * percentile / 100), 1)
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                return min(self._highest_value(index), self._max) / 1_000_000
+        return self._max / 1_000_000
+
+    @property
+    def p50(self) -> Optional[float]:
+        return self.percentile(50)
+
+    @property
+    def p99(self) -> Optional[float]:
+        return self.percentile(99)
+
+    @property
+    def p999(self) -> Optional[float]:
+        return self.percentile(99.9)
+
+    @property
+    def min(self) -> Optional[float]:
+        return None if self._min is None else self._min / 1_000_000
+
+    @property
+    def max(self) -> Optional[float]:
+        return None if self._max is None else self._max / 1_000_000
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self._total / self.count / 1_000_000 if self.count else None
+
+    def __str__(self) -> str:
+        if not self.count:
+            return "count=0"
+        return (
+            f"count={self.count} min={self.min:.6f} p50={self.p50:.6f} p99={self.p99:.6f} "
+            f"p999={self.p999:.6f} max={self.max:.6f}"
+        )
+
+
+class RequestLatency:
+    """Latencies of requests from the moment a request is sent."""
+
+    def __init__(self):
+        # until the first byte of the response is received
+        self.first_byte = LatencyHistogram()
+        # until the whole response is received
+        self.complete = LatencyHistogram()
+
+    def merge(self, other: "RequestLatency") -> None:
+        self.first_byte.merge(other.first_byte)
+        self.complete.merge(other.complete)
+
+    def __str__(self) -> str:
+        return f"first byte: {self.first_byte}; complete: {self.complete}"
@@ -12,7 +12,7 @@ from framework.helpers import remote, tf_cfg
 from framework.helpers.tf_cfg import test_logger
 
 __author__ = "Tempesta Technologies, Inc."
-__copyright__ = "Copyright (C) 2023-2025 Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2023-2026 Tempesta Technologies, Inc."
 __license__ = "GPL2"
 
 _SYSTEM_IPS = []
@@ -45,13 +45,21 @@ class NetWorker:
         self._interface_name = tf_cfg.cfg.get("Server", "aliases_interface")
         self._base_interface_ip = tf_cfg.cfg.get("Server", "aliases_base_ip")
         self._interface: str = self._route_dst_ip(ip=self._get_dst_ipv4())
-        self._prev_ipv6_addresses: list[str] = self._get_ipv6_addresses()
-        self._prev_mtu: int = self._get_mtu()
-        self._prev_mtu_expires: int = self._get_mtu_expires()
-        self._prev_ip_no_pmtu_disc: int = self._get_ip_no_pmtu_disc()
-        self._prev_tso: bool = self._get_state(what="tcp-segmentation-offload")
-        self._prev_gro: bool = self._get_state(what="generic-receive-offload")
-        self._prev_gso: bool = self._get_state(what="generic-segmentation-offload")
+
+        # save the current settings by one round trip
+        with self._node.batch() as batch:
+            ipv6 = batch.add(f"ip -6 addr show dev {self._interface}")
+            mtu = batch.add(f"LANG=C ip addr show {self._interface} |grep -o 'mtu [0-9]*'")
+            mtu_expires = batch.add("sysctl --values net.ipv4.route.mtu_expires")
+            ip_no_pmtu_disc = batch.add("sysctl --values net.ipv4.ip_no_pmtu_disc")
+            features = batch.add(f"ethtool --show-features {self._interface}")
+        self._prev_ipv6_addresses: list[str] = self._parse_ipv6_addresses(ipv6.stdout)
+        self._prev_mtu: int = int(mtu.stdout.split()[1])
+        self._prev_mtu_expires: int = int(mtu_expires.stdout)
+        self._prev_ip_no_pmtu_disc: int = int(ip_no_pmtu_disc.stdout)
+        self._prev_tso: bool = self._parse_state(features.stdout, "tcp-segmentation-offload")
+        self._prev_gro: bool = self._parse_state(features.stdout, "generic-receive-offload")
+        self._prev_gso: bool = self._parse_state(features.stdout, "generic-segmentation-offload")
 
     @staticmethod
     def _check_ssh_ip_addr(ip: str) -> bool:
@@ -82,34 +90,12 @@ class NetWorker:
             .decode()
         )
 
-    def _get_mtu(self) -> int:
-        return int(
-            self._node.run_cmd(f"LANG=C ip addr show {self._interface} |grep -o 'mtu [0-9]*'")[
-                0
-            ].split()[1]
-        )
-
-    def _change_mtu(self, mtu: int) -> int:
-        """Change the device MTU and return previous MTU."""
-        prev_mtu = self._get_mtu()
-        self._node.run_cmd(f"LANG=C ip link set {self._interface} mtu {mtu}")
-        return int(prev_mtu)
-
-    def _get_ip_no_pmtu_disc(self) -> int:
-        return int(self._node.run_cmd("sysctl --values net.ipv4.ip_no_pmtu_disc")[0])
+    def _change_mtu(self, batch: remote.CommandBatch, mtu: int) -> None:
+        batch.add(f"LANG=C ip link set {self._interface} mtu {mtu}")
 
-    def _set_ip_no_pmtu_disc(self, ip_no_pmtu_disc: int) -> None:
-        self._node.run_cmd(f"sysctl -w net.ipv4.ip_no_pmtu_disc={ip_no_pmtu_disc}")
-
-    def _get_mtu_expires(self) -> int:
-        return int(self._node.run_cmd("sysctl --values net.ipv4.route.mtu_expires")[0])
-
-    def _set_mtu_expires(self, expires: int) -> None:
-        self._node.run_cmd(f"sysctl -w net.ipv4.route.mtu_expires={expires}")
-
-    def _get_ipv6_addresses(self) -> list[str]:
+    @staticmethod
+    def _parse_ipv6_addresses(stdout: bytes) -> list[str]:
         pattern = re.compile(r"inet6\s+([a-fA-F0-9:]+/\d+)")
-        stdout, _ = self._node.run_cmd(f"ip -6 addr show dev {self._interface}")
 
         ipv6_addresses = []
 
@@ -119,18 +105,21 @@ class NetWorker:
                 ipv6_addresses.append(match.group(1))
         return ipv6_addresses
 
-    def _restore_ipv6_addresses(self) -> None:
-        cur_ipv6_addresses = self._get_ipv6_addresses()
+    def _restore_ipv6_addresses(self, batch: remote.CommandBatch) -> None:
         for addr in self._prev_ipv6_addresses:
-            if addr not in cur_ipv6_addresses:
-                self._node.run_cmd(f"ip -6 addr add {addr} dev {self._interface}")
+            batch.add(
+                f"ip -6 addr show dev {self._interface} | grep -q 'inet6 {addr} '"
+                f" || ip -6 addr add {addr} dev {self._interface}"
+            )
 
-    def _get_state(self, what: str) -> bool:
-        out = self._node.run_cmd(f"ethtool --show-features {self._interface} | grep {what}")
-        return self._state_dict.get(out[0].decode("utf-8").split(" ")[-1].strip("\n"))
+    def _parse_state(self, features: bytes, what: str) -> bool:
+        for line in features.decode("utf-8").splitlines():
+            if what in line:
+                return self._state_dict.get(line.split(" ")[-1].strip("\n"))
+        return None
 
-    def _set_state(self, what: str, on: bool) -> None:
-        self._node.run_cmd(f"ethtool -K {self._interface} {what} {self._state_dict.get(on)}")
+    def _set_state(self, batch: remote.CommandBatch, what: str, on: bool) -> None:
+        batch.add(f"ethtool -K {self._interface} {what} {self._state_dict.get(on)}")
 
     def _get_dst_ipv4(self) -> str:
         """
@@ -144,26 +133,30 @@ class NetWorker:
             return tf_cfg.cfg.get("Client", "ip")
 
     def change_mtu(self, mtu: int, disable_pmtu: bool) -> None:
-        self._change_mtu(mtu=mtu)
-        self._set_mtu_expires(0)
-        if disable_pmtu:
-            self._set_ip_no_pmtu_disc(1)
+        with self._node.batch() as batch:
+            self._change_mtu(batch, mtu=mtu)
+            batch.sysctl("net.ipv4.route.mtu_expires", 0)
+            if disable_pmtu:
+                batch.sysctl("net.ipv4.ip_no_pmtu_disc", 1)
 
     def restore_interface_settings(self) -> None:
-        self._change_mtu(mtu=self._prev_mtu)
-        self._set_mtu_expires(self._prev_mtu_expires)
-        self._set_ip_no_pmtu_disc(self._prev_ip_no_pmtu_disc)
-        self._restore_ipv6_addresses()
+        with self._node.batch() as batch:
+            self._change_mtu(batch, mtu=self._prev_mtu)
+            batch.sysctl("net.ipv4.route.mtu_expires", self._prev_mtu_expires)
+            batch.sysctl("net.ipv4.ip_no_pmtu_disc", self._prev_ip_no_pmtu_disc)
+            self._restore_ipv6_addresses(batch)
 
     def change_tso_gro_gso(self, on: bool) -> None:
-        self._set_state("tso", on)
-        self._set_state("gro", on)
-        self._set_state("gso", on)
+        with self._node.batch() as batch:
+            self._set_state(batch, "tso", on)
+            self._set_state(batch, "gro", on)
+            self._set_state(batch, "gso", on)
 
     def restore_tso_gro_gso(self) -> None:
-        self._set_state("tso", self._prev_tso)
-        self._set_state("gro", self._prev_gro)
-        self._set_state("gso", self._prev_gso)
+        with self._node.batch() as batch:
+            self._set_state(batch, "tso", self._prev_tso)
+            self._set_state(batch, "gro", self._prev_gro)
+            self._set_state(batch, "gso", self._prev_gso)
 
     def save_tcp_option(self, option_name: str) -> None:
         out = self._node.run_cmd(f"sysctl {option_name}")
@@ -172,9 +165,19 @@ class NetWorker:
     def set_tcp_option(self, option_name: str, option_val: str) -> None:
         self._node.run_cmd(f"sysctl -w {option_name}={option_val}")
 
+    def change_tcp_options(self, tcp_options: dict[str, str]) -> None:
+        """Save and set TCP options by one round trip."""
+        with self._node.batch() as batch:
+            saved = {name: batch.add(f"sysctl --values {name}") for name in tcp_options}
+            for option_name, option_val in tcp_options.items():
+                batch.sysctl(option_name, option_val)
+        for option_name, result in saved.items():
+            self._tcp_options[option_name] = result.stdout.decode("utf-8").strip("\n")
+
     def restore_tcp_options(self) -> None:
-        for option_name, option_value in self._tcp_options.items():
-            self.set_tcp_option(option_name, option_value)
+        with self._node.batch() as batch:
+            for option_name, option_value in self._tcp_options.items():
+                batch.sysctl(option_name, option_value)
 
     def create_interface(self, iface_id: int) -> tuple[str, str]:
         """Create interface alias for listeners on nginx machine"""
@@ -205,17 +208,31 @@ class NetWorker:
                 test_logger.warning("Interface alias not removed")
 
     def create_interfaces(self, number_of_ip: int) -> list[str]:
-        """Create specified amount of interface aliases"""
-        ips = []
-        for i in range(number_of_ip):
-            (_, ip) = self.create_interface(i)
-            ips.append(ip)
+        """Create specified amount of interface aliases by one round trip"""
+        base_ip_addr = self.ip_str_to_number(self._base_interface_ip)
+        ips = [self.ip_number_to_str(base_ip_addr + i) for i in range(number_of_ip)]
+        test_logger.info(f"Adding ips {ips}")
+
+        with self._node.batch(env={"LANG": "C"}, check=False) as batch:
+            for i, iface_ip in enumerate(ips):
+                result = batch.ip(
+                    f"address add {iface_ip}/24 dev {self._interface_name}"
+                    f" label {self._interface_name}:{i}"
+                )
+        if number_of_ip and not result.ok:
+            test_logger.warning(f"Some interface aliases already added: {result.stderr}")
         return ips
 
     def remove_interfaces(self, ips: list[str]) -> None:
-        """Remove previously created interfaces"""
-        for ip in ips:
-            self.remove_interface(ip)
+        """Remove previously created interfaces by one round trip"""
+        ips = [ip_ for ip_ in ips if self._check_ssh_ip_addr(ip_)]
+        test_logger.info(f"Removing ips {ips}")
+
+        with self._node.batch(env={"LANG": "C"}, check=False) as batch:
+            for ip_ in ips:
+                result = batch.ip(f"address del {ip_}/24 dev {self._interface_name}")
+        if ips and not result.ok:
+            test_logger.warning(f"Some interface aliases not removed: {result.stderr}")
 
     def create_route(self, ip_: str) -> None:
         """Create route"""
@@ -229,8 +246,16 @@ class NetWorker:
             test_logger.warning("Route not added")
 
     def create_routes(self, ips: list[str]) -> None:
-        for ip_ in ips:
-            self.create_route(ip_)
+        """Create routes by one round trip"""
+        test_logger.info(f"Adding routes for {ips}")
+
+        with self._dst_node.batch(env={"LANG": "C"}, check=False) as batch:
+            for ip_ in ips:
+                result = batch.ip(
+                    f"route add {ip_} via {self._gateway_ip} dev {self._interface_name}"
+                )
+        if ips and not result.ok:
+            test_logger.warning(f"Some routes not added: {result.stderr}")
 
     def remove_route(self, ip_: str):
         """Remove route"""
@@ -244,9 +269,16 @@ class NetWorker:
                 test_logger.warning("Route not removed")
 
     def remove_routes(self, ips: list[str]) -> None:
-        """Remove previously created routes"""
-        for ip_ in ips:
-            self.remove_route(ip_)
+        """Remove previously created routes by one round trip"""
+        # we must not remove Tempesta and server IPs because it's break the ssh connection
+        ips = [ip_ for ip_ in ips if self._check_ssh_ip_addr(ip_)]
+        test_logger.info(f"Removing routes for {ips}")
+
+        with self._dst_node.batch(env={"LANG": "C"}, check=False) as batch:
+            for ip_ in ips:
+                result = batch.ip(f"route del {ip_} dev {self._interface_name}")
+        if ips and not result.ok:
+            test_logger.warning(f"Some routes not removed: {result.stderr}")
 
 
 @contextmanager
@@ -288,9 +320,7 @@ def change_and_restore_tcp_options(
     with change_mtu_and_restore_interfaces(mtu=mtu, disable_pmtu=False) as networkers:
         try:
             for networker in networkers:
-                for option_name, option_val in tcp_options.items():
-                    networker.save_tcp_option(option_name)
-                    networker.set_tcp_option(option_name, option_val)
+                networker.change_tcp_options(tcp_options)
             yield networkers
         finally:
             for networker in networkers:
@@ -7,15 +7,21 @@ on the same node (developer test case), or on separate machines (CI case).
 
 import abc
 import asyncio
+import concurrent.futures
+import contextlib
+import dataclasses
 import errno
+import hashlib
 import logging
 import multiprocessing
 import os
 import re
 import shutil
 import subprocess
+import threading
 import time
-from typing import Optional, Union
+import uuid
+from typing import IO, Callable, Iterator, Optional, Union
 
 import paramiko
 
@@ -36,6 +42,151 @@ DEBUG_FILES = False
 # TODO may be a good candidate to declare it where all constants are declared (in the future).
 DEFAULT_TIMEOUT = 10
 
+# The maximum number of SSH channels of a remote node: commands run concurrently by `run_cmds()`
+# and `arun_cmd()`, the SFTP session and commands started by `stream_cmd()`. It's less than
+# the default `MaxSessions 10` of sshd, which limits channels of one SSH connection.
+MAX_CONCURRENT_CMDS = 8
+
+# Interval of SSH keepalive messages (seconds), so idle connections are not dropped by NAT
+# and firewalls between test runs.
+SSH_KEEPALIVE_INTERVAL = 30
+
+# Files are uploaded by chunks of the size, so big files are not copied in SSH buffers at once.
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+@dataclasses.dataclass
+class BatchResult:
+    """The result of a command of `CommandBatch`, it's filled when the batch is run."""
+
+    cmd: str
+    stdout: bytes = b""
+    stderr: bytes = b""
+    # None if the batch wasn't run or was interrupted before the command
+    rt: Optional[int] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.rt == 0
+
+
+class CommandBatch:
+    """
+    Commands collected by `ANode.batch()` and run sequentially by one shell invocation,
+    so a batch costs one round trip to a remote node. The output of each command
+    is split from others by unique delimiter lines.
+
+    Lines for `ip -batch` and settings for `sysctl -p` are collected to one `ip` or
+    `sysctl` command, placed at the position of the first added line, so all of them
+    share one result. The script is passed to the shell by stdin, so its size isn't
+    limited by the size of a command line.
+    """
+
+    def __init__(self, node: "ANode"):
+        self._node = node
+        self._delim = f"__tfw_batch_{uuid.uuid4().hex}__"
+        self._cmds: list[str] = []
+        self.results: list[BatchResult] = []
+        self._ip_lines: list[str] = []
+        self._ip_result: Optional[BatchResult] = None
+        self._sysctl_lines: list[str] = []
+        self._sysctl_result: Optional[BatchResult] = None
+
+    def add(self, cmd: str) -> BatchResult:
+        """Add a shell command and return its result, which is filled by `run()`."""
+        result = BatchResult(cmd)
+        self._cmds.append(cmd)
+        self.results.append(result)
+        return result
+
+    def ip(self, line: str) -> BatchResult:
+        """Add a command for `ip -batch`, e.g. 'address add 10.0.0.1/24 dev eth0'."""
+        if self._ip_result is None:
+            self._ip_result = self.add("ip -force -batch -")
+        self._ip_lines.append(line)
+        return self._ip_result
+
+    def sysctl(self, name: str, value) -> BatchResult:
+        """Add a kernel parameter for `sysctl -p -`."""
+        if self._sysctl_result is None:
+            self._sysctl_result = self.add("sysctl -p -")
+        self._sysctl_lines.append(f"{name} = {value}")
+        return self._sysctl_result
+
+    def _script(self, env: Optional[dict]) -> str:
+        # `env` of `RemoteNode.run_cmd()` is applied to the first command only
+        lines = [f"export {name}='{value}'" for name, value in (env or {}).items()]
+        for i, result in enumerate(self.results):
+            cmd = result.cmd
+            if result is self._ip_result:
+                cmd = self.__heredoc(cmd, self._ip_lines)
+            elif result is self._sysctl_result:
+                cmd = self.__heredoc(cmd, self._sysctl_lines)
+            else:
+                # a subshell, so `exit` or `cd` of a command doesn't affect next commands
+                cmd = f"( {cmd}\n) < /dev/null"
+            lines.append(
+                f"printf '\\n{self._delim}:{i}:begin\\n'; "
+                f"printf '\\n{self._delim}:{i}:begin\\n' >&2\n"
+                f"{cmd}\n"
+                f"printf '\\n{self._delim}:{i}:%d\\n' $?"
+            )
+        return "\n".join(lines)
+
+    def __heredoc(self, cmd: str, lines: list[str]) -> str:
+        return f"{cmd} <<'{self._delim}'\n" + "\n".join(lines) + f"\n{self._delim}"
+
+    def _parse(self, stdout: bytes, stderr: bytes) -> None:
+        delim = re.compile(rb"\n" + self._delim.encode() + rb":(\d+):(begin|\d+)\n")
+
+        start = 0
+        for match in delim.finditer(stdout):
+            result = self.results[int(match.group(1))]
+            if match.group(2) == b"begin":
+                start = match.end()
+            else:
+                result.stdout = stdout[start : match.start()]
+                result.rt = int(match.group(2))
+
+        matches = list(delim.finditer(stderr))
+        for match, next_match in zip(matches, matches[1:] + [None]):
+            end = next_match.start() if next_match else len(stderr)
+            self.results[int(match.group(1))].stderr = stderr[match.end() : end]
+
+    def run(
+        self,
+        timeout: Union[int, float, None] = DEFAULT_TIMEOUT,
+        env: Optional[dict] = None,
+        check: bool = True,
+    ) -> list[BatchResult]:
+        """
+        Run all commands, each command is run even if previous commands failed.
+        `timeout` is for each command, the batch is run for `timeout` multiplied
+        by the number of commands.
+
+        Raises:
+            error.ProcessBadExitStatusException: if `check` is set and a command failed,
+                for the first failed command
+        """
+        if not self._cmds:
+            return self.results
+        if timeout is not None:
+            timeout *= len(self._cmds)
+        stdout, stderr = self._node.run_cmd(
+            "sh -s", timeout=timeout, stdin=self._script(env).encode()
+        )
+        self._parse(stdout, stderr)
+        if check:
+            for result in self.results:
+                if not result.ok:
+                    raise error.ProcessBadExitStatusException(
+                        f"The '{result.cmd}' command of a batch failed.",
+                        stdout=result.stdout,
+                        stderr=result.stderr,
+                        rt=result.rt,
+                    )
+        return self.results
+
 
 class ANode(object, metaclass=abc.ABCMeta):
     """Node abstract class."""
@@ -56,6 +207,8 @@ class ANode(object, metaclass=abc.ABCMeta):
         self.type = ntype
         self._numa_nodes_n: int = 0
         self._max_threads_n: int = 0
+        # SHA-256 digest and the state (see `_stat()`) of files written by `copy_file()`
+        self._uploads: dict[str, tuple] = {}
         self._init_loger("env")
 
     def _init_loger(self, name: str) -> None:
@@ -104,6 +257,7 @@ class ANode(object, metaclass=abc.ABCMeta):
         timeout: Union[int, float, None] = DEFAULT_TIMEOUT,
         env: Optional[dict] = None,
         is_blocking: bool = True,
+        stdin: Optional[bytes] = None,
     ) -> (bytes, bytes):
         """
         Run command.
@@ -113,11 +267,26 @@ class ANode(object, metaclass=abc.ABCMeta):
             timeout (Union[int, float, None]): command running timeout
             env (Optional[dict]): environment variables to execute command with
             is_blocking (bool): if True, run a command and wait for it, otherwise just start it (no read stdout, stderr)
+            stdin (Optional[bytes]): data for stdin of the command, it's closed after the data
 
         Returns:
             (tuple[bytes, bytes]): stdout, stderr
         """
 
+    @abc.abstractmethod
+    def stream_cmd(self, cmd: str) -> tuple[IO[bytes], Callable[[], None]]:
+        """
+        Start a long-running command, e.g. `journalctl -f`, and read its output as it's
+        produced.
+
+        Args:
+            cmd (str): command to run
+
+        Returns:
+            (tuple[IO[bytes], Callable[[], None]]): stdout of the command and a function
+                to stop the command, stdout returns EOF after the stop
+        """
+
     @abc.abstractmethod
     def mkdir(self, path: str):
         """
@@ -146,6 +315,32 @@ class ANode(object, metaclass=abc.ABCMeta):
             filename (str): filename to remove
         """
 
+    @abc.abstractmethod
+    def _stat(self, filename: str) -> Optional[tuple]:
+        """
+        Size, inode and mtime with nanoseconds of a file, None if the file doesn't exist.
+        A rewritten file has another state unless it's rewritten in the same clock tick.
+        """
+
+    @staticmethod
+    def _encode_content(content: Union[str, bytes]) -> tuple[bytes, str]:
+        data = content.encode() if isinstance(content, str) else content
+        return data, hashlib.sha256(data).hexdigest()
+
+    def _is_uploaded(self, filename: str, digest: str) -> bool:
+        """
+        Whether the file was written by `copy_file()` with the same content and wasn't
+        changed after it, so it may not be written again.
+        """
+        upload = self._uploads.get(filename)
+        if upload is None or upload[0] != digest:
+            return False
+        if self._stat(filename) != upload[1]:
+            del self._uploads[filename]
+            return False
+        self._logger.debug(f"File `{filename}` is not changed, skip copying.")
+        return True
+
     @abc.abstractmethod
     async def wait_available(self) -> bool:
         """
@@ -165,6 +360,58 @@ class ANode(object, metaclass=abc.ABCMeta):
             (dest_dir): destination directory
         """
 
+    async def arun_cmd(
+        self,
+        cmd: str,
+        timeout: Union[int, float, None] = DEFAULT_TIMEOUT,
+        env: Optional[dict] = None,
+    ) -> tuple[bytes, bytes]:
+        """
+        Same as `run_cmd`, but doesn't block the event loop, so independent commands
+        may run concurrently, e.g. by `asyncio.gather()`.
+        """
+        return await asyncio.to_thread(self.run_cmd, cmd, timeout, env)
+
+    def run_cmds(
+        self,
+        cmds: list[str],
+        timeout: Union[int, float, None] = DEFAULT_TIMEOUT,
+        env: Optional[dict] = None,
+    ) -> list[tuple[bytes, bytes]]:
+        """
+        Run independent commands concurrently.
+
+        Returns:
+            (list[tuple[bytes, bytes]]): stdout and stderr of the commands in the order of `cmds`
+
+        Raises:
+            The exception of the first failed command in the order of `cmds`,
+            it's raised after all commands are finished.
+        """
+        if len(cmds) == 1:
+            return [self.run_cmd(cmds[0], timeout, env)]
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(cmds), MAX_CONCURRENT_CMDS) or 1
+        ) as pool:
+            futures = [pool.submit(self.run_cmd, cmd, timeout, env) for cmd in cmds]
+            concurrent.futures.wait(futures)
+        return [future.result() for future in futures]
+
+    @contextlib.contextmanager
+    def batch(
+        self,
+        timeout: Union[int, float, None] = DEFAULT_TIMEOUT,
+        env: Optional[dict] = None,
+        check: bool = True,
+    ) -> Iterator[CommandBatch]:
+        """
+        Collect commands and run them by one shell invocation on exit from the context,
+        see `CommandBatch`. Commands are not run if the context exits with an exception.
+        """
+        batch = CommandBatch(self)
+        yield batch
+        batch.run(timeout=timeout, env=env, check=check)
+
     def get_max_thread_count(self) -> int:
         """
         Get number of max threads on a node.
@@ -213,6 +460,7 @@ class LocalNode(ANode):
         timeout: Union[int, float, None] = DEFAULT_TIMEOUT,
         env: Optional[dict] = None,
         is_blocking: bool = True,
+        stdin: Optional[bytes] = None,
     ) -> tuple[bytes, bytes]:
         """
         Run command.
@@ -222,6 +470,7 @@ class LocalNode(ANode):
             timeout (Union[int, float, None]): command running timeout
             env (Optional[dict]): environment variables to execute command with
             is_blocking (bool): if True, run a command and wait for it, otherwise just start it (no read stdout, stderr)
+            stdin (Optional[bytes]): data for stdin of the command, it's closed after the data
 
         Returns:
             (tuple[bytes, bytes]): stdout, stderr
@@ -245,9 +494,16 @@ class LocalNode(ANode):
         self._logger.debug(f"All environment variables after updating: {env_full}")
 
         std_arg = subprocess.PIPE if is_blocking else None
+        if stdin is not None:
+            self._logger.debug(f"STDIN for '{cmd}':\n{stdin.decode(errors='ignore')}")
 
         with subprocess.Popen(
-            cmd, shell=True, stdout=std_arg, stderr=std_arg, env=env_full
+            cmd,
+            shell=True,
+            stdin=subprocess.PIPE if stdin is not None else None,
+            stdout=std_arg,
+            stderr=std_arg,
+            env=env_full,
         ) as current_proc:
             try:
                 # TODO #120: we should provide kill() and pid() interfaces to
@@ -257,7 +513,7 @@ class LocalNode(ANode):
                 # runnng long enough, e.g. tls-perf or wrk started in a parallel
                 # thread didn't finish before all assumptions are checked in the
                 # main thread.
-                stdout, stderr = current_proc.communicate(timeout=timeout)
+                stdout, stderr = current_proc.communicate(stdin, timeout=timeout)
 
             except subprocess.TimeoutExpired as to_exc:
                 current_proc.kill()
@@ -289,6 +545,16 @@ class LocalNode(ANode):
 
         return stdout, stderr
 
+    def stream_cmd(self, cmd: str) -> tuple[IO[bytes], Callable[[], None]]:
+        self._logger.info(f"'{cmd}' (streaming)")
+        proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+        def stop():
+            proc.kill()
+            proc.wait()
+
+        return proc.stdout, stop
+
     def mkdir(self, path: str):
         """
         Create directory on a node.
@@ -311,14 +577,38 @@ class LocalNode(ANode):
         filename = os.path.join(self.workdir, filename)
         dirname = os.path.dirname(filename)
 
+        data, digest = self._encode_content(content)
+        if self._is_uploaded(filename, digest):
+            return
+
         self._logger.debug(f"Copying file `{filename}`.")
 
         # assume that workdir exists to avoid unnecessary actions
         if dirname != self.workdir:
             self.mkdir(dirname)
 
-        with open(filename, "wt") as f:
-            f.write(content)
+        # readers never see a partially written file
+        tmp_filename = f"{filename}.{os.getpid()}.tmp"
+        with open(tmp_filename, "wb") as f:
+            f.write(data)
+        try:
+            # the replaced file keeps its mode and owner
+            shutil.copymode(filename, tmp_filename)
+            stat = os.stat(filename)
+            os.chown(tmp_filename, stat.st_uid, stat.st_gid)
+        except FileNotFoundError:
+            pass
+        except PermissionError:
+            self._logger.warning(f"Can't keep the owner of `{filename}`.")
+        os.replace(tmp_filename, filename)
+        self._uploads[filename] = (digest, self._stat(filename))
+
+    def _stat(self, filename: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_ino, stat.st_mtime_ns
 
     def remove_file(self, filename: str):
         """
@@ -332,6 +622,7 @@ class LocalNode(ANode):
 
         else:
             self._logger.debug(f"Removing `{filename}`.")
+            self._uploads.pop(filename, None)
             try:
                 os.remove(filename)
             except FileNotFoundError:
@@ -389,6 +680,13 @@ class RemoteNode(ANode):
         self.port = port
         self._ssh_key: Optional[str] = ssh_key
         self._ssh: Optional[paramiko.SSHClient] = None
+        # all commands and the SFTP session are run by channels of one SSH connection,
+        # the number of concurrent channels is limited by sshd
+        self._channels = threading.BoundedSemaphore(MAX_CONCURRENT_CMDS)
+        self._connect_lock = threading.Lock()
+        # one SFTP session is used for all file operations, see `_get_sftp()`
+        self._sftp: Optional[paramiko.SFTPClient] = None
+        self._sftp_lock = threading.RLock()
         self._connect()
 
     def _connect(self):
@@ -409,6 +707,38 @@ class RemoteNode(ANode):
         else:
             self.__connect_by_loading_keys_from_system()
 
+        self._ssh.get_transport().set_keepalive(SSH_KEEPALIVE_INTERVAL)
+
+    def _get_ssh(self) -> paramiko.SSHClient:
+        """The SSH connection of the node, it's opened again if it was closed."""
+        transport = self._ssh.get_transport()
+        if transport is None or not transport.is_active():
+            with self._connect_lock:
+                transport = self._ssh.get_transport()
+                if transport is None or not transport.is_active():
+                    self._logger.warning(f"SSH connection to {self.host} is closed, reconnect")
+                    self._ssh.close()
+                    self._connect()
+        return self._ssh
+
+    def _get_sftp(self) -> paramiko.SFTPClient:
+        """
+        The SFTP session of the node, it's opened again if it was closed,
+        e.g. after reconnection. Must be called under `_sftp_lock`.
+        """
+        ssh = self._get_ssh()
+        if self._sftp is None:
+            # the channel of the session is held until the node is destroyed
+            self._channels.acquire()
+        if self._sftp is None or self._sftp.get_channel().closed:
+            try:
+                self._sftp = ssh.open_sftp()
+            except Exception:
+                if self._sftp is None:
+                    self._channels.release()
+                raise
+        return self._sftp
+
     def __connect_by_loading_keys_from_system(self):
         """Open SSH connection to a node by loading host keys from a system."""
         self._logger.info(
@@ -455,6 +785,7 @@ class RemoteNode(ANode):
         timeout: Union[int, float, None] = DEFAULT_TIMEOUT,
         env: Optional[dict] = None,
         is_blocking: bool = True,
+        stdin: Optional[bytes] = None,
     ) -> tuple[bytes, bytes]:
         """
         Run command.
@@ -464,6 +795,7 @@ class RemoteNode(ANode):
             timeout (Union[int, float, None]): command running timeout
             env (Optional[dict]): environment variables to execute command with
             is_blocking (bool): if True, run a command and wait for it, otherwise just start it (no read stdout, stderr)
+            stdin (Optional[bytes]): data for stdin of the command, it's closed after the data
                 no effect for the method, all calls are blocking
 
         Returns:
@@ -487,26 +819,34 @@ class RemoteNode(ANode):
         if not is_blocking:
             self._logger.debug("***NON-BLOCKING (no wait to finish)***")
         self._logger.debug(f"All environment variables after updating: {env}")
+        if stdin is not None:
+            self._logger.debug(f"STDIN for '{cmd}':\n{stdin.decode(errors='ignore')}")
 
         try:
             # TODO #120: the same as for LocalNode - provide an interface to check
             # whether the command is executed and when it's terminated and/or
             # kill it when necessary.
-            _, out_f, err_f = self._ssh.exec_command(cmd, timeout=timeout)
-            stdout = out_f.read()
-            stderr = err_f.read()
+            with self._channels:
+                in_f, out_f, err_f = self._get_ssh().exec_command(cmd, timeout=timeout)
+                if stdin is not None:
+                    in_f.write(stdin)
+                    in_f.flush()
+                    in_f.channel.shutdown_write()
+                stdout = out_f.read()
+                stderr = err_f.read()
+                exit_status = out_f.channel.recv_exit_status()
 
         except Exception as exc:
             err_msg = (f"Error running command `{cmd}` on {self.host}",)
             self._logger.exception(err_msg)
             raise error.CommandExecutionException(err_msg) from exc
 
-        if out_f.channel.recv_exit_status() != 0:
+        if exit_status != 0:
             raise error.ProcessBadExitStatusException(
                 f"The '{cmd}' command via SSH failed.",
                 stdout=stdout,
                 stderr=stderr,
-                rt=out_f.channel.recv_exit_status(),
+                rt=exit_status,
             )
 
         if stdout:
@@ -516,6 +856,25 @@ class RemoteNode(ANode):
 
         return stdout, stderr
 
+    def stream_cmd(self, cmd: str) -> tuple[IO[bytes], Callable[[], None]]:
+        # the channel is counted in `_channels` until the command is stopped
+        self._logger.info(f"'{cmd}' (streaming)")
+        self._channels.acquire()
+        try:
+            channel = self._get_ssh().get_transport().open_session()
+            channel.exec_command(cmd)
+        except Exception:
+            self._channels.release()
+            raise
+        stopped = threading.Lock()
+
+        def stop() -> None:
+            channel.close()
+            if stopped.acquire(blocking=False):
+                self._channels.release()
+
+        return channel.makefile("rb"), stop
+
     def mkdir(self, path: str):
         """
         Create directory on a node.
@@ -538,19 +897,28 @@ class RemoteNode(ANode):
         filename = os.path.join(self.workdir, filename)
         dirname = os.path.dirname(filename)
 
-        self._logger.debug(f"Copying file by sftp `{filename}`.")
-
-        # assume that workdir exists to avoid unnecessary actions
-        if dirname != self.workdir:
-            self.mkdir(dirname)
+        data, digest = self._encode_content(content)
 
         try:
-            sftp = self._ssh.open_sftp()
-            sfile = sftp.file(filename, "wt", -1)
-            sfile.write(content)
-            sfile.flush()
-            sftp.close()
+            with self._sftp_lock:
+                if self._is_uploaded(filename, digest):
+                    return
+
+                self._logger.debug(f"Copying file by sftp `{filename}`.")
+
+                # assume that workdir exists to avoid unnecessary actions
+                if dirname != self.workdir:
+                    self.mkdir(dirname)
+
+                with self._get_sftp().file(filename, "wb") as sfile:
+                    # don't wait for the status of each write, errors are checked on close
+                    sfile.set_pipelined(True)
+                    for offset in range(0, len(data), UPLOAD_CHUNK_SIZE):
+                        sfile.write(data[offset : offset + UPLOAD_CHUNK_SIZE])
+                    sfile.flush()
+                self._uploads[filename] = (digest, self._stat(filename))
         except Exception as copy_exc:
+            self._uploads.pop(filename, None)
             self._logger.exception(
                 f"Error copying file `{filename}` to {self.host}: {copy_exc}",
             )
@@ -568,14 +936,19 @@ class RemoteNode(ANode):
         else:
             self._logger.debug(f"Removing `{filename}`.")
 
-            sftp = self._ssh.open_sftp()
-            try:
-                sftp.unlink(filename)
-            except IOError as e:
-                if e.errno != errno.ENOENT:
-                    self._logger.warning(f"Removing `{filename}`: file not found")
+            with self._sftp_lock:
+                self._uploads.pop(filename, None)
+                try:
+                    self._get_sftp().unlink(filename)
+                except IOError as e:
+                    if e.errno != errno.ENOENT:
+                        self._logger.warning(f"Removing `{filename}`: file not found")
 
-            sftp.close()
+    def _stat(self, filename: str) -> Optional[tuple]:
+        # SFTP has mtime in seconds only
+        out, _ = self.run_cmd(f"stat -c '%s %i %y' {filename} 2>/dev/null || true")
+        out = out.strip()
+        return (out.decode(),) if out else None
 
     async def wait_available(self) -> bool:
         """
@@ -596,7 +969,7 @@ class RemoteNode(ANode):
                 self._logger.error(f"Node {self.type} is not available, host {self.host}")
                 return False
 
-            res, _ = self.run_cmd("echo -n check", timeout=1)
+            res, _ = await self.arun_cmd("echo -n check", timeout=1)
 
             if res.decode() == "check":
                 self._logger.debug(f"Node {self.type} is available, host {self.host}")
@@ -614,21 +987,15 @@ class RemoteNode(ANode):
         """
         self._logger.debug(f"Copying `{file}` to a node with destination `{dest_dir}`")
         try:
-            sftp = self._ssh.open_sftp()
-
             self._change_perm(target=dest_dir)
 
-            sftp.put(file, dest_dir)
-            sftp.close()
+            with self._sftp_lock:
+                self._get_sftp().put(file, dest_dir)
         except Exception:
             self._logger.exception(f"Error copying file {file} to {self.host}")
 
     def exists(self, path: str) -> bool:
-        try:
-            self._ssh.open_sftp().stat(path)
-            return True
-        except FileNotFoundError:
-            return False
+        return self._stat(path) is not None
 
 
 def create_node(host_type: str):
@@ -668,7 +1035,4 @@ async def wait_available():
     global tempesta
     global clickhouse
 
-    for node in [tempesta, clickhouse]:
-        if not await node.wait_available():
-            return False
-    return True
+    return all(await asyncio.gather(tempesta.wait_available(), clickhouse.wait_available()))
@@ -4,6 +4,7 @@ Utils for the testing framework.
 
 import asyncio
 import inspect
+import threading
 import time
 import typing
 from string import Template
@@ -21,24 +22,110 @@ def __adjust_timeout_for_tcp_segmentation(timeout: int) -> int:
     return timeout
 
 
+class _Waiter:
+    __slots__ = ("loop", "event", "scheduled")
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        # a wake up is scheduled in the loop, so notifications are coalesced
+        self.scheduled = False
+
+    def wake(self) -> None:
+        self.scheduled = False
+        self.event.set()
+
+
+class Notifier:
+    """
+    Thread-safe notifications about state changes, e.g. received responses, which wake up
+    `wait_until()` as soon as the state is changed. The state may be changed in the deproxy
+    manager thread, the notification must be sent after the change. Notifications are
+    forwarded to the `parent` notifier.
+    """
+
+    def __init__(self, parent: typing.Optional["Notifier"] = None):
+        self.parent = parent
+        self._waiters: list[_Waiter] = []
+        self._lock = threading.Lock()
+
+    def notify(self) -> None:
+        # it's called for each network event, so it must be cheap without waiters
+        if self._waiters:
+            with self._lock:
+                waiters = list(self._waiters)
+            try:
+                running_loop = asyncio.get_running_loop()
+            except RuntimeError:
+                running_loop = None
+            for waiter in waiters:
+                if waiter.loop is running_loop:
+                    waiter.event.set()
+                elif not waiter.scheduled:
+                    waiter.scheduled = True
+                    waiter.loop.call_soon_threadsafe(waiter.wake)
+        if self.parent is not None:
+            self.parent.notify()
+
+    def _add_waiter(self) -> _Waiter:
+        waiter = _Waiter()
+        with self._lock:
+            self._waiters.append(waiter)
+        return waiter
+
+    def _remove_waiter(self, waiter: _Waiter) -> None:
+        with self._lock:
+            self._waiters.remove(waiter)
+
+
+# Notified about changes of all deproxy clients and servers.
+deproxy_notifier = Notifier()
+
+# Waits with a notifier check the condition with this interval too, in case
+# of changes without notifications, e.g. the service state.
+NOTIFIED_POLL_INTERVAL = 0.1
+
+
 async def wait_until(
     wait_cond: typing.Callable,
     timeout=5,
     abort_cond: typing.Callable = lambda: False,
     adjust_timeout: bool = False,
+    notifier: typing.Optional[Notifier] = None,
+    poll_interval: typing.Optional[float] = None,
 ) -> typing.Optional[bool]:
+    """
+    Wait until `wait_cond` becomes False. The condition is checked each `poll_interval`
+    seconds and when `notifier` is notified, if it's passed.
+    """
     t0 = time.time()
 
     if adjust_timeout:
         timeout = __adjust_timeout_for_tcp_segmentation(timeout)
-
-    while wait_cond():
-        t = time.time()
-        if t - t0 > timeout:
-            return not wait_cond()  # check wait_cond for the last time
-        if abort_cond():
-            return None
-        await asyncio.sleep(run_config.asyncio_freq)
+    if poll_interval is None:
+        poll_interval = run_config.asyncio_freq if notifier is None else NOTIFIED_POLL_INTERVAL
+
+    waiter = notifier._add_waiter() if notifier is not None else None
+    try:
+        while wait_cond():
+            t = time.time()
+            if t - t0 > timeout:
+                return not wait_cond()  # check wait_cond for the last time
+            if abort_cond():
+                return None
+            if waiter is None:
+                await asyncio.sleep(poll_interval)
+                continue
+            try:
+                await asyncio.wait_for(
+                    waiter.event.wait(), min(poll_interval, timeout - (t - t0))
+                )
+            except asyncio.TimeoutError:
+                pass
+            waiter.event.clear()
+    finally:
+        if waiter is not None:
+            notifier._remove_waiter(waiter)
 
     return True
 
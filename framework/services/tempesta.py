@@ -2,10 +2,12 @@ __author__ = "Tempesta Technologies, Inc."
 __copyright__ = "Copyright (C) 2017-2026 Tempesta Technologies, Inc."
 __license__ = "GPL2"
 
+import asyncio
 import dataclasses
 import json
 import os
 import re
+import time
 import typing
 from typing import Optional
 
@@ -64,6 +66,41 @@ class Stats(object):
     """Parser for TempestaFW performance statistics (/proc/tempesta/perfstat)."""
 
     _stats_path = "/proc/tempesta/perfstat"
+    # names of fields in perfstat by attribute names
+    _fields = {
+        "SS pfl hits": "ss_pfl_hits",
+        "SS pfl misses": "ss_pfl_misses",
+        "SS work queue full": "ss_work_queue_full",
+        "Cache hits": "cache_hits",
+        "Cache misses": "cache_misses",
+        "Cache objects": "cache_objects",
+        "Cache bytes": "cache_bytes",
+        "Client messages received": "cl_msg_received",
+        "Client messages forwarded": "cl_msg_forwarded",
+        "Client messages served from cache": "cl_msg_served_from_cache",
+        "Client messages parsing errors": "cl_msg_parsing_errors",
+        "Client messages filtered out": "cl_msg_filtered_out",
+        "Client messages other errors": "cl_msg_other_errors",
+        "Client connection attempts": "cl_conn_attempts",
+        "Client established connections": "cl_established_connections",
+        "Client connections active": "cl_conns_active",
+        "Client RX bytes": "cl_rx_bytes",
+        "Client priority frames number exceeded": "cl_priority_frame_exceeded",
+        "Client rst frames number exceeded": "cl_rst_frame_exceeded",
+        "Client settings frames number exceeded": "cl_settings_frame_exceeded",
+        "Client ping frames number exceeded": "cl_ping_frame_exceeded",
+        "Client window update frames number exceeded": "cl_wnd_update_frame_exceeded",
+        "Server messages received": "srv_msg_received",
+        "Server messages forwarded": "srv_msg_forwarded",
+        "Server messages parsing errors": "srv_msg_parsing_errors",
+        "Server messages filtered out": "srv_msg_filtered_out",
+        "Server messages other errors": "srv_msg_other_errors",
+        "Server connection attempts": "srv_conn_attempts",
+        "Server established connections": "srv_established_connections",
+        "Server connections active": "srv_conns_active",
+        "Server RX bytes": "srv_rx_bytes",
+    }
+    _field_re = re.compile(r"^\s*([^\n:]*?)\s+: (\d+)", re.MULTILINE)
 
     def __init__(self):
         self.ss_pfl_hits: int = 0
@@ -113,56 +150,26 @@ class Stats(object):
     def clear(self) -> None:
         self.__init__()
 
-    def parse(self, stats: str) -> None:
-        self.ss_pfl_hits = self.parse_option(stats, "SS pfl hits")
-        self.ss_pfl_misses = self.parse_option(stats, "SS pfl misses")
-        self.ss_work_queue_full = self.parse_option(stats, "SS work queue full")
-
-        self.cache_hits = self.parse_option(stats, "Cache hits")
-        self.cache_misses = self.parse_option(stats, "Cache misses")
-        self.cache_objects = self.parse_option(stats, "Cache objects")
-        self.cache_bytes = self.parse_option(stats, "Cache bytes")
-
-        self.cl_msg_received = self.parse_option(stats, "Client messages received")
-        self.cl_msg_forwarded = self.parse_option(stats, "Client messages forwarded")
-        self.cl_msg_served_from_cache = self.parse_option(
-            stats, "Client messages served from cache"
-        )
-        self.cl_msg_parsing_errors = self.parse_option(stats, "Client messages parsing errors")
-        self.cl_msg_filtered_out = self.parse_option(stats, "Client messages filtered out")
-        self.cl_msg_other_errors = self.parse_option(stats, "Client messages other errors")
-        self.cl_conn_attempts = self.parse_option(stats, "Client connection attempts")
-        self.cl_established_connections = self.parse_option(stats, "Client established connections")
-        self.cl_conns_active = self.parse_option(stats, "Client connections active")
-        self.cl_rx_bytes = self.parse_option(stats, "Client RX bytes")
-        self.cl_priority_frame_exceeded = self.parse_option(
-            stats, "Client priority frames number exceeded"
-        )
-        self.cl_rst_frame_exceeded = self.parse_option(stats, "Client rst frames number exceeded")
-        self.cl_settings_frame_exceeded = self.parse_option(
-            stats, "Client settings frames number exceeded"
-        )
-        self.cl_ping_frame_exceeded = self.parse_option(stats, "Client ping frames number exceeded")
-        self.cl_wnd_update_frame_exceeded = self.parse_option(
-            stats, "Client window update frames number exceeded"
-        )
-
-        self.srv_msg_received = self.parse_option(stats, "Server messages received")
-        self.srv_msg_forwarded = self.parse_option(stats, "Server messages forwarded")
-        self.srv_msg_parsing_errors = self.parse_option(stats, "Server messages parsing errors")
-        self.srv_msg_filtered_out = self.parse_option(stats, "Server messages filtered out")
-        self.srv_msg_other_errors = self.parse_option(stats, "Server messages other errors")
-        self.srv_conn_attempts = self.parse_option(stats, "Server connection attempts")
-        self.srv_established_connections = self.parse_option(
-            stats, "Server established connections"
-        )
-        self.srv_conns_active = self.parse_option(stats, "Server connections active")
-        self.srv_rx_bytes = self.parse_option(stats, "Server RX bytes")
+    def parse(self, stats: bytes) -> None:
+        values = self.parse_values(stats)
+        for name in self._fields.values():
+            setattr(self, name, values.get(name, -1))
 
         s = r"HTTP '(\d+)' code\s+: (\d+)"
         matches = re.findall(s.encode("ascii"), stats)
         self.health_statuses = {int(status): int(total) for status, total in matches}
 
+    @classmethod
+    def parse_values(cls, stats: bytes) -> dict[str, int]:
+        """
+        Parse all numeric fields by one pass. Known fields are keyed by attribute names,
+        e.g. 'cl_msg_forwarded', others by their names in the file.
+        """
+        return {
+            cls._fields.get(name, name): int(value)
+            for name, value in cls._field_re.findall(stats.decode(errors="ignore"))
+        }
+
     @staticmethod
     def parse_option(stats: str, name: str) -> int:
         s = r"%s\s+: (\d+)" % name
@@ -172,6 +179,80 @@ class Stats(object):
         return -1
 
 
+class StatsSampler:
+    """
+    Read perfstat each `interval` seconds in the background and keep the time series,
+    so stress tests may check rates, e.g. forwarded messages per second, without
+    SSH calls in the test. Use it as an async context manager or by `start()`/`stop()`.
+    Samples are dicts of `Stats.parse_values()`.
+    """
+
+    def __init__(self, interval: float = 1.0, node: Optional[remote.ANode] = None):
+        self.interval = interval
+        self.node = node or remote.tempesta
+        # (monotonic time, values)
+        self.samples: list[tuple[float, dict[str, int]]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def __aenter__(self) -> "StatsSampler":
+        self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.stop()
+
+    async def _run(self) -> None:
+        while True:
+            t0 = time.monotonic()
+            try:
+                out, _ = await self.node.arun_cmd(f"cat {Stats._stats_path}")
+            except error.BaseCmdException as e:
+                # e.g. Tempesta isn't started yet
+                tf_cfg.test_logger.debug(f"Can't read Tempesta stats: {e}")
+            else:
+                t1 = time.monotonic()
+                self.samples.append(((t0 + t1) / 2, Stats.parse_values(out)))
+            await asyncio.sleep(max(self.interval - (time.monotonic() - t0), 0))
+
+    def series(self, key: str) -> list[tuple[float, int]]:
+        return [(t, values[key]) for t, values in self.samples if key in values]
+
+    def rates(self, key: str) -> list[tuple[float, float]]:
+        """Per-second deltas of the field between consecutive samples."""
+        series = self.series(key)
+        return [(t1, (v1 - v0) / (t1 - t0)) for (t0, v0), (t1, v1) in zip(series, series[1:])]
+
+    def rate(self, key: str) -> float:
+        """The average per-second delta of the field over all samples."""
+        series = self.series(key)
+        if len(series) < 2:
+            return 0.0
+        (t0, v0), (t1, v1) = series[0], series[-1]
+        return (v1 - v0) / (t1 - t0)
+
+    def cache_hit_rates(self) -> list[tuple[float, float]]:
+        """The ratio of cache hits to cache lookups between consecutive samples."""
+        hits = self.series("cache_hits")
+        misses = dict(self.series("cache_misses"))
+        result = []
+        for (t0, h0), (t1, h1) in zip(hits, hits[1:]):
+            lookups = h1 - h0 + misses.get(t1, 0) - misses.get(t0, 0)
+            result.append((t1, (h1 - h0) / lookups if lookups else 0.0))
+        return result
+
+
 class ServerStats(object):
     def __init__(self, tempesta, sg_name: str, srv_ip: str, srv_port: str | int):
         self._tempesta = tempesta
@@ -300,6 +381,8 @@ class Config(object):
         self._tls_certificate: Optional[str] = None
         self._tls_certificate_key: Optional[str] = None
         self.mmap: Optional[str] = None
+        # the cache mode is not 0, it's parsed once for each config
+        self.cache_on: bool = False
 
     @property
     def defconfig(self) -> str:
@@ -414,6 +497,8 @@ class Config(object):
         self._tls_certificate_key = _cfg.get("tls_certificate_key", None)
         if "mmap" in _cfg.get("access_log", ""):
             self.mmap = _cfg.get("access_log", "")
+        cache = re.search(r"cache ([012]);", self.defconfig)
+        self.cache_on = bool(int(cache.group(1)) if cache else 0)
 
     def set_defconfig(
         self, config: str, custom_cert: bool = False, tfw_config: Optional[TfwLogger] = None
@@ -13,7 +13,12 @@ from typing import Callable, Optional, Union
 from unittest.util import strclass
 
 import run_config
-from framework.deproxy import deproxy_client, deproxy_manager
+from framework.deproxy import (
+    deproxy_client,
+    deproxy_manager,
+    deproxy_pool,
+    deproxy_recorder,
+)
 from framework.deproxy.deproxy_auto_parser import DeproxyAutoParser
 from framework.deproxy.deproxy_server import StaticDeproxyServer, deproxy_srv_factory
 from framework.helpers import clickhouse, dmesg, error, remote, tf_cfg, util
@@ -35,6 +40,7 @@ __license__ = "GPL2"
 
 
 backend_defs = {}
+DEPROXY_CLIENT_TYPES = ["deproxy", "deproxy_h2", "deproxy_async", "deproxy_h2_async"]
 tempesta_defs = {"tempesta": tfw.Tempesta, "tempesta_fi": tfw.TempestaFI}
 save_tcpdump = False
 last_test_id = ""
@@ -64,6 +70,16 @@ class TempestaLoggers:
 
 
 class WaitUntilAsserts(unittest.TestCase):
+    @staticmethod
+    async def _wait_until(wait_cond: Callable, timeout: int) -> Optional[bool]:
+        """Deproxy changes wake up the wait at once, other conditions are polled as usual."""
+        return await util.wait_until(
+            wait_cond,
+            timeout,
+            notifier=util.deproxy_notifier,
+            poll_interval=run_config.asyncio_freq,
+        )
+
     async def assertWaitUntilEqual(
         self,
         func: Callable,
@@ -71,7 +87,7 @@ class WaitUntilAsserts(unittest.TestCase):
         msg: str = None,
         timeout: int = 5,
     ):
-        success = await util.wait_until(wait_cond=lambda: func() != second, timeout=timeout)
+        success = await self._wait_until(lambda: func() != second, timeout)
 
         if success:
             return None
@@ -89,7 +105,7 @@ class WaitUntilAsserts(unittest.TestCase):
         msg: str = None,
         timeout: int = 5,
     ):
-        success = await util.wait_until(wait_cond=lambda: func() == second, timeout=timeout)
+        success = await self._wait_until(lambda: func() == second, timeout)
 
         if success:
             return None
@@ -106,7 +122,7 @@ class WaitUntilAsserts(unittest.TestCase):
         msg: str = None,
         timeout: int = 5,
     ):
-        success = await util.wait_until(wait_cond=lambda: func() is None, timeout=timeout)
+        success = await self._wait_until(lambda: func() is None, timeout)
 
         if success:
             return None
@@ -120,7 +136,7 @@ class WaitUntilAsserts(unittest.TestCase):
         msg: str = None,
         timeout: int = 5,
     ):
-        success = await util.wait_until(wait_cond=lambda: len(func()) != count, timeout=timeout)
+        success = await self._wait_until(lambda: len(func()) != count, timeout)
 
         if success:
             return None
@@ -133,7 +149,7 @@ class WaitUntilAsserts(unittest.TestCase):
         msg: str = None,
         timeout: int = 5,
     ):
-        success = await util.wait_until(wait_cond=lambda: func() is False, timeout=timeout)
+        success = await self._wait_until(lambda: func() is False, timeout)
 
         if success:
             return None
@@ -146,7 +162,7 @@ class WaitUntilAsserts(unittest.TestCase):
         msg: str = None,
         timeout: int = 5,
     ):
-        success = await util.wait_until(wait_cond=lambda: func() is True, timeout=timeout)
+        success = await self._wait_until(lambda: func() is True, timeout)
 
         if success:
             return None
@@ -189,6 +205,8 @@ class TempestaTest(WaitUntilAsserts, unittest.IsolatedAsyncioTestCase):
         client_factories = {
             "deproxy_h2": deproxy_client.DeproxyClientH2,
             "deproxy": deproxy_client.DeproxyClient,
+            "deproxy_h2_async": deproxy_client.AsyncDeproxyClientH2,
+            "deproxy_async": deproxy_client.AsyncDeproxyClient,
         }
 
         return client_factories[client["type"]](
@@ -207,6 +225,24 @@ class TempestaTest(WaitUntilAsserts, unittest.IsolatedAsyncioTestCase):
             rcv_buf_size=client.get("rcv_buf_size", -1),
         )
 
+    def __create_client_deproxy_pool(self, client: dict, ssl: bool, bind_addrs: list[str]):
+        """
+        `conns_n` connections of "deproxy_h2" type if `h2` is True or "deproxy" otherwise.
+        The connections are spread over `bind_addrs`.
+        """
+        member = dict(client, type="deproxy_h2" if client.get("h2", False) else "deproxy")
+        clients = []
+        for i in range(client.get("conns_n", 1)):
+            member["id"] = f"{client['id']}-{i}"
+            clients.append(
+                self.__create_client_deproxy(member, ssl, bind_addrs[i % len(bind_addrs)])
+            )
+        return deproxy_pool.DeproxyClientPool(
+            id_=client["id"],
+            clients=clients,
+            balance=client.get("balance", deproxy_pool.BALANCE_ROUND_ROBIN),
+        )
+
     def __create_client_wrk(self, client, ssl):
         addr = fill_template(client["addr"], client)
         wrk = wrk_client.Wrk(id_=client["id"], server_addr=addr, ssl=ssl)
@@ -242,10 +278,10 @@ class TempestaTest(WaitUntilAsserts, unittest.IsolatedAsyncioTestCase):
         ctype = client["type"]
         test_logger.info(f"Creating client service with ID='{cid}' and TYPE='{ctype}'.")
         is_ipv6 = client.get("is_ipv6", False)
-        if is_ipv6 and client.get("interface", False):
+        if is_ipv6 and (client.get("interface", False) or client.get("interfaces", 0)):
             raise ValueError("The framework does not support interfaces for IPv6.")
         client_ip = tf_cfg.cfg.get("Client", "ipv6" if is_ipv6 else "ip")
-        if ctype in ["curl", "deproxy", "deproxy_h2"]:
+        if ctype in ["curl"] + DEPROXY_CLIENT_TYPES:
             if client.get("interface", False):
                 networker = NetWorker(node=remote.client)
                 _, bind_addr = networker.create_interface(len(self.__ips))
@@ -253,10 +289,34 @@ class TempestaTest(WaitUntilAsserts, unittest.IsolatedAsyncioTestCase):
                 self.__ips.append(bind_addr)
             else:
                 bind_addr = client_ip
-        if ctype in ["deproxy", "deproxy_h2"]:
+        if ctype in DEPROXY_CLIENT_TYPES:
             self.__clients[cid] = self.__create_client_deproxy(client, ssl, bind_addr)
             self.__clients[cid].set_rps(client.get("rps", 0))
+            if client.get("batch_send", False):
+                self.__clients[cid].batch_send = True
+            if "retention" in client:
+                self.__clients[cid].set_retention(
+                    client["retention"], client.get("retention_size", 1000)
+                )
             self.deproxy_manager.add_client(self.__clients[cid])
+        elif ctype == "deproxy_pool":
+            bind_addrs = [client_ip]
+            if client.get("interfaces", 0):
+                # spread the connections over several source IPs
+                networker = NetWorker(node=remote.client)
+                bind_addrs = []
+                for _ in range(client["interfaces"]):
+                    _, bind_addr = networker.create_interface(len(self.__ips))
+                    networker.create_route(bind_addr)
+                    self.__ips.append(bind_addr)
+                    bind_addrs.append(bind_addr)
+            self.__clients[cid] = self.__create_client_deproxy_pool(client, ssl, bind_addrs)
+            self.__clients[cid].set_rps(client.get("rps", 0))
+            for member in self.__clients[cid].clients:
+                member.batch_send = client.get("batch_send", False)
+                if "retention" in client:
+                    member.set_retention(client["retention"], client.get("retention_size", 1000))
+                self.deproxy_manager.add_client(member)
         elif ctype == "wrk":
             self.__clients[cid] = self.__create_client_wrk(client, ssl)
         elif ctype == "curl":
@@ -314,6 +374,7 @@ class TempestaTest(WaitUntilAsserts, unittest.IsolatedAsyncioTestCase):
     def get_client(self, cid) -> Union[
         deproxy_client.DeproxyClientH2,
         deproxy_client.DeproxyClient,
+        deproxy_pool.DeproxyClientPool,
         curl_client.CurlClient,
         external_client.ExternalTester,
         wrk_client.Wrk,
@@ -410,6 +471,7 @@ class TempestaTest(WaitUntilAsserts, unittest.IsolatedAsyncioTestCase):
         self.__servers = {}
         self.__clients = {}
         self.__tcpdump: subprocess.Popen = None
+        self.__test_filename: Optional[str] = None
         self.__ips = []
         self.__tempesta = None
         self.deproxy_manager = deproxy_manager.DeproxyManager()
@@ -423,12 +485,14 @@ class TempestaTest(WaitUntilAsserts, unittest.IsolatedAsyncioTestCase):
         self.__create_servers()
         self.__create_clients()
         self.__run_tcpdump()
+        self.__start_recording()
         # Cleanup part
         self.addAsyncCleanup(self.cleanup_check_memory_leaks)
         self.addAsyncCleanup(self.cleanup_deproxy_auto_parser)
         self.addAsyncCleanup(self.cleanup_check_exceptions_in_deproxy_auto_parser)
         self.addAsyncCleanup(self.cleanup_check_dmesg)
         self.addAsyncCleanup(self.cleanup_stop_tcpdump)
+        self.addAsyncCleanup(self.cleanup_stop_recording)
         self.addAsyncCleanup(self.cleanup_interfaces)
         self.addAsyncCleanup(self.cleanup_deproxy)
         self.addAsyncCleanup(self.cleanup_services)
@@ -476,8 +540,13 @@ class TempestaTest(WaitUntilAsserts, unittest.IsolatedAsyncioTestCase):
         test_logger.info("Cleanup: stopping tcpdump")
         self.__stop_tcpdump()
 
+    async def cleanup_stop_recording(self):
+        test_logger.info("Cleanup: stopping the deproxy traffic recording")
+        deproxy_recorder.stop()
+
     async def cleanup_check_dmesg(self):
         test_logger.info("Cleanup: checking dmesg")
+        await self.loggers.dmesg.sync()
         self.loggers.dmesg.update()
 
         test_logger.info(
@@ -552,10 +621,7 @@ class TempestaTest(WaitUntilAsserts, unittest.IsolatedAsyncioTestCase):
         """
         if save_tcpdump and self.__tcpdump is None:
             tempesta_ip = tf_cfg.cfg.get("Tempesta", "ip")
-            test_name = self.__update_tcpdump_filename()
-
-            if not os.path.isdir(build_path):
-                os.makedirs(build_path)
+            test_name = self.__get_test_filename()
 
             self.__tcpdump = subprocess.Popen(
                 [
@@ -572,6 +638,22 @@ class TempestaTest(WaitUntilAsserts, unittest.IsolatedAsyncioTestCase):
                 stderr=subprocess.PIPE,
             )
 
+    def __start_recording(self) -> None:
+        """
+        Record deproxy traffic of the test if `--record-traffic` option is used.
+        Save result in a <name>.rec file, see `deproxy_recorder`.
+        """
+        if run_config.RECORD_TRAFFIC:
+            deproxy_recorder.start(f"{build_path}/{self.__get_test_filename()}.rec")
+
+    def __get_test_filename(self) -> str:
+        """The name of result files of the test, the same for tcpdump and the recording."""
+        if self.__test_filename is None:
+            self.__test_filename = self.__update_tcpdump_filename()
+            if not os.path.isdir(build_path):
+                os.makedirs(build_path)
+        return self.__test_filename
+
     def __stop_tcpdump(self) -> None:
         """
         Stop tcpdump.
@@ -32,6 +32,13 @@ SAVE_SECRETS = False
 # size (bytes) of TCP segment. This uses only for deproxy client and server.
 TCP_SEGMENTATION = 0
 
+# record traffic of deproxy clients and servers to a file per test, see deproxy_recorder
+RECORD_TRAFFIC = False
+
+# Follow the kernel log of Tempesta node by one `journalctl -f` for the whole session
+# instead of reading the log by a new `journalctl` on each check, see dmesg.KernelLogFollower
+FOLLOW_KERNEL_LOG = True
+
 # Enable or disable deproxy auto parser. Enable if True
 AUTO_PARSER = True
 
@@ -0,0 +1,79 @@
+import types
+import unittest
+from unittest import mock
+
+from framework.deproxy import deproxy_auto_parser
+from framework.deproxy.deproxy_auto_parser import DeproxyAutoParser
+from framework.deproxy.deproxy_message import Request, Response
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+CLIENT = types.SimpleNamespace(bind_addr="127.0.0.1", conn_addr=None)
+
+
+class TestDeproxyAutoParserLoadMode(unittest.TestCase):
+    def setUp(self):
+        self.parser = DeproxyAutoParser(None, types.SimpleNamespace(cache_on=False))
+        self.parser.parsing = True
+        self.addCleanup(self.parser.cleanup)
+
+    def exchange(self, body: str) -> None:
+        """The server sends 'abc', but the client receives `body`."""
+        self.parser.prepare_expected_request(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n", CLIENT)
+        self.parser.prepare_expected_response(b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\nabc")
+        self.parser.check_expected_response(
+            Response(f"HTTP/1.1 200 OK\r\nContent-Length: {len(body)}\r\n\r\n{body}"),
+            is_http2=False,
+        )
+
+    def test_sample_rate(self):
+        self.parser.set_load_mode(sample_rate=0.5)
+        self.exchange("abd")
+        self.parser.check_exceptions()
+        self.exchange("abd")
+        with self.assertRaises(AssertionError):
+            self.parser.check_exceptions()
+
+    def test_offload(self):
+        self.parser.set_load_mode(offload=True)
+        for _ in range(10):
+            self.exchange("abc")
+        self.exchange("abd")
+        with self.assertRaises(AssertionError):
+            self.parser.check_exceptions()
+
+    def test_invalid_sample_rate(self):
+        with self.assertRaises(ValueError):
+            self.parser.set_load_mode(sample_rate=0)
+
+
+class TestDeproxyAutoParserRequests(unittest.TestCase):
+    def setUp(self):
+        self.parser = DeproxyAutoParser(None, types.SimpleNamespace(cache_on=False))
+        self.parser.parsing = True
+        self.addCleanup(self.parser.cleanup)
+
+    def test_reuse(self):
+        requests = [b"GET /%d HTTP/1.1\r\nHost: localhost\r\n\r\n" % (i % 2) for i in range(6)]
+        parsed = []
+
+        class ParsedRequest(Request):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                parsed.append(self)
+
+        with mock.patch.object(deproxy_auto_parser, "Request", ParsedRequest):
+            for request in requests:
+                self.parser.prepare_expected_request(request, CLIENT)
+            # the client request is already parsed
+            self.parser.prepare_expected_request(
+                b"GET /2 HTTP/1.1\r\n\r\n", CLIENT, message=Request("GET /2 HTTP/1.1\r\n\r\n")
+            )
+        self.assertEqual(len(parsed), 2)
+
+        received = Request("GET /2 HTTP/1.1\r\n\r\n")
+        self.parser.check_expected_request(received)
+        with self.assertRaises(AssertionError):
+            self.parser.check_exceptions()
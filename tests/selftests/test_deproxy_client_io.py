@@ -0,0 +1,430 @@
+import asyncio
+import hashlib
+import os
+import time
+import unittest
+
+import h2.config
+import h2.connection
+import h2.events
+
+from framework.deproxy import deproxy_body_sink, deproxy_client, deproxy_history, deproxy_schedule
+from tests.selftests.test_deproxy_server_io import PORT, create_server
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+
+class _AutoParser:
+    parsing = False
+
+
+def create_client(
+    client_cls=deproxy_client.DeproxyClient, port: int = 80
+) -> deproxy_client.BaseDeproxyClient:
+    return client_cls(
+        id_="deproxy",
+        deproxy_auto_parser=_AutoParser(),
+        port=port,
+        bind_addr="127.0.0.1",
+        segment_size=0,
+        segment_gap=0,
+        is_ipv6=False,
+        conn_addr="127.0.0.1",
+        is_ssl=False,
+        server_hostname=None,
+        rcv_buf_size=-1,
+    )
+
+
+class TestDeproxyClientRead(unittest.TestCase):
+    """Parsing of responses received by a lot of TCP segments without a connection."""
+
+    def setUp(self):
+        self.client = create_client()
+
+    def receive(self, data: bytes, segment_size: int) -> None:
+        segments = [data[i : i + segment_size] for i in range(0, len(data), segment_size)]
+
+        def recv_into(buffer):
+            segment = segments.pop(0)
+            buffer[: len(segment)] = segment
+            return len(segment)
+
+        self.client._recv_into = recv_into
+        while segments:
+            self.client._handle_read()
+
+    def test_content_length_by_bytes(self):
+        body = "x" * 100000
+        self.client.methods = ["GET", "GET"]
+        response = f"HTTP/1.1 200 OK\r\nContent-Length: {len(body)}\r\n\r\n{body}"
+        self.receive((response * 2).encode(), segment_size=1000)
+
+        self.assertEqual(len(self.client.responses), 2)
+        self.assertEqual(self.client.last_response.body, body)
+        self.assertEqual(self.client.response_buffer, b"")
+
+    def test_split_headers_terminator(self):
+        self.client.methods = ["GET"]
+        self.receive(b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\nabc", segment_size=1)
+
+        self.assertEqual(len(self.client.responses), 1)
+        self.assertEqual(self.client.last_response.body, "abc")
+
+    def test_bodyless_with_content_length(self):
+        self.client.methods = ["HEAD", "GET"]
+        self.receive(
+            b"HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\n"
+            b"HTTP/1.1 304 Not Modified\r\nContent-Length: 10\r\n\r\n",
+            segment_size=7,
+        )
+
+        self.assertEqual([r.status for r in self.client.responses], ["200", "304"])
+
+    def test_chunked(self):
+        self.client.methods = ["GET"]
+        self.receive(
+            b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"3\r\nabc\r\n0\r\n\r\n",
+            segment_size=5,
+        )
+
+        self.assertEqual(len(self.client.responses), 1)
+        self.assertEqual(self.client.last_response.body, "3\r\nabc\r\n0\r\n\r\n")
+
+    def test_multibyte_body(self):
+        body = "тест"
+        self.client.methods = ["GET", "GET"]
+        response = f"HTTP/1.1 200 OK\r\nContent-Length: {len(body.encode())}\r\n\r\n{body}"
+        self.receive((response * 2).encode(), segment_size=3)
+
+        self.assertEqual(len(self.client.responses), 2)
+        self.assertEqual(self.client.last_response.body, body)
+
+
+class TestDeproxyClientBatchSend(unittest.TestCase):
+    """Batched sending of request buffers without a connection."""
+
+    def setUp(self):
+        self.client = create_client()
+        self.client.batch_send = True
+        self.client._start_time = time.monotonic()
+        self.sent = []
+        self.limit = None
+
+        def sendmsg(buffers):
+            data = b"".join(buffers)[: self.limit]
+            self.sent.append(data)
+            return len(data)
+
+        self.client._sendmsg = sendmsg
+        for i in range(3):
+            self.client.send_bytes(f"request-{i};".encode())
+
+    def send_all(self) -> None:
+        while self.client._has_pending_data():
+            self.client._send_data()
+
+    def test_one_sendmsg(self):
+        self.send_all()
+
+        self.assertEqual(self.sent, [b"request-0;request-1;request-2;"])
+        self.assertEqual(self.client.request_buffers, [b"", b"", b""])
+
+    def test_partial_send(self):
+        self.limit = 15
+        self.send_all()
+
+        self.assertEqual(b"".join(self.sent), b"request-0;request-1;request-2;")
+        self.assertEqual(self.sent[0], b"request-0;reque")
+        self.assertEqual(self.client._cur_req_num, 3)
+
+    def test_segment_size(self):
+        self.client.segment_size = 4
+        # requests are sent one by one
+        self.client._send = lambda data: self.client._sendmsg([data])
+        self.send_all()
+
+        self.assertEqual(b"".join(self.sent), b"request-0;request-1;request-2;")
+        # a segment doesn't contain several requests
+        self.assertEqual(self.sent[:4], [b"requ", b"est-", b"0;", b"requ"])
+
+    def test_h2(self):
+        client = create_client(deproxy_client.DeproxyClientH2)
+        client.batch_send = False
+        with self.assertRaises(ValueError):
+            client.batch_send = True
+
+    def test_rps(self):
+        self.client.set_rps(1)
+        self.send_all()
+
+        self.assertEqual(self.sent, [b"request-0;"])
+        self.assertEqual(self.client._cur_req_num, 1)
+
+    def test_burst_schedule(self):
+        self.client.set_schedule(deproxy_schedule.BurstArrivals(burst_size=2, interval=10))
+        self.send_all()
+
+        self.assertEqual(self.sent, [b"request-0;request-1;"])
+        self.assertEqual(self.client._cur_req_num, 2)
+
+
+class TestDeproxyClientLatency(unittest.TestCase):
+    """Latencies of requests and responses without a connection."""
+
+    def setUp(self):
+        self.client = create_client()
+        self.client._start_time = time.monotonic()
+        self.client._send = lambda data: len(data)
+
+    def send_all(self) -> None:
+        while self.client._has_pending_data():
+            self.client._send_data()
+
+    def receive(self, data: bytes) -> None:
+        def recv_into(buffer):
+            buffer[: len(data)] = data
+            return len(data)
+
+        self.client._recv_into = recv_into
+        self.client._handle_read()
+
+    def test_pipelined(self):
+        request = "GET / HTTP/1.1\r\nHost: localhost\r\n\r\n"
+        response = b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n"
+        self.client.make_request(request)
+        self.client.make_requests([request, request], pipelined=True)
+        self.send_all()
+        time.sleep(0.01)
+        self.receive(response * 2 + response[:10])
+
+        self.assertEqual(self.client.latency.complete.count, 2)
+        self.assertGreaterEqual(self.client.latency.complete.p50, 0.01)
+
+        self.receive(response[10:])
+
+        self.assertEqual(self.client.latency.first_byte.count, 3)
+        self.assertLessEqual(self.client.latency.first_byte.max, self.client.latency.complete.max)
+
+    def test_not_sent_request(self):
+        self.client.methods = ["GET"]
+        self.receive(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+
+        self.assertEqual(len(self.client.responses), 1)
+        self.assertEqual(self.client.latency.complete.count, 0)
+
+
+class TestDeproxyClientH2Read(unittest.TestCase):
+    """Receiving of HTTP/2 responses by a lot of frames without a connection."""
+
+    def setUp(self):
+        self.client = create_client(deproxy_client.DeproxyClientH2)
+        self.client.update_initial_settings()
+        self.server = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        self.server.encoder = deproxy_client.HuffmanEncoder()
+        self.server.encoder.huffman = False
+        self.server.initiate_connection()
+        self.server.receive_data(self.client.h2_connection.data_to_send())
+        self.client.make_request(self.client.create_request("GET", headers=[], authority="x"))
+        self.server.receive_data(self.client.request_buffers[0])
+        # SETTINGS frame of the server
+        self.receive(self.server.data_to_send(), segment_size=65536)
+
+    def receive(self, data: bytes, segment_size: int) -> None:
+        def recv(_):
+            nonlocal data
+            segment, data = data[:segment_size], data[segment_size:]
+            return segment
+
+        self.client._recv = recv
+        while data:
+            self.client._handle_read()
+
+    def receive_response(self, body: bytes, frame_size: int, headers: list = ()) -> None:
+        self.server.send_headers(1, [(":status", "200")] + list(headers))
+        for i in range(0, len(body), frame_size):
+            end_stream = i + frame_size >= len(body)
+            self.server.send_data(1, body[i : i + frame_size], end_stream=end_stream)
+        self.receive(self.server.data_to_send(), segment_size=frame_size)
+
+    def test_store(self):
+        # a multibyte character is split between DATA frames
+        body = "тест".encode() * 1000
+        self.receive_response(body, frame_size=7)
+
+        self.assertEqual(len(self.client.responses), 1)
+        self.assertEqual(self.client.last_response.body, body.decode())
+        self.assertEqual(self.client.last_response.body_sink.length, len(body))
+        self.assertIn(body[:7], self.client.last_response_buffer)
+        self.assertIs(self.client.last_response_buffer, self.client.last_response_buffer)
+
+    def test_hash(self):
+        body = os.urandom(60000)
+        self.client.body_sink_factory = deproxy_body_sink.HashBodySink
+        self.receive_response(body, frame_size=1000)
+
+        sink = self.client.last_response.body_sink
+        self.assertEqual(self.client.last_response.body, "")
+        self.assertEqual(sink.length, len(body))
+        self.assertEqual(sink.digest, hashlib.sha256(body).hexdigest())
+        # only frame headers and the header block are kept
+        buffer = self.client.last_response_buffer
+        self.assertLess(len(buffer), 1000)
+        self.assertEqual(buffer.count(b"\x00\x03\xe8\x00"), 60)
+        self.assertNotIn(body[:100], buffer)
+
+    def test_file(self):
+        body = os.urandom(60000)
+        self.client.body_sink_factory = deproxy_body_sink.FileBodySink
+        self.receive_response(body, frame_size=1000)
+
+        sink = self.client.last_response.body_sink
+        self.addCleanup(sink.remove)
+        with open(sink.path, "rb") as f:
+            self.assertEqual(f.read(), body)
+
+    def test_header_in_continuation_frames(self):
+        # the header block is split to several CONTINUATION frames
+        value = "".join(f"{i:06}" for i in range(10000))
+        self.receive_response(b"body", frame_size=1000, headers=[("x-long", value)])
+
+        self.assertEqual(self.client.last_response.headers["x-long"], value)
+        self.assertGreater(len(self.client._header_blocks[0]), 60000)
+        self.assertTrue(self.client.check_header_presence_in_last_response_buffer(b"x-long"))
+        self.assertTrue(
+            self.client.check_header_presence_in_last_response_buffer(value[16000:17000].encode())
+        )
+        self.assertFalse(self.client.check_header_presence_in_last_response_buffer(b"body"))
+        self.assertFalse(self.client.check_header_presence_in_last_response_buffer(b"x-short"))
+
+
+class TestDeproxyClientRetention(unittest.TestCase):
+    """Retention policies for received responses."""
+
+    def setUp(self):
+        self.client = create_client()
+
+    def receive(self, n: int) -> None:
+        self.client.methods = ["GET"] * n
+        data = b"".join(
+            f"HTTP/1.1 {200 + i % 2} OK\r\nContent-Length: {len(str(i))}\r\n\r\n{i}".encode()
+            for i in range(n)
+        )
+
+        def recv_into(buffer):
+            buffer[: len(data)] = data
+            return len(data)
+
+        self.client._recv_into = recv_into
+        self.client._handle_read()
+
+    def test_full(self):
+        self.receive(10)
+
+        self.assertEqual([r.body for r in self.client.responses[8:]], ["8", "9"])
+        self.assertEqual(self.client.statuses, {200: 5, 201: 5})
+
+    def test_ring(self):
+        self.client.set_retention(deproxy_history.RETENTION_RING, size=3)
+        self.receive(10)
+
+        self.assertEqual(len(self.client.responses), 10)
+        self.assertEqual([r.body for r in self.client.responses], ["7", "8", "9"])
+        self.assertEqual(self.client.responses[7].body, "7")
+        self.assertEqual(self.client.last_response.body, "9")
+        self.assertEqual(self.client.statuses, {200: 5, 201: 5})
+        with self.assertRaises(IndexError):
+            self.client.responses[6]
+
+    def test_digest(self):
+        self.client.set_retention(deproxy_history.RETENTION_DIGEST)
+        self.receive(10)
+
+        digest = hashlib.sha256()
+        for i in range(10):
+            digest.update(len(str(i)).to_bytes(8, "big") + str(i).encode())
+        self.assertEqual(len(self.client.responses), 10)
+        self.assertEqual(list(self.client.responses), [self.client.last_response])
+        self.assertEqual(self.client.responses.body_digest, digest.hexdigest())
+        self.assertEqual(self.client.statuses, {200: 5, 201: 5})
+
+
+class TestAsyncDeproxyClient(unittest.IsolatedAsyncioTestCase):
+    """Clients on the asyncio event loop work without the deproxy manager and its lock."""
+
+    async def asyncSetUp(self):
+        self.server = create_server(b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\nabc")
+        self.server.routes.add("/close", close=True)
+        await self.server.start()
+        self.addAsyncCleanup(self.server.stop)
+        self.client = create_client(deproxy_client.AsyncDeproxyClient, port=PORT)
+        await self.client.start()
+        self.addAsyncCleanup(self.client.stop)
+        await self.client.wait_for_connection_open()
+
+    async def test_request(self):
+        for i in range(3):
+            self.client.make_request(self.client.create_request("GET", headers=[], uri=f"/{i}"))
+        await self.client.wait_for_response(n=3)
+        self.assertEqual([r.body for r in self.client.responses], ["abc"] * 3)
+        self.assertEqual(self.server.last_request.uri, "/2")
+
+        await self.client.stop()
+        self.assertTrue(self.client.connection_is_closed)
+
+    async def test_transport_closing(self):
+        self.client._transport.abort()
+        for i in range(3):
+            self.client.make_request(self.client.create_request("GET", headers=[], uri=f"/{i}"))
+        self.client._flush()
+        self.assertTrue(self.client.connection_is_closed)
+        with self.assertRaises(AssertionError):
+            await self.client.wait_for_response(timeout=1)
+        self.assertFalse(self.client.responses)
+
+    async def test_keep_connection_on_fin(self):
+        self.client.close_connection_for_tcp_fin = False
+        self.client.make_request(self.client.create_request("GET", headers=[], uri="/close"))
+        await self.client.wait_for_response()
+        await self.server.wait_for_connections_closed()
+        self.client._handle_close()
+        self.assertFalse(self.client.connection_is_closed)
+
+        await self.client.stop()
+        self.assertTrue(self.client.connection_is_closed)
+
+
+class TestAsyncDeproxyClientH2(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", PORT)
+        self.addAsyncCleanup(self.server.wait_closed)
+        self.addCleanup(self.server.close)
+        self.client = create_client(deproxy_client.AsyncDeproxyClientH2, port=PORT)
+        await self.client.start()
+        self.addAsyncCleanup(self.client.stop)
+        await self.client.wait_for_connection_open()
+
+    @staticmethod
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        conn.initiate_connection()
+        writer.write(conn.data_to_send())
+        while data := await reader.read(65536):
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    conn.send_headers(event.stream_id, [(":status", "200")])
+                    conn.send_data(event.stream_id, b"abc", end_stream=True)
+            writer.write(conn.data_to_send())
+        writer.close()
+
+    async def test_request(self):
+        for i in range(3):
+            self.client.make_request(
+                self.client.create_request("GET", headers=[], uri=f"/{i}", authority="x")
+            )
+        await self.client.wait_for_response(n=3)
+        self.assertEqual([r.body for r in self.client.responses], ["abc"] * 3)
+        self.assertTrue(self.client.ack_settings)
@@ -0,0 +1,64 @@
+import unittest
+
+from framework.deproxy import deproxy_history, deproxy_message, deproxy_pool
+from tests.selftests.test_deproxy_client_io import create_client
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+
+class TestDeproxyClientPool(unittest.TestCase):
+    """Balancing and counters of the client pool without connections."""
+
+    def create_pool(self, balance: str) -> deproxy_pool.DeproxyClientPool:
+        return deproxy_pool.DeproxyClientPool(
+            id_="pool", clients=[create_client() for _ in range(3)], balance=balance
+        )
+
+    def test_round_robin(self):
+        pool = self.create_pool(deproxy_pool.BALANCE_ROUND_ROBIN)
+        pool.make_requests([pool.create_request("GET", headers=[])] * 7)
+
+        self.assertEqual([len(client.request_buffers) for client in pool.clients], [3, 2, 2])
+
+    def test_by_key(self):
+        pool = self.create_pool(deproxy_pool.BALANCE_BY_KEY)
+        requests = [pool.create_request("GET", headers=[], uri=f"/{i}") for i in range(6)]
+        pool.make_requests(requests, keys=["a", "b", "a", "b", "a", "b"])
+
+        self.assertEqual(pool.get_client("a"), pool.get_client("a"))
+        self.assertEqual(len(pool.get_client("a").request_buffers), 3)
+        with self.assertRaises(ValueError):
+            pool.make_request(requests[0])
+
+    def test_counters(self):
+        pool = self.create_pool(deproxy_pool.BALANCE_ROUND_ROBIN)
+        for client, status in zip(pool.clients, ["200", "200", "403"]):
+            client.receive_response(deproxy_message.Response(f"HTTP/1.1 {status} OK\r\n\r\n"))
+        pool.clients[0]._add_error_code(ConnectionResetError)
+
+        self.assertEqual(pool.nrresp, 3)
+        self.assertEqual(pool.statuses, {200: 2, 403: 1})
+        self.assertEqual(pool.error_codes, {ConnectionResetError: 1})
+
+    def test_retention(self):
+        pool = self.create_pool(deproxy_pool.BALANCE_ROUND_ROBIN)
+        client = pool.clients[0]
+        for i in range(5):
+            client.receive_response(deproxy_message.Response(f"HTTP/1.1 200 OK\r\n\r\n{i}"))
+
+        # only the last response is kept
+        self.assertEqual(len(client.responses), 5)
+        self.assertEqual(list(client.responses), [client.last_response])
+        self.assertEqual(client.last_response.body, "4")
+        self.assertIsNotNone(client.responses.body_digest)
+
+        pool.set_retention(deproxy_history.RETENTION_FULL)
+        client.receive_response(deproxy_message.Response("HTTP/1.1 200 OK\r\n\r\n"))
+        client.receive_response(deproxy_message.Response("HTTP/1.1 200 OK\r\n\r\n"))
+        self.assertEqual(len(list(client.responses)), 2)
+
+    def test_unknown_balance(self):
+        with self.assertRaises(ValueError):
+            self.create_pool("random")
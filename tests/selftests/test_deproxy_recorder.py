@@ -0,0 +1,96 @@
+import asyncio
+import os
+import tempfile
+import types
+import unittest
+
+from framework.deproxy import deproxy_recorder as rec
+from tests.selftests.test_deproxy_server_io import PORT, create_server
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+REQUEST = b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n"
+RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\nabc"
+
+
+class TestDeproxyRecorder(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".rec")
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+        self.addCleanup(rec.stop)
+
+    def test_read(self):
+        recorder = rec.TrafficRecorder(self.path, capacity=64)
+        connection = recorder.open_connection(rec.CLIENT_OPEN, {"port": PORT})
+        for _ in range(10):
+            recorder.record(connection, rec.CLIENT_SEND, REQUEST)
+        recorder.close()
+
+        records = list(rec.read(self.path))
+        self.assertEqual(len(records), 11)
+        self.assertEqual(records[0].type, rec.CLIENT_OPEN)
+        self.assertEqual(records[0].data, b'{"port": 18080}')
+        self.assertEqual({r.data for r in records[1:]}, {REQUEST})
+        self.assertEqual(os.path.getsize(self.path), recorder.size)
+
+    def test_unclosed(self):
+        recorder = rec.TrafficRecorder(self.path)
+        connection = recorder.open_connection(rec.CLIENT_OPEN, {"port": PORT})
+        recorder.record(connection, rec.CLIENT_SEND, REQUEST)
+        recorder._map.flush()
+        self.addCleanup(recorder.close)
+
+        records = list(rec.read(self.path))
+        self.assertEqual([r.type for r in records], [rec.CLIENT_OPEN, rec.CLIENT_SEND])
+        self.assertEqual(rec.TrafficReplayer(self.path).connections, [connection])
+
+    async def test_server(self):
+        server = create_server(RESPONSE)
+        await server.start()
+        rec.start(self.path)
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+            writer.write(REQUEST * 2)
+            await writer.drain()
+            await asyncio.wait_for(reader.readexactly(len(RESPONSE) * 2), 5)
+            writer.close()
+        finally:
+            await server.stop()
+            rec.stop()
+
+        records = list(rec.read(self.path))
+        self.assertEqual(records[0].type, rec.SERVER_OPEN)
+        self.assertEqual(records[-1].type, rec.SERVER_CLOSE)
+        data = {rec.SERVER_RECV: b"", rec.SERVER_SEND: b""}
+        for r in records[1:-1]:
+            data[r.type] += r.data
+        self.assertEqual(data, {rec.SERVER_RECV: REQUEST * 2, rec.SERVER_SEND: RESPONSE * 2})
+
+    async def test_replay(self):
+        rec.start(self.path)
+        for _ in range(3):
+            client = types.SimpleNamespace()
+            rec.record(client, rec.CLIENT_OPEN, info={"addr": "127.0.0.1", "port": PORT})
+            for _ in range(2):
+                rec.record(client, rec.CLIENT_SEND, REQUEST)
+                rec.record(client, rec.CLIENT_RECV, RESPONSE)
+            rec.record(client, rec.CLIENT_CLOSE)
+        rec.stop()
+
+        server = create_server(RESPONSE)
+        await server.start()
+        try:
+            replayer = rec.TrafficReplayer(self.path, speed=0)
+            self.assertEqual(len(replayer.connections), 3)
+            result = await asyncio.wait_for(replayer.run(), 5)
+            await server.wait_for_requests(6)
+        finally:
+            await server.stop()
+
+        for connection in result:
+            self.assertIsNone(connection.error)
+            self.assertEqual(connection.sent, len(REQUEST) * 2)
+            self.assertEqual(connection.received, connection.recorded_received)
@@ -0,0 +1,241 @@
+import asyncio
+import os
+import re
+import tempfile
+import unittest
+from unittest import mock
+
+from framework.deproxy import deproxy_history, deproxy_server
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+PORT = 18080
+
+
+class _AutoParser:
+    parsing = False
+
+
+def create_server(
+    response, segment_size: int = 0, server_class=deproxy_server.StaticDeproxyServer, **kwargs
+) -> deproxy_server.StaticDeproxyServer:
+    return server_class(
+        **kwargs,
+        id_="deproxy",
+        deproxy_auto_parser=_AutoParser(),
+        port=PORT,
+        bind_addr="127.0.0.1",
+        segment_size=segment_size,
+        segment_gap=0,
+        is_ipv6=False,
+        response=response,
+        keep_alive=0,
+        drop_conn_when_request_received=False,
+        send_after_conn_established=False,
+        delay_before_sending_response=0.0,
+        hang_on_req_num=0,
+        pipelined=0,
+        rcv_buf_size=-1,
+    )
+
+
+class TestDeproxyServerSend(unittest.IsolatedAsyncioTestCase):
+    """Sending of pipelined and file responses over a loopback connection."""
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(os.urandom(300000))
+            self.path = f.name
+        self.addCleanup(os.remove, self.path)
+
+    async def exchange(self, response, n: int, segment_size: int = 0) -> tuple[bytes, bytes]:
+        server = create_server(response, segment_size)
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+            writer.write(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n" * n)
+            await writer.drain()
+            await server.wait_for_requests(n)
+            expected = (response if isinstance(response, bytes) else response.encode()) * n
+            data = await asyncio.wait_for(reader.readexactly(len(expected)), 5)
+            writer.close()
+            return data, expected
+        finally:
+            await server.stop()
+
+    async def test_pipelined(self):
+        response = b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\nabc"
+        data, expected = await self.exchange(response, 10)
+        self.assertEqual(data, expected)
+
+    async def test_file(self):
+        response = deproxy_server.FileResponse(self.path, headers=[("X-Test", "1")])
+        self.assertIn(b"Content-Length: 300000\r\n", response.head)
+        data, expected = await self.exchange(response, 3)
+        self.assertEqual(data, expected)
+
+    async def test_file_segmented(self):
+        response = deproxy_server.FileResponse(self.path)
+        with mock.patch.object(deproxy_server, "open", create=True, wraps=open) as open_:
+            for _ in range(2):
+                data, expected = await self.exchange(response, 2, segment_size=65536)
+                self.assertEqual(data, expected)
+        # the file is read once for all responses
+        self.assertEqual(open_.call_count, 1)
+
+
+class TestDeproxyServerParseError(unittest.IsolatedAsyncioTestCase):
+    async def test_close(self):
+        server = create_server(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+            writer.write(b"GET / HTTP/1.1\r\nContent-Length: x\r\n\r\n")
+            self.assertEqual(await asyncio.wait_for(reader.read(), 5), b"")
+            writer.close()
+            self.assertEqual(len(server.requests), 0)
+        finally:
+            await server.stop()
+
+
+class TestDeproxyServerFramingOnly(unittest.IsolatedAsyncioTestCase):
+    class AutoParser:
+        parsing = True
+
+        def __init__(self):
+            self.requests = []
+            self.responses = []
+
+        def check_expected_request(self, request) -> None:
+            self.requests.append(request)
+
+        def prepare_expected_response(self, response: bytes) -> None:
+            self.responses.append(response)
+
+    async def test_auto_parser(self):
+        response = b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n"
+        server = create_server(response)
+        server.framing_only = True
+        server._deproxy_auto_parser = auto_parser = self.AutoParser()
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+            writer.write(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n" * 3)
+            await asyncio.wait_for(reader.readexactly(len(response) * 3), 5)
+            writer.close()
+            self.assertEqual(len(server.requests), 3)
+        finally:
+            await server.stop()
+
+        # requests aren't built, so only responses are checked
+        self.assertEqual(auto_parser.requests, [])
+        self.assertEqual(auto_parser.responses, [response] * 3)
+
+
+class TestMultiProcessDeproxyServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = create_server(
+            b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n",
+            server_class=deproxy_server.MultiProcessDeproxyServer,
+            workers=2,
+        )
+        self.server.set_retention(deproxy_history.RETENTION_DIGEST)
+        await self.server.start()
+        self.addAsyncCleanup(self.server.stop)
+
+    async def test_aggregated_stats(self):
+        connections = [await asyncio.open_connection("127.0.0.1", PORT) for _ in range(8)]
+        self.server.conns_n = 8
+        await self.server.wait_for_connections()
+
+        for _, writer in connections:
+            writer.write(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n" * 5)
+        await self.server.wait_for_requests(40)
+        for reader, writer in connections:
+            await asyncio.wait_for(reader.readexactly(38 * 5), 5)
+            writer.close()
+        self.assertEqual(len(self.server.requests), 40)
+
+        await self.server.wait_for_connections_closed()
+        await self.server.stop()
+        self.assertEqual(len(self.server.worker_digests), 2)
+        self.assertTrue(all(self.server.worker_digests))
+
+    async def test_reset_new_connections(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+        # not accepted connections are reset with the listening socket
+        self.server.conns_n = 1
+        await self.server.wait_for_connections()
+        await self.server.reset_new_connections()
+        with self.assertRaises(ConnectionRefusedError):
+            await asyncio.open_connection("127.0.0.1", PORT)
+
+        # the existing connection still works
+        writer.write(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        await asyncio.wait_for(reader.readexactly(38), 5)
+        writer.close()
+
+    async def test_flush(self):
+        await self.server.stop()
+        self.server.pipelined = 2
+        await self.server.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+        writer.write(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        await self.server.wait_for_requests(1)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(reader.readexactly(38), 0.2)
+
+        # the response waits for the second pipelined request
+        await self.server.flush()
+        await asyncio.wait_for(reader.readexactly(38), 5)
+        writer.close()
+
+    async def test_command_error(self):
+        with self.assertRaises(AttributeError):
+            await self.server._command("no_such_command")
+        # the workers still handle commands
+        await self.server.flush()
+
+    async def test_auto_parser(self):
+        await self.server.stop()
+        self.server._deproxy_auto_parser.parsing = True
+        with self.assertRaises(ValueError):
+            await self.server.start()
+
+
+class TestDeproxyServerRoutes(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = create_server(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+        # routes for the same URI are checked in the order of addition
+        self.server.routes.add("/a", status="403", method="POST")
+        self.server.routes.add("/a", "HTTP/1.1 200 OK\r\nContent-Length: 1\r\n\r\na")
+        self.server.routes.add(r"/img/\d+", status="404", regex=True, name="img")
+        self.server.routes.add(
+            "/h", status="204", headers={"X-Key": re.compile("^k")}, delay=0.1, close=True
+        )
+        await self.server.start()
+        self.addAsyncCleanup(self.server.stop)
+
+    async def request(self, request: bytes) -> bytes:
+        reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+        writer.write(request)
+        response = await asyncio.wait_for(reader.read(1024), 5)
+        writer.close()
+        return response
+
+    async def test_routes(self):
+        for request, status in (
+            (b"GET /a HTTP/1.1\r\n\r\n", b"200"),
+            (b"POST /a HTTP/1.1\r\nContent-Length: 0\r\n\r\n", b"403"),
+            (b"GET /img/12 HTTP/1.1\r\n\r\n", b"404"),
+            (b"GET /img/x HTTP/1.1\r\n\r\n", b"200"),
+            (b"GET /h HTTP/1.1\r\nX-Key: key\r\n\r\n", b"204"),
+            (b"GET /h HTTP/1.1\r\nX-Key: nokey\r\n\r\n", b"200"),
+        ):
+            with self.subTest(request=request):
+                response = await self.request(request)
+                self.assertTrue(response.startswith(b"HTTP/1.1 " + status), response)
+
+        self.assertEqual(self.server.routes.hits, {"* /a": 1, "POST /a": 1, "* /h": 1, "img": 1})
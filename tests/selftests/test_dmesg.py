@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import re
+import time
+import unittest
+from unittest import mock
+
+import run_config
+from framework.helpers import dmesg
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+
+class JournalNode:
+    """Returns `journalctl` output for the records after the requested cursor."""
+
+    def __init__(self):
+        self.records: list[bytes] = []
+        self.cmds: list[str] = []
+
+    def run_cmd(self, cmd: str, *args, **kwargs) -> tuple[bytes, bytes]:
+        self.cmds.append(cmd)
+        if "date" in cmd:
+            return b"100.0\n", b""
+        start = 0
+        if "--after-cursor" in cmd:
+            start = int(cmd.split("--after-cursor='")[1].rstrip("'")) + 1
+        records = self.records[start:]
+        if not records:
+            return b"", b""
+        return b"".join(records) + f"-- cursor: {len(self.records) - 1}\n".encode(), b""
+
+
+class FollowedJournalNode(JournalNode):
+    """Also streams records to `journalctl -f`."""
+
+    def __init__(self):
+        super().__init__()
+        self.stream = None
+
+    def stream_cmd(self, cmd: str):
+        self.cmds.append(cmd)
+        r, w = os.pipe()
+        self.stream = os.fdopen(w, "wb", buffering=0)
+        return os.fdopen(r, "rb"), self.stream.close
+
+    async def arun_cmd(self, cmd: str, *args, **kwargs) -> tuple[bytes, bytes]:
+        since = float(cmd.split("--since=@")[1]) if "--since=@" in cmd else 0
+        records = [i for i in range(len(self.records)) if self.timestamp(i) >= since]
+        return (self.json(records[-1]) if records else b""), b""
+
+    @staticmethod
+    def timestamp(i: int) -> float:
+        return 100.0 + i
+
+    def json(self, i: int) -> bytes:
+        entry = {
+            "__REALTIME_TIMESTAMP": str(int(self.timestamp(i) * 1e6)),
+            "__CURSOR": str(i),
+            "MESSAGE": self.records[i].decode().rstrip("\n"),
+        }
+        return json.dumps(entry).encode() + b"\n"
+
+    def emit(self, *records: str) -> None:
+        for record in records:
+            self.records.append(f"{record}\n".encode())
+            self.stream.write(self.json(len(self.records) - 1))
+
+
+class TestDmesgFinder(unittest.TestCase):
+    def setUp(self):
+        self.node = JournalNode()
+        with mock.patch.object(dmesg.remote, "tempesta", self.node), mock.patch.object(
+            run_config, "FOLLOW_KERNEL_LOG", False
+        ):
+            self.finder = dmesg.DmesgFinder()
+
+    def log(self, *records: str) -> None:
+        self.node.records.extend(f"{record}\n".encode() for record in records)
+
+    def test_incremental_update(self):
+        self.finder.update()
+        self.assertEqual(self.finder.log, b"")
+        self.assertIn("--since=@100.000000", self.node.cmds[-1])
+
+        self.log("Warning: one", "Warning: two")
+        self.finder.update()
+        self.assertEqual(self.finder.log_findall("Warning: (\\w+)"), ["one", "two"])
+
+        self.log("Warning: three")
+        self.finder.update()
+        self.assertIn("--after-cursor='1'", self.node.cmds[-1])
+        self.assertEqual(self.finder.log_findall("Warning: (\\w+)"), ["one", "two", "three"])
+        self.assertEqual(self.finder.log, b"Warning: one\nWarning: two\nWarning: three\n")
+
+        self.finder.update()
+        self.assertIn("--after-cursor='2'", self.node.cmds[-1])
+        self.assertEqual(len(self.finder.log_findall("Warning")), 3)
+        self.assertEqual(self.finder.log_findall("ERROR"), [])
+
+    def test_span_updates(self):
+        self.log("Warning: one")
+        self.finder.update()
+        self.assertEqual(self.finder.log_findall("one\\nWarning: (\\w+)"), [])
+        self.assertEqual(self.finder.log_findall("^Warning"), ["Warning"])
+
+        self.log("Warning: two")
+        self.finder.update()
+        self.assertEqual(self.finder.log_findall("one\\nWarning: (\\w+)"), ["two"])
+        self.assertEqual(self.finder.log_findall("^Warning"), ["Warning"])
+
+        self.log("Warning: three")
+        self.finder.update()
+        for pattern in ("(?m)^Warning: (\\w+)", "(\\w+)\\nWarning: (\\w+)", "^Warning"):
+            with self.subTest(pattern=pattern):
+                self.assertEqual(
+                    self.finder.log_findall(pattern),
+                    re.findall(pattern, self.finder.log.decode()),
+                )
+
+
+class TestKernelLogFollower(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.node = FollowedJournalNode()
+        for patch in (
+            mock.patch.object(dmesg.remote, "tempesta", self.node),
+            mock.patch.object(dmesg, "_follower", None),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.finder = dmesg.DmesgFinder()
+        self.follower = self.finder._follower
+        self.addCleanup(self.follower.stop)
+
+    async def test_find(self):
+        self.assertIn("journalctl -k -f -q -o json --since=@100.000000", self.node.cmds[-1])
+        asyncio.get_running_loop().call_later(0.05, self.node.emit, "Warning: one", "Warning: two")
+        t0 = time.monotonic()
+        self.assertTrue(await self.finder.find("Warning", cond=dmesg.amount_equals(2)))
+        self.assertLess(time.monotonic() - t0, 1)
+        await self.finder.sync()
+        self.assertEqual(self.finder.log, b"Warning: one\nWarning: two\n")
+        # no journalctl reads, only `date` and the follower
+        self.assertEqual(len(self.node.cmds), 2)
+
+    async def test_sync_old_records(self):
+        self.node.emit("Warning: one", "Warning: two")
+        await self.follower.sync()
+        # the records are older than the start of the follower, so they're never received
+        follower = dmesg.KernelLogFollower(self.node, since=150.0)
+        self.addCleanup(follower.stop)
+        t0 = time.monotonic()
+        self.assertTrue(await follower.sync())
+        self.assertLess(time.monotonic() - t0, 1)
+        self.assertEqual(follower.seq, 0)
+
+    async def test_dropped_records(self):
+        self.follower._records = dmesg.collections.deque(maxlen=2)
+        self.node.emit("Warning: one", "Warning: two", "Warning: three")
+        await self.follower.sync()
+        self.finder.update()
+        self.assertEqual(self.finder.log_findall("Warning: (\\w+)"), ["one", "two", "three"])
+        self.assertIsNone(self.finder._follower)
+        self.assertIn("--since=@100.000000", self.node.cmds[-1])
@@ -153,5 +153,42 @@ class TestHeaderCollection(unittest.TestCase):
         lowed.add("b", "asdf")
         self.assertEqual(self.headers, lowed)
 
+    def test_delete_and_set(self):
+        self.headers.add("A", "1")
+        self.headers.add("B", "2")
+        self.headers.add("a", "3")
+        self.headers.add("C", "4")
+
+        del self.headers["a"]
+        self.assertNotIn("A", self.headers)
+        self.assertEqual(self.headers["c"], "4")
+        self.headers["b"] = "5"
+        self.assertEqual(self.headers.items(), [("B", "5"), ("C", "4")])
+        self.headers["D"] = "6"
+        self.assertEqual(self.headers.get("d"), "6")
+
+    def test_list_changed_directly(self):
+        self.headers.add("B", "2")
+        self.headers.add("A", "1")
+        self.headers.headers.sort()
+        self.headers.headers.append(("C", "3"))
+
+        self.assertEqual(self.headers["a"], "1")
+        self.assertEqual(self.headers["b"], "2")
+        self.assertEqual(list(self.headers.find_all("c")), ["3"])
+
+        self.headers.headers = [("X", "1")]
+        self.assertNotIn("a", self.headers)
+        self.assertEqual(self.headers["x"], "1")
+
+        # the length of the list isn't changed
+        self.headers.headers[0] = ("Y", "9")
+        self.assertNotIn("x", self.headers)
+        self.assertEqual(self.headers.get("y"), "9")
+        del self.headers.headers[0]
+        self.headers.headers += [("Z", "1")]
+        self.assertEqual(self.headers["z"], "1")
+        self.assertNotIn("y", self.headers)
+
 
 # vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,77 @@
+import random
+import unittest
+
+from framework.deproxy import deproxy_schedule
+from framework.helpers.histogram import LatencyHistogram
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_empty(self):
+        histogram = LatencyHistogram()
+
+        self.assertEqual(histogram.count, 0)
+        self.assertIsNone(histogram.p99)
+        self.assertIsNone(histogram.max)
+
+    def test_small_values_are_exact(self):
+        histogram = LatencyHistogram()
+        for us in range(1, 101):
+            histogram.record(us / 1_000_000)
+
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.p50, 50e-6)
+        self.assertAlmostEqual(histogram.p99, 99e-6)
+        self.assertAlmostEqual(histogram.min, 1e-6)
+        self.assertAlmostEqual(histogram.max, 100e-6)
+
+    def test_relative_error(self):
+        rnd = random.Random(1)
+        values = sorted(rnd.uniform(0.0001, 100) for _ in range(10000))
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+
+        for percentile, expected in ((50, values[4999]), (99, values[9899]), (99.9, values[9989])):
+            with self.subTest(percentile=percentile):
+                self.assertAlmostEqual(
+                    histogram.percentile(percentile), expected, delta=expected / 2**7
+                )
+        self.assertAlmostEqual(histogram.p999, histogram.percentile(99.9))
+
+    def test_merge(self):
+        first, second = LatencyHistogram(), LatencyHistogram()
+        first.record(0.001, count=99)
+        second.record(10)
+        first.merge(second)
+
+        self.assertEqual(first.count, 100)
+        self.assertAlmostEqual(first.p50, 0.001, delta=0.001 / 2**7)
+        self.assertEqual(first.max, 10)
+
+
+class TestArrivalSchedule(unittest.TestCase):
+    def test_constant(self):
+        schedule = deproxy_schedule.ConstantArrivals(rps=4)
+
+        self.assertEqual([schedule.send_time(n) for n in range(3)], [0, 0.25, 0.5])
+
+    def test_poisson(self):
+        schedule = deproxy_schedule.PoissonArrivals(rps=1000, seed=1)
+        times = [schedule.send_time(n) for n in range(10000)]
+
+        self.assertEqual(times, sorted(times))
+        self.assertAlmostEqual(times[-1], 10, delta=0.5)
+        # the same seed gives the same arrivals
+        same = deproxy_schedule.PoissonArrivals(rps=1000, seed=1)
+        self.assertEqual(same.send_time(9999), times[-1])
+
+    def test_burst(self):
+        schedule = deproxy_schedule.BurstArrivals(burst_size=2, interval=1, burst_rps=10)
+
+        self.assertEqual([schedule.send_time(n) for n in range(4)], [0, 0.1, 1, 1.1])
+        with self.assertRaises(ValueError):
+            deproxy_schedule.BurstArrivals(burst_size=20, interval=1, burst_rps=10)
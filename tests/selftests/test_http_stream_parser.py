@@ -0,0 +1,173 @@
+import unittest
+
+from framework.deproxy import deproxy_message
+from framework.deproxy.deproxy_message import HttpStreamParser, ParseError, Request, Response
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+
+RESPONSES = [
+    "HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello",
+    "HTTP/1.1 204 No Content\r\nContent-Length: 5\r\n\r\n",
+    "HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabc\r\n2\r\nde\r\n0\r\n\r\n",
+    (
+        "HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+        "3;ext=1\r\nabc\r\n0\r\nX-Trailer: value\r\nX-Other: 1\r\n\r\n"
+    ),
+    "HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n0\r\n\r\n",
+    "HTTP/1.1 404 Not Found\r\nServer: deproxy\r\nContent-Length: 0\r\n\r\n",
+]
+
+REQUESTS = [
+    "GET / HTTP/1.1\r\nHost: localhost\r\n\r\n",
+    "POST /upload HTTP/1.1\r\nHost: localhost\r\nContent-Length: 4\r\n\r\nbody",
+    "\r\nGET /after-crlf HTTP/1.1\r\nHost: localhost\r\n\r\n",
+    (
+        "POST / HTTP/1.1\r\nHost: localhost\r\nTransfer-Encoding: chunked\r\n\r\n"
+        "4\r\ntest\r\n0\r\n\r\n"
+    ),
+]
+
+
+class TestHttpStreamParser(unittest.TestCase):
+    def setUp(self):
+        deproxy_message.HeaderCollection._disable_report_wrong_is_expected = True
+        self.addCleanup(self.cleanup_deproxy)
+
+    def cleanup_deproxy(self):
+        deproxy_message.HeaderCollection._disable_report_wrong_is_expected = False
+
+    @staticmethod
+    def feed_by(parser: HttpStreamParser, data: bytes, segment_size: int) -> list:
+        messages = []
+        for i in range(0, len(data), segment_size):
+            messages += parser.feed(data[i : i + segment_size])
+        return messages
+
+    def check_same_as_parse_text(self, message_cls, texts: list) -> None:
+        data = "".join(texts).encode()
+        for segment_size in (1, 3, 7, len(data)):
+            with self.subTest(segment_size=segment_size):
+                parser = HttpStreamParser(message_cls)
+                messages = self.feed_by(parser, data, segment_size)
+
+                self.assertEqual(len(messages), len(texts))
+                for text, msg in zip(texts, messages):
+                    expected = message_cls(text)
+                    self.assertEqual(msg, expected)
+                    self.assertEqual(msg.body, expected.body)
+                    self.assertEqual(msg.original_length, expected.original_length)
+                self.assertEqual(parser.buffer, b"")
+                self.assertEqual(parser.nr_messages, len(texts))
+
+    def test_pipelined_responses(self):
+        self.check_same_as_parse_text(Response, RESPONSES)
+
+    def test_pipelined_requests(self):
+        self.check_same_as_parse_text(Request, REQUESTS)
+
+    def test_framing_only(self):
+        for message_cls, texts in ((Response, RESPONSES), (Request, REQUESTS)):
+            data = "".join(texts).encode()
+            for segment_size in (1, 7, len(data)):
+                with self.subTest(message_cls=message_cls, segment_size=segment_size):
+                    parser = HttpStreamParser(message_cls, framing_only=True)
+                    lengths = self.feed_by(parser, data, segment_size)
+
+                    self.assertEqual(lengths, [message_cls(text).original_length for text in texts])
+                    self.assertEqual(parser.buffer, b"")
+
+    def test_framing_only_method(self):
+        parser = HttpStreamParser(Response, method=lambda n: ["HEAD", "GET"][n], framing_only=True)
+        head = b"HTTP/1.1 200 OK\r\ncontent-length:3\r\n\r\n"
+
+        self.assertEqual(parser.feed(head + head + b"abc"), [len(head), len(head) + 3])
+
+    def test_trailer(self):
+        parser = HttpStreamParser(Response)
+        (response,) = parser.feed(RESPONSES[3].encode())
+
+        self.assertEqual(response.trailer["X-Trailer"], "value")
+        self.assertEqual(response.body, "3;ext=1\r\nabc\r\n0\r\n")
+
+    def test_response_method(self):
+        parser = HttpStreamParser(Response, method=lambda n: ["HEAD", "GET"][n])
+        responses = parser.feed(
+            b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\n"
+            b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\nabc"
+        )
+
+        self.assertEqual([r.method for r in responses], ["HEAD", "GET"])
+        self.assertEqual([r.body for r in responses], ["", "abc"])
+
+    def test_content_length_in_bytes(self):
+        body = "тест"
+        parser = HttpStreamParser(Response)
+        (response,) = parser.feed(
+            f"HTTP/1.1 200 OK\r\nContent-Length: {len(body.encode())}\r\n\r\n{body}".encode()
+        )
+
+        self.assertEqual(response.body, body)
+
+    def test_incomplete(self):
+        parser = HttpStreamParser(Response)
+
+        self.assertEqual(parser.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\n12345"), [])
+        self.assertEqual(len(parser.buffer), 44)
+        self.assertEqual(len(parser.feed(b"67890")), 1)
+
+    def test_keep_original_data(self):
+        parser = HttpStreamParser(Request, keep_original_data=True)
+        (request,) = parser.feed(REQUESTS[2].encode())
+
+        self.assertEqual(request.original_data, REQUESTS[2])
+
+    def test_invalid_status_line(self):
+        parser = HttpStreamParser(Response)
+
+        with self.assertRaises(ParseError):
+            parser.feed(b"HTTP/1.1 OK\r\n")
+        # the next data isn't parsed as headers of the invalid message
+        with self.assertRaises(ParseError):
+            parser.feed(b"Content-Length: 0\r\n\r\n")
+
+    def test_invalid_content_length(self):
+        for value in (b"abc", b"-1"):
+            with self.subTest(value=value), self.assertRaises(ParseError):
+                HttpStreamParser(Response).feed(
+                    b"HTTP/1.1 200 OK\r\nContent-Length: " + value + b"\r\n\r\n"
+                )
+
+    def test_invalid_chunk_size(self):
+        parser = HttpStreamParser(Response)
+
+        with self.assertRaises(ParseError):
+            parser.feed(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n")
+
+    def test_unlimited_request_body(self):
+        parser = HttpStreamParser(Request)
+
+        with self.assertRaises(ParseError):
+            parser.feed(b"POST / HTTP/1.1\r\nTransfer-Encoding: gzip\r\n\r\n")
+
+    def test_binary_body(self):
+        body = bytes(range(256))
+        head = b"HTTP/1.1 200 OK\r\nContent-Length: 256\r\n\r\n"
+        parser = HttpStreamParser(Response)
+        (response,) = parser.feed(head + body)
+
+        self.assertEqual(response.raw_body, body)
+        self.assertIs(type(response.raw_body), bytes)
+        self.assertEqual(response.encode(), head + body)
+        self.assertEqual(response.body.encode(errors="surrogateescape"), body)
+        self.assertEqual(response.original_length, len(head + body))
+
+    def test_body_setter(self):
+        parser = HttpStreamParser(Response)
+        (response,) = parser.feed(RESPONSES[0].encode())
+        response.body = "new"
+
+        self.assertEqual(response.raw_body, b"new")
+        self.assertEqual(response.encode(), response.msg.encode())
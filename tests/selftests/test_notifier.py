@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from framework.helpers import util
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+
+class TestNotifier(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.notifier = util.Notifier()
+        self.done = False
+
+    def change(self) -> None:
+        self.done = True
+        self.notifier.notify()
+
+    async def wait(self, poll_interval: float = 5) -> float:
+        t0 = time.monotonic()
+        self.assertTrue(
+            await util.wait_until(
+                lambda: not self.done, 10, notifier=self.notifier, poll_interval=poll_interval
+            )
+        )
+        return time.monotonic() - t0
+
+    async def test_other_thread(self):
+        threading.Timer(0.05, self.change).start()
+        self.assertLess(await self.wait(), 1)
+
+    async def test_same_loop(self):
+        asyncio.get_running_loop().call_later(0.05, self.change)
+        self.assertLess(await self.wait(), 1)
+
+    async def test_parent(self):
+        child = util.Notifier(parent=self.notifier)
+
+        def change():
+            self.done = True
+            child.notify()
+
+        threading.Timer(0.05, change).start()
+        self.assertLess(await self.wait(), 1)
+
+    async def test_change_without_notification(self):
+        threading.Timer(0.05, lambda: setattr(self, "done", True)).start()
+        self.assertLess(await self.wait(poll_interval=0.1), 1)
+
+    async def test_timeout(self):
+        self.assertFalse(await util.wait_until(lambda: True, 0.1, notifier=self.notifier))
+        self.assertFalse(self.notifier._waiters)
@@ -0,0 +1,155 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from framework.helpers import error, remote
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+
+class TestConcurrentCommands(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.node = remote.LocalNode("Client", "localhost", "/tmp")
+
+    def test_run_cmds(self):
+        t0 = time.monotonic()
+        results = self.node.run_cmds([f"sleep 0.3; echo -n {i}" for i in range(4)])
+        self.assertLess(time.monotonic() - t0, 1)
+        self.assertEqual([out for out, _ in results], [b"0", b"1", b"2", b"3"])
+
+    def test_run_cmds_error(self):
+        t0 = time.monotonic()
+        with self.assertRaises(error.ProcessBadExitStatusException):
+            self.node.run_cmds(["exit 1", "sleep 0.3"])
+        # the error is raised after all commands are finished
+        self.assertGreaterEqual(time.monotonic() - t0, 0.3)
+
+    async def test_arun_cmd(self):
+        t0 = time.monotonic()
+        results = await asyncio.gather(
+            *(self.node.arun_cmd(f"sleep 0.3; echo -n {i}") for i in range(4))
+        )
+        self.assertLess(time.monotonic() - t0, 1)
+        self.assertEqual([out for out, _ in results], [b"0", b"1", b"2", b"3"])
+
+
+class TestCommandBatch(unittest.TestCase):
+    def setUp(self):
+        self.node = remote.LocalNode("Client", "localhost", "/tmp")
+
+    def test_results(self):
+        with self.node.batch(env={"TFW_VAR": "x"}, check=False) as batch:
+            first = batch.add("echo -n $TFW_VAR; echo err >&2; exit 3")
+            second = batch.add("printf 'a\\nb'")
+            ip = batch.ip("link show lo")
+            batch.ip("address show lo")
+        self.assertEqual((first.stdout, first.stderr, first.rt), (b"x", b"err\n", 3))
+        self.assertEqual((second.stdout, second.stderr, second.rt), (b"a\nb", b"", 0))
+        self.assertTrue(ip.ok)
+        self.assertEqual(ip.stdout.count(b"LOOPBACK"), 2)
+        self.assertEqual(len(batch.results), 3)
+
+    def test_sysctl(self):
+        batch = remote.CommandBatch(self.node)
+        result = batch.sysctl("net.ipv4.ip_forward", 1)
+        self.assertIs(batch.sysctl("net.ipv4.tcp_sack", 0), result)
+        self.assertIn("\nnet.ipv4.ip_forward = 1\nnet.ipv4.tcp_sack = 0\n", batch._script(None))
+
+    def test_large_script(self):
+        # the script is larger than the command line limit of 128 KiB
+        with self.node.batch() as batch:
+            result = batch.add(f": {'x' * (256 << 10)}; echo -n ok")
+        self.assertEqual(result.stdout, b"ok")
+
+    def test_timeout(self):
+        batch = remote.CommandBatch(self.node)
+        for _ in range(3):
+            batch.add("true")
+        with mock.patch.object(self.node, "run_cmd", wraps=self.node.run_cmd) as run_cmd:
+            batch.run(timeout=5)
+        # each command has its own timeout
+        self.assertEqual(run_cmd.call_args.kwargs["timeout"], 15)
+
+    def test_check(self):
+        with self.assertRaises(error.ProcessBadExitStatusException):
+            with self.node.batch() as batch:
+                batch.add("false")
+                last = batch.add("true")
+        self.assertTrue(last.ok)
+
+    def test_exception(self):
+        with self.assertRaises(ZeroDivisionError):
+            with self.node.batch() as batch:
+                result = batch.add("true")
+                1 / 0
+        self.assertIsNone(result.rt)
+
+
+class TestCopyFile(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.node = remote.LocalNode("Client", "localhost", self.workdir)
+        self.path = os.path.join(self.workdir, "dir", "file.txt")
+        self.addCleanup(self.node.run_cmd, f"rm -rf {self.workdir}")
+
+    def test_unchanged(self):
+        self.node.copy_file("dir/file.txt", "content")
+        inode = os.stat(self.path).st_ino
+        self.node.copy_file("dir/file.txt", "content")
+        self.assertEqual(os.stat(self.path).st_ino, inode)
+
+        self.node.copy_file("dir/file.txt", "new content")
+        self.assertNotEqual(os.stat(self.path).st_ino, inode)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "new content")
+
+    def test_changed_on_node(self):
+        self.node.copy_file(self.path, "content")
+        with open(self.path, "a") as f:
+            f.write(" changed")
+        self.node.copy_file(self.path, "content")
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "content")
+
+        # the same size and inode
+        with open(self.path, "r+") as f:
+            f.write("CONTENT")
+        self.node.copy_file(self.path, "content")
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "content")
+
+        self.node.remove_file(self.path)
+        self.node.copy_file(self.path, "content")
+        self.assertTrue(os.path.exists(self.path))
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["file.txt"])
+
+    def test_mode(self):
+        self.node.copy_file(self.path, "content")
+        os.chmod(self.path, 0o751)
+        self.node.copy_file(self.path, "new content")
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o751)
+
+
+class TestRemoteChannels(unittest.TestCase):
+    def setUp(self):
+        with mock.patch.object(remote.RemoteNode, "_connect"):
+            self.node = remote.RemoteNode("Client", "localhost", "/tmp", "root")
+        self.node._ssh = mock.MagicMock()
+        self.node._ssh.open_sftp.return_value.get_channel.return_value.closed = False
+
+    def test_long_lived_channels(self):
+        with self.node._sftp_lock:
+            self.node._get_sftp()
+            self.node._get_sftp()
+        _, stop = self.node.stream_cmd("journalctl -f")
+        # the SFTP session and the streamed command take channels of commands
+        self.assertEqual(self.node._channels._value, remote.MAX_CONCURRENT_CMDS - 2)
+
+        stop()
+        stop()
+        self.assertEqual(self.node._channels._value, remote.MAX_CONCURRENT_CMDS - 1)
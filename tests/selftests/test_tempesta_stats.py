@@ -0,0 +1,71 @@
+import asyncio
+import unittest
+
+from framework.helpers import error
+from framework.services.tempesta import Stats, StatsSampler
+
+__author__ = "Tempesta Technologies, Inc."
+__copyright__ = "Copyright (C) 2026 Tempesta Technologies, Inc."
+__license__ = "GPL2"
+
+
+def perfstat(forwarded: int = 10, hits: int = 3, misses: int = 1) -> bytes:
+    return (
+        "SS pfl hits\t\t\t\t: 5\n"
+        "SS pfl misses\t\t\t\t: 6\n"
+        f"Cache hits\t\t\t\t: {hits}\n"
+        f"Cache misses\t\t\t\t: {misses}\n"
+        "Client messages received\t\t: 12\n"
+        f"Client messages forwarded\t\t: {forwarded}\n"
+        "Client messages served from cache\t: 2\n"
+        "Client RX bytes\t\t\t\t: 1000\n"
+        "Server messages received\t\t: 9\n"
+        "Server messages forwarded\t\t: 8\n"
+        "HTTP '200' code\t\t\t\t: 7\n"
+        "HTTP '404' code\t\t\t\t: 1\n"
+        "Server connections active\t\t: 4\n"
+    ).encode()
+
+
+class TestStats(unittest.TestCase):
+    def test_parse(self):
+        stats = Stats()
+        stats.parse(perfstat())
+        for name, attr in Stats._fields.items():
+            self.assertEqual(getattr(stats, attr), Stats.parse_option(perfstat(), name), attr)
+        self.assertEqual(stats.cl_msg_forwarded, 10)
+        self.assertEqual(stats.cl_msg_served_from_cache, 2)
+        self.assertEqual(stats.srv_conns_active, 4)
+        self.assertEqual(stats.cache_objects, -1)
+        self.assertEqual(stats.health_statuses, {200: 7, 404: 1})
+        self.assertEqual(Stats.parse_values(perfstat())["HTTP '404' code"], 1)
+
+
+class StatsNode:
+    """Counters grow each read: 100 forwarded messages, 3 hits and 1 miss."""
+
+    def __init__(self):
+        self.reads = 0
+
+    async def arun_cmd(self, cmd: str, *args, **kwargs) -> tuple[bytes, bytes]:
+        self.reads += 1
+        if self.reads == 1:
+            raise error.ProcessBadExitStatusException("No such file", b"", b"", 1)
+        n = self.reads
+        return perfstat(forwarded=100 * n, hits=3 * n, misses=n), b""
+
+
+class TestStatsSampler(unittest.IsolatedAsyncioTestCase):
+    async def test_rates(self):
+        sampler = StatsSampler(interval=0.01, node=StatsNode())
+        async with sampler:
+            while len(sampler.samples) < 5:
+                await asyncio.sleep(0.01)
+
+        forwarded = sampler.series("cl_msg_forwarded")
+        self.assertEqual([v for _, v in forwarded[:3]], [200, 300, 400])
+        for _, rate in sampler.rates("cl_msg_forwarded"):
+            self.assertGreater(rate, 0)
+        self.assertGreater(sampler.rate("cl_msg_forwarded"), 0)
+        self.assertEqual({rate for _, rate in sampler.cache_hit_rates()}, {0.75})
+        self.assertIsNone(sampler._task)